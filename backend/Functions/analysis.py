@@ -1,36 +1,28 @@
-from llama_index.llms.gemini import Gemini
-from llama_index.core import Settings
-from llama_index.embeddings.gemini import GeminiEmbedding
-import json
-import fitz
-from fastapi import APIRouter
 import os
+import re
+import json
+import asyncio
+import base64
+from collections import Counter
+from pathlib import Path
+from typing import List, Optional, Tuple
 from dotenv import load_dotenv
-load_dotenv()
+from Functions.charts import render_charts_async
+from Functions.extraction import extract_pages_async, split_text
+from Functions.llm import gateway, DEFAULT_MODEL, THINKING_MODEL
+from Functions.sandbox import SandboxError, sandbox_pool
+from Functions.table_parser import extract_statement_metrics_async
 
-# Load environment variables
 load_dotenv()
-os.environ["GOOGLE_API_KEY"] = os.getenv("GOOGLE_API_KEY")
-
-# Initialize LLM and Embedding Model
-llm = Gemini(temperature=0, model="models/gemini-2.0-flash")
-Settings.llm = llm
-Settings.embed_model = GeminiEmbedding(
-    model_name="models/embedding-001", api_key=os.getenv("GOOGLE_API_KEY")
-)
-llm = Gemini(temperature=0, model="models/gemini-2.0-flash")
-# Function to extract text from PDF
-def extract_text_from_pdf(pdf_file):
-    """
-    Extract text from a PDF file using PyMuPDF.
-    """
-    # Read the file content synchronously
-    file_content = pdf_file.file.read()
-    doc = fitz.open(stream=file_content, filetype="pdf")
-    text = ""
-    for page in doc:
-        text += page.get_text()
-    return text
+
+# Characters per LLM extraction call and how many calls one document may run at once
+STRUCTURED_SECTION_CHARS = int(os.getenv("STRUCTURED_SECTION_CHARS", 30000))
+STRUCTURED_MAX_CONCURRENCY = int(os.getenv("STRUCTURED_MAX_CONCURRENCY", 4))
+
+
+class AnalysisError(Exception):
+    """Raised when the visualization step fails; the message is returned to the client"""
+
 
 def parse_numerical_value(value):
     """
@@ -67,10 +59,62 @@ def parse_numerical_value(value):
         return None  # Return None if parsing fails
 
 
+def _metric_key(item: dict) -> tuple:
+    entity = re.sub(r"[^a-z0-9]+", " ", str(item.get("entity", "")).lower()).strip()
+    metric_type = str(item.get("type", "")).strip().lower()
+    return entity, metric_type
+
+
+def merge_metrics(sections: List[List[dict]]) -> List[dict]:
+    """
+    Merge per-section metrics, deduplicating on (entity, type) across sections.
+    Within one section, rows that share a label but differ in value (current and
+    long-term parts of a liability, say) are distinct metrics: the n-th occurrence
+    in one section is only merged with the n-th occurrence in the others.
+    Conflicting values are resolved by the value most sections agree on; ties go
+    to the earliest section. Zero (unparsed) values only survive if nothing else was found.
+    """
+    candidates = {}
+    for section in sections:
+        occurrences = Counter()
+        seen = set()
+        for item in section:
+            key = _metric_key(item)
+            value = item.get("value", 0)
+            if not key[0] or (key, value) in seen:
+                continue
+            seen.add((key, value))
+            candidates.setdefault((*key, occurrences[key]), []).append(item)
+            occurrences[key] += 1
+
+    merged = []
+    for items in candidates.values():
+        parsed = [item for item in items if item.get("value", 0) != 0] or items
+        votes = Counter(item.get("value", 0) for item in parsed)
+        best = max(votes.values())
+        winner = next(item for item in parsed if votes[item.get("value", 0)] == best)
+        merged.append({"entity": winner["entity"], "value": winner.get("value", 0), "type": winner.get("type", "")})
+    return merged
+
+
+def parse_json_response(response_text: str) -> dict:
+    """Parse a JSON answer, removing a markdown code fence around it"""
+    # Clean the response to extract valid JSON
+    cleaned_response = response_text.strip()
+    if cleaned_response.startswith("```json"):
+        cleaned_response = cleaned_response[7:-3].strip()  # Remove ```json and ```
+    elif cleaned_response.startswith("```"):
+        cleaned_response = cleaned_response[3:-3].strip()  # Remove ``` and ```
+    structured_data = json.loads(cleaned_response)
+    if not isinstance(structured_data, dict):
+        raise json.JSONDecodeError("Expected a JSON object", cleaned_response, 0)
+    return structured_data
+
+
 # Function to extract structured JSON using LLM
-def extract_structured_data(text):
+async def extract_section_metrics(text: str) -> List[dict]:
     """
-    Extract structured data (entities and relationships) from text using LLM.
+    Extract financial metrics from one section of text using LLM.
     """
     prompt = f"""
     Extract structured data from the following text in JSON format. Focus on financial metrics such as revenues, expenses, assets, liabilities, profits, and any other relevant financial data.
@@ -89,24 +133,132 @@ def extract_structured_data(text):
 
     Text: {text}
     """
-    response = llm.complete(prompt)  # Use `complete` instead of `invoke`
-
-    # Clean the response to extract valid JSON
-    cleaned_response = response.text.strip()
-    if cleaned_response.startswith("```json"):
-        cleaned_response = cleaned_response[7:-3].strip()  # Remove ```json and ```
-    elif cleaned_response.startswith("```"):
-        cleaned_response = cleaned_response[3:-3].strip()  # Remove ``` and ```
-
     try:
-        structured_data = json.loads(cleaned_response)
-        # Convert values to integers using the helper function
-        for item in structured_data.get("financial_metrics", []):
-            parsed_value = parse_numerical_value(item["value"])
-            if parsed_value is not None:
-                item["value"] = parsed_value
-            else:
-                item["value"] = 0  # Default to 0 if parsing fails
-        return structured_data
+        structured_data = await gateway.generate(
+            prompt,
+            model_name=DEFAULT_MODEL,
+            generation_config={"temperature": 0},
+            parse=parse_json_response,
+        )
     except json.JSONDecodeError:
-        return {"financial_metrics": []}  # Return an empty structure
+        return []
+
+    metrics = []
+    for item in structured_data.get("financial_metrics", []):
+        if not isinstance(item, dict) or "value" not in item:
+            continue
+        # Convert values to integers using the helper function
+        parsed_value = parse_numerical_value(item["value"]) if isinstance(item["value"], (int, float, str)) else None
+        item["value"] = parsed_value if parsed_value is not None else 0  # Default to 0 if parsing fails
+        metrics.append(item)
+    return metrics
+
+
+async def extract_structured_data(text):
+    """
+    Extract structured data (entities and relationships) from text using LLM.
+    Long text is split into sections that are extracted concurrently (at most
+    STRUCTURED_MAX_CONCURRENCY at a time) and merged with merge_metrics.
+    """
+    sections = split_text(text, STRUCTURED_SECTION_CHARS)
+    semaphore = asyncio.Semaphore(STRUCTURED_MAX_CONCURRENCY)
+
+    async def extract(section: str) -> List[dict]:
+        async with semaphore:
+            try:
+                return await extract_section_metrics(section)
+            except Exception as e:
+                print(f"Structured extraction failed for a section: {str(e)}")
+                return []
+
+    results = await asyncio.gather(*(extract(section) for section in sections))
+    return {"financial_metrics": merge_metrics(results)}
+
+
+async def generate_visualizations(structured_data: dict) -> List[dict]:
+    """
+    Ask the LLM for matplotlib code that charts structured_data, run it in the
+    sandbox pool and return the saved images as [{"filename", "base64"}].
+    """
+    # Generate visualization code
+    prompt = f"""Generate Python code to visualize this data:
+    {structured_data}
+    Requirements:
+    - Use matplotlib
+    - The data above is already loaded in a variable named `data`; do not redefine it
+    - Save each plot with plt.savefig('<descriptive_name>.jpg') using a file name only, no folders
+    - Include bar charts and pie charts only 5 most relevant plots only.
+    - Format: Only raw Python code, no markdown
+    - Add plt.close() after each save"""
+
+    async def run(response_text: str) -> List[Tuple[str, bytes]]:
+        generated_code = response_text.strip().replace("```python", "").replace("```", "")
+        try:
+            return await sandbox_pool.run_async(generated_code, structured_data)
+        except SandboxError as e:
+            Path("code_error.log").write_text(f"Code:\n{generated_code}\n\n{str(e)}")
+            raise AnalysisError(str(e))
+
+    # Code that fails in the sandbox is not cached, so the next request asks again
+    images = await gateway.generate(
+        prompt,
+        model_name=THINKING_MODEL,
+        generation_config={"temperature": 0.1},
+        parse=run,
+    )
+
+    return [
+        {"filename": filename, "base64": base64.b64encode(image).decode()}
+        for filename, image in images
+    ]
+
+
+async def extract_structured_data_from_pdf(pdf_bytes: bytes, llm_fallback: bool = True) -> dict:
+    """
+    Structured data for a PDF. Statement pages (income statement, balance sheet,
+    cash flows) are read by the local table parser; only the pages it could not
+    parse go through extract_structured_data, unless llm_fallback is off.
+    Table values win ties in the merge.
+    """
+    tables = await extract_statement_metrics_async(pdf_bytes)
+    unparsed = tables["unparsed_pages"]
+    llm_metrics = []
+    if unparsed and llm_fallback:
+        pages = await extract_pages_async(pdf_bytes)
+        fallback_text = "\n".join(pages[number] for number in unparsed if pages[number])
+        if fallback_text.strip():
+            llm_metrics = (await extract_structured_data(fallback_text))["financial_metrics"]
+    return {"financial_metrics": merge_metrics([tables["financial_metrics"], llm_metrics])}
+
+
+async def analyze_inputs(pdf_contents: List[bytes], text: Optional[str] = None, chart_mode: str = "builtin") -> dict:
+    """
+    Structured metrics plus charts for uploaded PDFs and free text, as returned by /structured_json.
+    chart_mode "builtin" renders the fixed chart set in-process; "llm" runs LLM-written plotting code.
+    """
+    extractions = [extract_structured_data_from_pdf(content) for content in pdf_contents]
+    if text:
+        extractions.append(extract_structured_data(text))
+    results = await asyncio.gather(*extractions)
+    structured_data = {"financial_metrics": merge_metrics([result["financial_metrics"] for result in results])}
+    return await render_analysis(structured_data, chart_mode)
+
+
+async def render_analysis(structured_data: dict, chart_mode: str = "builtin") -> dict:
+    """Charts for already extracted structured data, in the /structured_json response shape"""
+    if chart_mode == "llm":
+        images = await generate_visualizations(structured_data)
+    else:
+        images = await render_charts_async(structured_data.get("financial_metrics", []))
+    return {
+        "status": "success",
+        "images": images
+    }
+
+
+async def extract_metrics_by_document(pdf_contents: List[bytes], llm_fallback: bool = True) -> List[List[dict]]:
+    """financial_metrics of each PDF, extracted concurrently"""
+    results = await asyncio.gather(
+        *(extract_structured_data_from_pdf(content, llm_fallback) for content in pdf_contents)
+    )
+    return [result.get("financial_metrics", []) for result in results]
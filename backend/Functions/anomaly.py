@@ -92,94 +92,247 @@
 
 
 import os
+import re
 import json
-import google.generativeai as genai
+import asyncio
+from typing import List, Optional
 from dotenv import load_dotenv
+from Functions.extraction import split_text
+from Functions.llm import gateway, THINKING_MODEL
+from Functions.prescreen import prescreen
 load_dotenv()
 
-def detect(extracted_text_list):
-    # Configure API key
-    genai.configure(api_key=os.environ['GOOGLE_API_KEY'])
-    
-    # Initialize the latest model
-    model = genai.GenerativeModel(
-        model_name='gemini-2.0-flash-thinking-exp',
-        generation_config={
-            "temperature": 0.1,
-            # "response_mime_type": "application/json",
-        }
-    )
-
-    # Prepare document context with indexes
-    document_context = "\n\n".join(
-        [f"--- DOCUMENT {idx} ---\n{text}\n--- END DOCUMENT {idx} ---"
-         for idx, text in enumerate(extracted_text_list)]
-    )
+# Characters of a document sent in one map pass
+ANOMALY_CHUNK_CHARS = int(os.getenv("ANOMALY_CHUNK_CHARS", 200000))
+# Characters of each per-document digest sent to the reduce pass
+ANOMALY_DIGEST_CHARS = int(os.getenv("ANOMALY_DIGEST_CHARS", 20000))
 
-    prompt = f"""Analyze these documents comprehensively to detect:
-1. Individual document anomalies
-2. Cross-document inconsistencies
-3. Statistical patterns across documents
-4. Logical contradictions between documents
-5. Temporal/geographical mismatches
-6. Formatting/style anomalies
+SEVERITIES = ("critical", "high", "medium", "low")
 
-Consider these document relationships:
-- Sequential documents (date ordered)
-- Versioned documents
-- Complementary/supplementary materials
-- Potentially conflicting sources
+FULL_CHECKS = """1. Data anomalies and internal inconsistencies
+2. Statistical patterns that look unusual
+3. Logical contradictions
+4. Temporal/geographical mismatches
+5. Formatting/style anomalies"""
 
-Documents:
-{document_context}
+# Used when the numeric pre-screen already covered the arithmetic checks
+NARRATIVE_CHECKS = """1. Logical contradictions, including statements that conflict with the reported figures
+2. Temporal/geographical mismatches
+3. Formatting/style anomalies
+4. Missing, vague or inconsistent disclosures and context
+Do not report purely arithmetic findings (outliers, digit distributions, totals that do not add up);
+those are checked separately."""
 
-Return findings in this JSON structure:
-{{
-  "analysis_summary": {{
-    "total_anomalies": int,
-    "cross_document_issues": int,
-    "severity_distribution": {{
-      "critical": int,
-      "high": int,
-      "medium": int,
-      "low": int
-    }}
-  }},
-  "anomalies": [
-    {{
+ANOMALY_ITEM_SCHEMA = """{
       "id": "unique-identifier",
       "description": "Detailed anomaly description",
       "type": "data|logic|temporal|formatting|statistical|context",
       "severity": "critical|high|medium|low",
       "affected_documents": [int],
-      "evidence": {{
+      "evidence": {
         "excerpts": [str],
         "document_references": [int]
-      }},
+      },
       "cross_document": bool,
       "confidence_score": float
-    }}
+    }"""
+
+
+def parse_model_json(response_text: str) -> dict:
+    """Parse a JSON answer that may be wrapped in a markdown code fence"""
+    return json.loads(response_text.strip().strip("`").removeprefix("json").strip())
+
+
+async def _map_chunk(doc_idx: int, chunk_idx: int, chunk_count: int, text: str, checks: str) -> Optional[dict]:
+    """Single-document anomaly pass over one chunk, plus a compact digest for the reduce pass"""
+    prompt = f"""Analyze part {chunk_idx + 1} of {chunk_count} of DOCUMENT {doc_idx} to detect:
+{checks}
+
+--- DOCUMENT {doc_idx} (part {chunk_idx + 1}/{chunk_count}) ---
+{text}
+--- END DOCUMENT {doc_idx} ---
+
+Also summarize the part in at most 150 words and list its key figures (amounts, ratios,
+dates, counts) so it can later be compared with other documents.
+
+Return only JSON in this structure:
+{{
+  "anomalies": [
+    {ANOMALY_ITEM_SCHEMA}
+  ],
+  "summary": str,
+  "figures": [
+    {{"label": str, "value": str, "period": str}}
+  ]
+}}"""
+    try:
+        return await gateway.generate(
+            prompt,
+            model_name=THINKING_MODEL,
+            generation_config={"temperature": 0.1},
+            parse=parse_model_json,
+        )
+    except Exception as e:
+        print(f"Anomaly map pass failed for document {doc_idx} part {chunk_idx + 1}: {str(e)}")
+        return None
+
+
+def _fit_digest(digest: dict) -> dict:
+    """
+    The digest cut down to ANOMALY_DIGEST_CHARS of JSON. Whole summaries, then whole
+    figures, are kept in order while they fit, so the reduce pass never sees half a figure.
+    """
+    fitted = {"document": digest["document"], "summaries": [], "figures": []}
+    size = len(json.dumps(fitted))
+    for field in ("summaries", "figures"):
+        for item in digest[field]:
+            # Item plus its ", " separator
+            item_size = len(json.dumps(item)) + 2
+            if size + item_size > ANOMALY_DIGEST_CHARS:
+                break
+            fitted[field].append(item)
+            size += item_size
+    return fitted
+
+
+async def _reduce(digests: List[dict]) -> List[dict]:
+    """Cross-document consistency checks over the per-document digests"""
+    digest_context = "\n\n".join(
+        f"--- DOCUMENT {digest['document']} ---\n{json.dumps(_fit_digest(digest))}\n--- END DOCUMENT {digest['document']} ---"
+        for digest in digests
+    )
+    prompt = f"""These are summaries and key figures extracted from several documents (or several parts of one).
+Detect:
+1. Cross-document inconsistencies
+2. Figures that disagree for the same item or period
+3. Logical contradictions between documents
+4. Temporal/geographical mismatches
+
+Consider these document relationships:
+- Sequential documents (date ordered)
+- Versioned documents
+- Complementary/supplementary materials
+- Potentially conflicting sources
+
+Documents:
+{digest_context}
+
+Return only JSON in this structure:
+{{
+  "anomalies": [
+    {ANOMALY_ITEM_SCHEMA}
   ]
 }}"""
+    result = await gateway.generate(
+        prompt,
+        model_name=THINKING_MODEL,
+        generation_config={"temperature": 0.1},
+        parse=parse_model_json,
+    )
+    return result.get("anomalies", [])
+
+
+def _document_refs(refs) -> List[int]:
+    """
+    Document indexes from the model's references, which come as 2, "2" or "DOCUMENT 2".
+    References without a number are dropped instead of failing the whole analysis.
+    """
+    if not isinstance(refs, list):
+        refs = [refs] if refs is not None else []
+    parsed = []
+    for ref in refs:
+        match = re.search(r"\d+", str(ref))
+        if match:
+            parsed.append(int(match.group()))
+    return parsed
+
+
+def _normalize(anomaly: dict, anomaly_id: str, default_documents: List[int], cross_document: bool) -> dict:
+    evidence = anomaly.get("evidence")
+    evidence = evidence if isinstance(evidence, dict) else {}
+    affected = _document_refs(anomaly.get("affected_documents"))
+    references = _document_refs(evidence.get("document_references")) or affected or default_documents
+    severity = str(anomaly.get("severity", "low")).lower()
+    return {
+        **anomaly,
+        "id": anomaly_id,
+        "description": anomaly.get("description", ""),
+        "type": anomaly.get("type", "data"),
+        "severity": severity if severity in SEVERITIES else "low",
+        "affected_documents": affected or references,
+        "evidence": {
+            "excerpts": evidence.get("excerpts", []),
+            "document_references": references,
+        },
+        "cross_document": cross_document,
+    }
 
+
+def summarize_anomalies(anomalies: List[dict]) -> dict:
+    """analysis_summary block computed from the merged anomaly list"""
+    distribution = {severity: 0 for severity in SEVERITIES}
+    for anomaly in anomalies:
+        distribution[anomaly["severity"]] += 1
+    return {
+        "total_anomalies": len(anomalies),
+        "cross_document_issues": sum(1 for anomaly in anomalies if anomaly["cross_document"]),
+        "severity_distribution": distribution,
+    }
+
+
+async def detect(extracted_text_list, metrics_by_document: Optional[List[List[dict]]] = None):
+    """
+    Map-reduce anomaly detection.
+    Map: every chunk of every document is analyzed concurrently for single-document
+    anomalies and condensed into a summary plus key figures.
+    Reduce: one pass over those digests looks for cross-document inconsistencies.
+    Latency follows the largest chunk rather than the total size of the filing set.
+    When metrics_by_document (financial_metrics per document) is given, the arithmetic
+    checks come from the NumPy pre-screen, and the LLM passes stick to narrative checks
+    for every document that has metrics to pre-screen.
+    """
     try:
-        if len(document_context) > 900000:
-            return {"error": "Total document size exceeds model capacity"}
-            
-        response = model.generate_content(prompt)
-        print(response.text)
-        response_text = response.text.strip("`json").strip("`") 
-        result = json.loads(response_text)
-        
-        # Add document indexes to evidence references
-        for anomaly in result.get('anomalies', []):
-            anomaly['evidence']['document_references'] = [
-                int(ref) for ref in anomaly['evidence'].get('document_references', [])
-            ]
-        
-        return result
-        
-    except json.JSONDecodeError:
-        return {"error": "Failed to parse model response"}
+        metrics = metrics_by_document or []
+
+        jobs = []
+        for doc_idx, text in enumerate(extracted_text_list):
+            chunks = split_text(text, ANOMALY_CHUNK_CHARS)
+            for chunk_idx, chunk in enumerate(chunks):
+                jobs.append((doc_idx, chunk_idx, len(chunks), chunk))
+        if not jobs:
+            return {"error": "No document text to analyze"}
+
+        def checks(doc_idx: int) -> str:
+            return NARRATIVE_CHECKS if doc_idx < len(metrics) and metrics[doc_idx] else FULL_CHECKS
+
+        mapped = await asyncio.gather(*(_map_chunk(*job, checks(job[0])) for job in jobs))
+        anomalies = prescreen(metrics) if any(metrics) else []
+        if all(result is None for result in mapped) and not anomalies:
+            return {"error": "Failed to parse model response"}
+
+        digests = {}
+        for (doc_idx, chunk_idx, _, _), result in zip(jobs, mapped):
+            if result is None:
+                continue
+            for n, anomaly in enumerate(result.get("anomalies", [])):
+                anomalies.append(_normalize(anomaly, f"doc{doc_idx}-part{chunk_idx + 1}-{n + 1}", [doc_idx], False))
+            digest = digests.setdefault(doc_idx, {"document": doc_idx, "summaries": [], "figures": []})
+            digest["summaries"].append(result.get("summary", ""))
+            digest["figures"].extend(result.get("figures", []))
+
+        # Cross-checks only make sense with more than one document or part
+        if len(jobs) > 1:
+            try:
+                cross = await _reduce(list(digests.values()))
+                for n, anomaly in enumerate(cross):
+                    anomalies.append(_normalize(anomaly, f"cross-{n + 1}", sorted(digests), True))
+            except Exception as e:
+                print(f"Anomaly reduce pass failed: {str(e)}")
+
+        return {
+            "analysis_summary": summarize_anomalies(anomalies),
+            "anomalies": anomalies,
+        }
+
     except Exception as e:
-        return {"error": f"Analysis failed: {str(e)}"}
\ No newline at end of file
+        return {"error": f"Analysis failed: {str(e)}"}
@@ -0,0 +1,162 @@
+# Functions/charts.py
+import os
+import base64
+import asyncio
+import threading
+import multiprocessing
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from typing import Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+
+load_dotenv()
+
+CHART_WORKERS = int(os.getenv("CHART_WORKERS", 2))
+MAX_BAR_ENTITIES = 10
+MAX_PIE_SLICES = 6
+MAX_TYPE_CHARTS = 3
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_guard = threading.Lock()
+
+
+def _warm_up():
+    """Pool initializer: import matplotlib on the Agg backend and build the font cache once per worker"""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    fig, ax = plt.subplots()
+    ax.bar(["a"], [1])
+    fig.savefig(BytesIO(), format="png")
+    plt.close(fig)
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_guard:
+        if _pool is None:
+            # Spawned like the extraction pool, so no threads of the server are forked mid-state
+            _pool = ProcessPoolExecutor(
+                max_workers=CHART_WORKERS, initializer=_warm_up, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool
+
+
+def start_pool():
+    """Spawn and warm every chart worker now rather than on the first request"""
+    pool = get_pool()
+    for future in [pool.submit(int) for _ in range(CHART_WORKERS)]:
+        future.result()
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_guard:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def _short(label: str, limit: int = 30) -> str:
+    return label if len(label) <= limit else label[:limit - 3] + "..."
+
+
+def group_metrics(financial_metrics: List[dict]) -> Dict[str, Dict[str, float]]:
+    """{type: {entity: value}}, keeping the largest magnitude when an entity repeats"""
+    grouped = defaultdict(dict)
+    for item in financial_metrics:
+        try:
+            value = float(item.get("value") or 0)
+        except (TypeError, ValueError):
+            continue
+        if value == 0:
+            continue
+        metric_type = str(item.get("type") or "other").strip().lower()
+        entity = str(item.get("entity") or "unknown").strip()
+        current = grouped[metric_type].get(entity)
+        if current is None or abs(value) > abs(current):
+            grouped[metric_type][entity] = value
+    return grouped
+
+
+def _figure_bytes(fig) -> bytes:
+    import matplotlib.pyplot as plt
+    buffer = BytesIO()
+    fig.tight_layout()
+    fig.savefig(buffer, format="png", dpi=110)
+    plt.close(fig)
+    return buffer.getvalue()
+
+
+def _bar_chart(title: str, labels: List[str], values: List[float]) -> bytes:
+    import matplotlib.pyplot as plt
+    fig, ax = plt.subplots(figsize=(9, 5))
+    colors = ["#2e7d32" if value >= 0 else "#c62828" for value in values]
+    ax.barh([_short(label) for label in labels][::-1], values[::-1], color=colors[::-1])
+    ax.set_title(title)
+    ax.ticklabel_format(axis="x", style="plain", useOffset=False)
+    ax.grid(axis="x", alpha=0.3)
+    return _figure_bytes(fig)
+
+
+def _pie_chart(title: str, labels: List[str], values: List[float]) -> bytes:
+    import matplotlib.pyplot as plt
+    fig, ax = plt.subplots(figsize=(7, 7))
+    ax.pie(values, labels=[_short(label, 24) for label in labels], autopct="%1.1f%%", startangle=90)
+    ax.set_title(title)
+    ax.axis("equal")
+    return _figure_bytes(fig)
+
+
+def render_charts(financial_metrics: List[dict]) -> List[Tuple[str, bytes]]:
+    """
+    Render the fixed chart set for financial_metrics. Runs inside a pool worker.
+    - totals per metric type (bar)
+    - top entities of the MAX_TYPE_CHARTS most populated types (bar)
+    - share of the most populated all-positive type (pie)
+    """
+    grouped = group_metrics(financial_metrics)
+    if not grouped:
+        return []
+
+    charts = []
+    totals = sorted(((t, sum(v.values())) for t, v in grouped.items()), key=lambda kv: -abs(kv[1]))
+    charts.append((
+        "metric_totals_by_type.png",
+        _bar_chart("Total value by metric type", [t.title() for t, _ in totals], [v for _, v in totals]),
+    ))
+
+    by_size = sorted(grouped.items(), key=lambda kv: -len(kv[1]))
+    for metric_type, entities in by_size[:MAX_TYPE_CHARTS]:
+        top = sorted(entities.items(), key=lambda kv: -abs(kv[1]))[:MAX_BAR_ENTITIES]
+        charts.append((
+            f"{metric_type.replace(' ', '_')}_by_entity.png",
+            _bar_chart(f"{metric_type.title()} by entity", [e for e, _ in top], [v for _, v in top]),
+        ))
+
+    for metric_type, entities in by_size:
+        if len(entities) < 2 or any(value < 0 for value in entities.values()):
+            continue
+        ranked = sorted(entities.items(), key=lambda kv: -kv[1])
+        slices = ranked[:MAX_PIE_SLICES - 1]
+        rest = sum(value for _, value in ranked[MAX_PIE_SLICES - 1:])
+        if rest:
+            slices.append(("Other", rest))
+        charts.append((
+            f"{metric_type.replace(' ', '_')}_share.png",
+            _pie_chart(f"{metric_type.title()} share", [e for e, _ in slices], [v for _, v in slices]),
+        ))
+        break
+
+    return charts
+
+
+async def render_charts_async(financial_metrics: List[dict]) -> List[dict]:
+    """Render on the warm chart pool and return [{"filename", "base64"}] like /structured_json"""
+    loop = asyncio.get_running_loop()
+    charts = await loop.run_in_executor(get_pool(), render_charts, financial_metrics)
+    return [
+        {"filename": filename, "base64": base64.b64encode(image).decode()}
+        for filename, image in charts
+    ]
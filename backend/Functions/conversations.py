@@ -0,0 +1,169 @@
+# Functions/conversations.py
+import os
+import base64
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+from bson import ObjectId
+from bson.errors import InvalidId
+from dotenv import load_dotenv
+from pymongo import DESCENDING, UpdateOne
+from pymongo.errors import BulkWriteError
+from database import conversations_collection, messages_collection
+from Functions.stats import record
+
+load_dotenv()
+
+CHAT_PAGE_SIZE = int(os.getenv("CHAT_PAGE_SIZE", 50))
+CHAT_MAX_PAGE_SIZE = int(os.getenv("CHAT_MAX_PAGE_SIZE", 200))
+CHATS_PAGE_SIZE = int(os.getenv("CHATS_PAGE_SIZE", 50))
+TITLE_FILE_COUNT = 3
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def conversation_title(pdf_files: List[str]) -> str:
+    """Sidebar title built from the first PDF file names"""
+    if not pdf_files:
+        return "New Chat"
+    title = ", ".join([os.path.splitext(f)[0] for f in pdf_files][:TITLE_FILE_COUNT])
+    if len(pdf_files) > TITLE_FILE_COUNT:
+        title += "..."
+    return title
+
+
+async def refresh_title(conversation_id: str):
+    """Store the denormalized title after pdf_files changed"""
+    conv = await conversations_collection.find_one(
+        {"_id": ObjectId(conversation_id)},
+        {"title": 1, "pdf_files": {"$slice": TITLE_FILE_COUNT + 1}}
+    )
+    if conv:
+        await conversations_collection.update_one(
+            {"_id": conv["_id"]},
+            {"$set": {"title": conversation_title(conv.get("pdf_files", []))}}
+        )
+
+
+def encode_cursor(document: dict, field: str = "timestamp") -> str:
+    """Opaque position of a document in the (field, _id) order"""
+    raw = f"{document[field].isoformat()}|{document['_id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+    try:
+        timestamp, message_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(timestamp), ObjectId(message_id)
+    except (ValueError, InvalidId, UnicodeDecodeError) as e:
+        raise InvalidCursor(f"Invalid cursor: {cursor}") from e
+
+
+async def _insert_messages(conversation_id: str, messages: List[dict]):
+    if messages:
+        await messages_collection.insert_many([
+            {"conversation_id": conversation_id, **message} for message in messages
+        ])
+
+
+async def add_messages(conversation_id: str, messages: List[dict]):
+    """Store new messages in the messages collection, one document each, and count them"""
+    await _insert_messages(conversation_id, messages)
+    await record(messages=len(messages))
+
+
+def _legacy_timestamp(message: dict) -> Optional[datetime]:
+    timestamp = message.get("timestamp")
+    if isinstance(timestamp, str):
+        try:
+            return datetime.fromisoformat(timestamp)
+        except ValueError:
+            return None
+    return timestamp if isinstance(timestamp, datetime) else None
+
+
+async def migrate_embedded_messages(conversation_id: str):
+    """
+    Move a legacy conversation's embedded messages array into the messages collection.
+    Messages are upserted on (conversation_id, legacy_index) before the array is removed,
+    so an interrupted or concurrent migration is simply repeated without duplicates or loss.
+    """
+    legacy = await conversations_collection.find_one(
+        {"_id": ObjectId(conversation_id), "messages": {"$exists": True}},
+        {"messages": 1, "created_at": 1}
+    )
+    if not legacy:
+        return
+
+    # Messages stored without a timestamp keep their place in the array: just after the previous one
+    previous = legacy.get("created_at") or ObjectId(conversation_id).generation_time.replace(tzinfo=None)
+    operations = []
+    for index, message in enumerate(legacy.get("messages") or []):
+        timestamp = _legacy_timestamp(message) or previous + timedelta(milliseconds=1)
+        previous = timestamp
+        document = {key: value for key, value in message.items() if key != "_id"}
+        operations.append(UpdateOne(
+            {"conversation_id": conversation_id, "legacy_index": index},
+            {"$setOnInsert": {**document, "conversation_id": conversation_id, "legacy_index": index, "timestamp": timestamp}},
+            upsert=True
+        ))
+    if operations:
+        # Already counted by the stats baseline
+        try:
+            await messages_collection.bulk_write(operations, ordered=False)
+        except BulkWriteError as e:
+            # Another request migrated the same messages first (legacy_messages unique index)
+            if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+                raise
+    await conversations_collection.update_one({"_id": legacy["_id"]}, {"$unset": {"messages": ""}})
+
+
+async def get_message_page(conversation_id: str, limit: int = CHAT_PAGE_SIZE,
+                           before: Optional[str] = None) -> Tuple[List[dict], Optional[str]]:
+    """
+    The newest `limit` messages older than the `before` cursor, returned oldest first,
+    plus the cursor of the next (older) page or None when there is nothing older.
+    """
+    limit = max(1, min(limit, CHAT_MAX_PAGE_SIZE))
+    query = {"conversation_id": conversation_id}
+    if before:
+        timestamp, message_id = decode_cursor(before)
+        query["$or"] = [
+            {"timestamp": {"$lt": timestamp}},
+            {"timestamp": timestamp, "_id": {"$lt": message_id}},
+        ]
+
+    page = await messages_collection.find(query, {"conversation_id": 0, "legacy_index": 0}) \
+        .sort([("timestamp", DESCENDING), ("_id", DESCENDING)]) \
+        .limit(limit + 1) \
+        .to_list(length=limit + 1)
+
+    next_cursor = encode_cursor(page[limit - 1]) if len(page) > limit else None
+    return list(reversed(page[:limit])), next_cursor
+
+
+async def get_conversation_page(user_id: str, limit: int = CHATS_PAGE_SIZE,
+                                before: Optional[str] = None) -> Tuple[List[dict], Optional[str]]:
+    """
+    A user's conversations, newest first, without their messages. Served from the
+    (user_id, created_at, _id) index, so the cost does not grow with the number of chats.
+    """
+    limit = max(1, min(limit, CHAT_MAX_PAGE_SIZE))
+    query = {"user_id": user_id}
+    if before:
+        created_at, conversation_id = decode_cursor(before)
+        query["$or"] = [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "_id": {"$lt": conversation_id}},
+        ]
+
+    # pdf_files is only read for conversations created before titles were stored
+    projection = {"title": 1, "created_at": 1, "pdf_files": {"$slice": TITLE_FILE_COUNT + 1}}
+    page = await conversations_collection.find(query, projection) \
+        .sort([("created_at", DESCENDING), ("_id", DESCENDING)]) \
+        .limit(limit + 1) \
+        .to_list(length=limit + 1)
+
+    next_cursor = encode_cursor(page[limit - 1], "created_at") if len(page) > limit else None
+    return page[:limit], next_cursor
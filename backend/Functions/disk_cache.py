@@ -0,0 +1,87 @@
+# Functions/disk_cache.py
+import os
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Optional
+
+
+class DiskLRUCache:
+    """JSON values stored as one file per key, evicted least-recently-used once the size cap is hit"""
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> size in bytes, oldest first
+        self._total_bytes = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load_index()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _load_index(self):
+        """Rebuild the LRU order from file mtimes so the cache survives restarts"""
+        found = []
+        for filename in os.listdir(self.cache_dir):
+            if not filename.endswith(".json"):
+                continue
+            stat = os.stat(os.path.join(self.cache_dir, filename))
+            found.append((stat.st_mtime, filename[:-5], stat.st_size))
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self._total_bytes += size
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            if key not in self._entries:
+                return None
+            path = self._path(key)
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    value = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            os.utime(path)  # keep the on-disk order in sync for the next restart
+            return value
+
+    def put(self, key: str, value: Any) -> None:
+        data = json.dumps(value).encode("utf-8")
+        with self._lock:
+            if len(data) > self.max_bytes:
+                return
+            path = self._path(key)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+
+            if key in self._entries:
+                self._total_bytes -= self._entries[key]
+            self._entries[key] = len(data)
+            self._entries.move_to_end(key)
+            self._total_bytes += len(data)
+            self._evict()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._drop(key)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._total_bytes, "max_bytes": self.max_bytes}
+
+    def _drop(self, key: str):
+        self._total_bytes -= self._entries.pop(key, 0)
+        try:
+            os.unlink(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and self._entries:
+            oldest = next(iter(self._entries))
+            self._drop(oldest)
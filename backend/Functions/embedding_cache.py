@@ -0,0 +1,123 @@
+# Functions/embedding_cache.py
+import os
+import sqlite3
+import hashlib
+import threading
+from array import array
+from typing import Dict, Iterable, List
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.bridge.pydantic import PrivateAttr
+from dotenv import load_dotenv
+
+load_dotenv()
+
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "./storage/embeddings.sqlite3")
+# Chunks looked up in the cache per round and misses sent to the model per request
+EMBEDDING_LOOKUP_BATCH = int(os.getenv("EMBEDDING_LOOKUP_BATCH", 1000))
+EMBEDDING_REQUEST_BATCH = int(os.getenv("EMBEDDING_REQUEST_BATCH", 100))
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingStore:
+    """SQLite table of float32 vectors keyed by (model name, chunk hash)"""
+
+    def __init__(self, path: str = EMBEDDING_CACHE_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " model TEXT NOT NULL, hash TEXT NOT NULL, vector BLOB NOT NULL,"
+                " PRIMARY KEY (model, hash))"
+            )
+            self._conn.commit()
+
+    def get_many(self, model: str, hashes: Iterable[str]) -> Dict[str, List[float]]:
+        hashes = list(set(hashes))
+        found = {}
+        # Stay well under SQLite's bound-parameter limit
+        for start in range(0, len(hashes), 500):
+            batch = hashes[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT hash, vector FROM embeddings WHERE model = ? AND hash IN ({placeholders})",
+                    [model, *batch],
+                ).fetchall()
+            for digest, blob in rows:
+                found[digest] = array("f", blob).tolist()
+        return found
+
+    def put_many(self, model: str, vectors: Dict[str, List[float]]):
+        rows = [(model, digest, array("f", vector).tobytes()) for digest, vector in vectors.items()]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)", rows)
+            self._conn.commit()
+
+
+class CachedEmbedding(BaseEmbedding):
+    """
+    Wraps an embedding model so each chunk text is embedded once per model.
+    Lookups are done EMBEDDING_LOOKUP_BATCH chunks at a time and only the misses
+    go to the wrapped model, in requests of EMBEDDING_REQUEST_BATCH.
+    """
+
+    _inner: BaseEmbedding = PrivateAttr()
+    _store: EmbeddingStore = PrivateAttr()
+
+    def __init__(self, inner: BaseEmbedding, store: EmbeddingStore, **kwargs):
+        super().__init__(
+            model_name=inner.model_name,
+            embed_batch_size=EMBEDDING_LOOKUP_BATCH,
+            **kwargs,
+        )
+        inner.embed_batch_size = EMBEDDING_REQUEST_BATCH
+        self._inner = inner
+        self._store = store
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CachedEmbedding"
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        # Queries are embedded with a different task type, so they get their own namespace
+        key = text_hash(query)
+        namespace = f"{self.model_name}:query"
+        found = self._store.get_many(namespace, [key])
+        if key not in found:
+            found[key] = self._inner.get_query_embedding(query)
+            self._store.put_many(namespace, {key: found[key]})
+        return found[key]
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return self._get_query_embedding(query)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._get_text_embeddings([text])[0]
+
+    async def _aget_text_embedding(self, text: str) -> List[float]:
+        return self._get_text_embedding(text)
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        hashes = [text_hash(text) for text in texts]
+        found = self._store.get_many(self.model_name, hashes)
+
+        missing = {}
+        for digest, text in zip(hashes, texts):
+            if digest not in found:
+                missing.setdefault(digest, text)
+        if missing:
+            vectors = self._inner.get_text_embedding_batch(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors))
+            self._store.put_many(self.model_name, computed)
+            found.update(computed)
+
+        return [found[digest] for digest in hashes]
+
+
+embedding_store = EmbeddingStore()
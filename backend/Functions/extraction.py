@@ -0,0 +1,188 @@
+# Functions/extraction.py
+import os
+import asyncio
+import hashlib
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import AsyncIterator, List, Optional, Tuple
+import fitz
+from dotenv import load_dotenv
+from Functions.disk_cache import DiskLRUCache
+
+load_dotenv()
+
+PDF_CACHE_DIR = os.getenv("PDF_CACHE_DIR", "./storage/pdf_text_cache")
+PDF_CACHE_MAX_BYTES = int(os.getenv("PDF_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", os.cpu_count() or 2))
+PDF_PAGES_PER_SHARD = int(os.getenv("PDF_PAGES_PER_SHARD", 16))
+
+pdf_text_cache = DiskLRUCache(PDF_CACHE_DIR, PDF_CACHE_MAX_BYTES)
+
+# One lock per document being parsed, so concurrent requests for the same bytes parse it once
+_inflight_locks = {}
+_inflight_guard = threading.Lock()
+
+# Same idea for the async path: digest -> event set once the parse is cached
+_pending_parses = {}
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_guard = threading.Lock()
+
+
+def get_pool() -> ProcessPoolExecutor:
+    """
+    Lazily start the process pool shared by every extraction. Workers are spawned, not
+    forked: by now the process runs Motor and executor threads that a fork would copy mid-state.
+    """
+    global _pool
+    with _pool_guard:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=PDF_EXTRACT_WORKERS, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_guard:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def document_digest(pdf_bytes: bytes) -> str:
+    """SHA-256 of the raw file bytes, used as the cache key"""
+    return hashlib.sha256(pdf_bytes).hexdigest()
+
+
+def _page_count(pdf_bytes: bytes) -> int:
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        return doc.page_count
+
+
+def _parse_page_range(pdf_bytes: bytes, start: int, stop: int) -> List[str]:
+    """Extract the text of pages [start, stop). Runs inside a pool worker."""
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        return [doc[number].get_text() for number in range(start, stop)]
+
+
+def _shards(page_count: int) -> List[Tuple[int, int]]:
+    return [
+        (start, min(start + PDF_PAGES_PER_SHARD, page_count))
+        for start in range(0, page_count, PDF_PAGES_PER_SHARD)
+    ]
+
+
+def _parse_pages(pdf_bytes: bytes) -> List[str]:
+    """Extract every page, sharding page ranges across the process pool"""
+    shards = _shards(_page_count(pdf_bytes))
+    if len(shards) <= 1:
+        return _parse_page_range(pdf_bytes, 0, shards[0][1]) if shards else []
+    pool = get_pool()
+    futures = [pool.submit(_parse_page_range, pdf_bytes, start, stop) for start, stop in shards]
+    pages = []
+    for future in futures:
+        pages.extend(future.result())
+    return pages
+
+
+def _acquire_inflight(digest: str) -> threading.Lock:
+    with _inflight_guard:
+        return _inflight_locks.setdefault(digest, threading.Lock())
+
+
+def _release_inflight(digest: str):
+    with _inflight_guard:
+        _inflight_locks.pop(digest, None)
+
+
+def extract_pages(pdf_bytes: bytes) -> List[str]:
+    """Return the text of each page, parsing the PDF only if it is not cached yet"""
+    digest = document_digest(pdf_bytes)
+    pages = pdf_text_cache.get(digest)
+    if pages is not None:
+        return pages
+
+    lock = _acquire_inflight(digest)
+    try:
+        with lock:
+            # Another request may have finished parsing while we waited
+            pages = pdf_text_cache.get(digest)
+            if pages is None:
+                pages = _parse_pages(pdf_bytes)
+                pdf_text_cache.put(digest, pages)
+    finally:
+        _release_inflight(digest)
+    return pages
+
+
+def split_text(text: str, max_chars: int) -> List[str]:
+    """Split text into chunks of at most max_chars, preferring paragraph then line breaks"""
+    chunks = []
+    while len(text) > max_chars:
+        cut = text.rfind("\n\n", 0, max_chars)
+        if cut < max_chars // 2:
+            cut = text.rfind("\n", 0, max_chars)
+        if cut < max_chars // 2:
+            cut = max_chars
+        chunks.append(text[:cut])
+        text = text[cut:].lstrip("\n")
+    if text.strip():
+        chunks.append(text)
+    return chunks
+
+
+def extract_text(pdf_bytes: bytes) -> str:
+    """Return the full text of a PDF, one page per line block"""
+    return "\n".join(page for page in extract_pages(pdf_bytes) if page)
+
+
+async def stream_pages(pdf_bytes: bytes) -> AsyncIterator[Tuple[int, str]]:
+    """
+    Yield (page_number, text) in page order as soon as each shard is parsed.
+    Parsing happens in the process pool, so the event loop is never blocked.
+    """
+    loop = asyncio.get_running_loop()
+    digest = document_digest(pdf_bytes)
+    pending = _pending_parses.get(digest)
+    if pending is not None:
+        await pending.wait()
+    pages = await loop.run_in_executor(None, pdf_text_cache.get, digest)
+    if pages is not None:
+        for number, text in enumerate(pages):
+            yield number, text
+        return
+
+    done = asyncio.Event()
+    _pending_parses[digest] = done
+    pool = get_pool()
+    futures = []
+    try:
+        page_count = await loop.run_in_executor(pool, _page_count, pdf_bytes)
+        futures = [
+            loop.run_in_executor(pool, _parse_page_range, pdf_bytes, start, stop)
+            for start, stop in _shards(page_count)
+        ]
+        pages = []
+        for future in futures:
+            for text in await future:
+                yield len(pages), text
+                pages.append(text)
+        await loop.run_in_executor(None, pdf_text_cache.put, digest, pages)
+    finally:
+        for future in futures:
+            future.cancel()
+        _pending_parses.pop(digest, None)
+        done.set()
+
+
+async def extract_pages_async(pdf_bytes: bytes) -> List[str]:
+    """Async counterpart of extract_pages for use inside request handlers"""
+    return [text async for _, text in stream_pages(pdf_bytes)]
+
+
+async def extract_text_async(pdf_bytes: bytes) -> str:
+    """Async counterpart of extract_text for use inside request handlers"""
+    return "\n".join(page for page in await extract_pages_async(pdf_bytes) if page)
@@ -0,0 +1,218 @@
+# Functions/graph_layout.py
+import os
+from collections import Counter, defaultdict
+from typing import Dict, List, Tuple
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+LAYOUT_ITERATIONS = int(os.getenv("LAYOUT_ITERATIONS", 120))
+LAYOUT_MIN_ITERATIONS = 30
+LAYOUT_PAIR_BUDGET = 5e8  # node-to-node (or node-to-cell) interactions one layout may spend
+LAYOUT_EXACT_NODES = 500  # above this, repulsion comes from grid cells instead of every other node
+LAYOUT_GRID_CELLS = 32  # cells per side of that grid
+LAYOUT_BLOCK_ROWS = 512  # rows of the pairwise repulsion computed at once, bounds memory to ~block * n
+LAYOUT_SCALE = 1000.0  # vis-network canvas units
+COLLAPSE_MIN_DEGREE = int(os.getenv("COLLAPSE_MIN_DEGREE", 4))
+COMMUNITY_ROUNDS = 20
+
+# vis-network options for graphs that arrive with coordinates
+STATIC_OPTIONS = {
+    "physics": False,
+    "edges": {"font": {"size": 10, "align": "middle"}, "smooth": False},
+    "interaction": {"hideEdgesOnDrag": True, "tooltipDelay": 100},
+}
+
+
+def _edge_array(payload: dict) -> Tuple[List[str], np.ndarray]:
+    ids = [node["id"] for node in payload["nodes"]]
+    position = {node_id: n for n, node_id in enumerate(ids)}
+    edges = np.array(
+        [(position[edge["from"]], position[edge["to"]]) for edge in payload["edges"]
+         if edge["from"] in position and edge["to"] in position and edge["from"] != edge["to"]],
+        dtype=np.int64,
+    ).reshape(-1, 2)
+    return ids, edges
+
+
+def _repulsion(positions: np.ndarray, sources: np.ndarray, mass: np.ndarray, k: float) -> np.ndarray:
+    """Sum of k² * mass / d² pushes from every source point, blockwise over the rows"""
+    displacement = np.empty_like(positions)
+    for start in range(0, len(positions), LAYOUT_BLOCK_ROWS):
+        block = positions[start:start + LAYOUT_BLOCK_ROWS]
+        dx = block[:, 0:1] - sources[None, :, 0]
+        dy = block[:, 1:2] - sources[None, :, 1]
+        weight = (k * k) * mass / np.maximum(dx * dx + dy * dy, np.float32(1e-6))
+        displacement[start:start + LAYOUT_BLOCK_ROWS, 0] = (dx * weight).sum(axis=1)
+        displacement[start:start + LAYOUT_BLOCK_ROWS, 1] = (dy * weight).sum(axis=1)
+    return displacement
+
+
+def _grid_sources(positions: np.ndarray, cells: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Centroid and node count of every occupied cell of a cells x cells grid over the positions"""
+    low = positions.min(axis=0)
+    span = float((positions.max(axis=0) - low).max()) or 1.0
+    cell = np.minimum(((positions - low) / span * cells).astype(np.int64), cells - 1)
+    flat = cell[:, 0] * cells + cell[:, 1]
+    counts = np.bincount(flat, minlength=cells * cells)
+    occupied = np.nonzero(counts)[0]
+    sums = np.stack([np.bincount(flat, weights=positions[:, d], minlength=cells * cells) for d in (0, 1)], axis=1)
+    mass = counts[occupied].astype(np.float32)
+    return (sums[occupied] / mass[:, None]).astype(np.float32), mass
+
+
+def force_layout(node_count: int, edges: np.ndarray, iterations: int = LAYOUT_ITERATIONS, seed: int = 7) -> np.ndarray:
+    """
+    Fruchterman-Reingold positions in [-LAYOUT_SCALE, LAYOUT_SCALE], vectorized with NumPy in float32.
+    Small graphs get exact pairwise repulsion; above LAYOUT_EXACT_NODES every node is pushed by
+    the centroids of a LAYOUT_GRID_CELLS² grid instead, weighted by how many nodes each cell holds,
+    which makes an iteration linear in the node count. Iterations are capped so one layout stays
+    within LAYOUT_PAIR_BUDGET interactions.
+    """
+    if node_count == 0:
+        return np.zeros((0, 2))
+    if node_count == 1:
+        return np.zeros((1, 2))
+
+    exact = node_count <= LAYOUT_EXACT_NODES
+    sources_per_node = node_count if exact else LAYOUT_GRID_CELLS * LAYOUT_GRID_CELLS
+    iterations = int(max(LAYOUT_MIN_ITERATIONS, min(iterations, LAYOUT_PAIR_BUDGET // (node_count * sources_per_node))))
+
+    rng = np.random.default_rng(seed)
+    positions = rng.uniform(-1.0, 1.0, size=(node_count, 2)).astype(np.float32)
+    k = np.float32(np.sqrt(4.0 / node_count))  # ideal edge length in the unit square
+    temperature = 0.1
+    cooling = temperature / (iterations + 1)
+    unit_mass = np.ones(node_count, dtype=np.float32)
+
+    for _ in range(iterations):
+        if exact:
+            displacement = _repulsion(positions, positions, unit_mass, k)
+        else:
+            displacement = _repulsion(positions, *_grid_sources(positions, LAYOUT_GRID_CELLS), k)
+        if len(edges):
+            delta = positions[edges[:, 0]] - positions[edges[:, 1]]
+            distance = np.maximum(np.linalg.norm(delta, axis=1), np.float32(1e-3))
+            pull = delta * (distance / k)[:, None]
+            np.subtract.at(displacement, edges[:, 0], pull)
+            np.add.at(displacement, edges[:, 1], pull)
+        # Weak gravity keeps disconnected components on screen
+        displacement -= positions * np.float32(0.05) * k
+
+        length = np.maximum(np.linalg.norm(displacement, axis=1), np.float32(1e-9))
+        positions += displacement / length[:, None] * np.minimum(length, np.float32(temperature))[:, None]
+        temperature -= cooling
+
+    positions -= positions.mean(axis=0)
+    extent = np.abs(positions).max() or 1.0
+    return (positions / extent * LAYOUT_SCALE).astype(np.float64)
+
+
+def communities(node_count: int, edges: np.ndarray) -> np.ndarray:
+    """
+    Label propagation over the undirected graph; returns a community id per node.
+    A neighbor's vote weighs 1 + the neighbors both nodes share, so a lone bridge edge
+    between two dense groups cannot carry one group's label into the other.
+    """
+    neighbors = defaultdict(list)
+    for source, target in edges:
+        neighbors[source].append(target)
+        neighbors[target].append(source)
+    adjacent = {node: set(linked) for node, linked in neighbors.items()}
+    weights = {
+        node: [1 + len(adjacent[node] & adjacent[neighbor]) for neighbor in linked]
+        for node, linked in neighbors.items()
+    }
+    labels = np.arange(node_count)
+    # Deterministic order: hubs first, so they seed the communities
+    order = sorted(range(node_count), key=lambda node: -len(neighbors[node]))
+    for _ in range(COMMUNITY_ROUNDS):
+        changed = False
+        for node in order:
+            if not neighbors[node]:
+                continue
+            counts = Counter()
+            for neighbor, weight in zip(neighbors[node], weights[node]):
+                counts[labels[neighbor]] += weight
+            best = max(counts.values())
+            label = min(candidate for candidate, count in counts.items() if count == best)
+            if label != labels[node]:
+                labels[node] = label
+                changed = True
+        if not changed:
+            break
+    return labels
+
+
+def with_layout(payload: dict) -> dict:
+    """Copy of a graph payload with x/y on every node, a degree-based size and physics turned off"""
+    ids, edges = _edge_array(payload)
+    positions = force_layout(len(ids), edges)
+    degree = np.bincount(edges.ravel(), minlength=len(ids)) if len(edges) else np.zeros(len(ids), dtype=int)
+    nodes = [
+        {**node, "x": round(float(positions[n, 0]), 1), "y": round(float(positions[n, 1]), 1),
+         "size": int(8 + 2 * np.sqrt(degree[n]))}
+        for n, node in enumerate(payload["nodes"])
+    ]
+    return {"nodes": nodes, "edges": payload["edges"], "options": STATIC_OPTIONS}
+
+
+def collapse(payload: dict, min_degree: int = COLLAPSE_MIN_DEGREE) -> dict:
+    """
+    Summary view of a laid-out graph: nodes with at least min_degree connections stay,
+    the rest are merged into one cluster node per community, placed at the members' centroid.
+    Parallel edges between the same pair of (cluster) nodes are merged with a count.
+    """
+    ids, edges = _edge_array(payload)
+    if not ids:
+        return {"nodes": [], "edges": [], "options": STATIC_OPTIONS}
+    degree = np.bincount(edges.ravel(), minlength=len(ids)) if len(edges) else np.zeros(len(ids), dtype=int)
+    labels = communities(len(ids), edges)
+    labels[degree == 0] = -1  # unconnected entities share one cluster
+    positions = np.array([[node.get("x", 0.0), node.get("y", 0.0)] for node in payload["nodes"]])
+
+    members: Dict[int, List[int]] = defaultdict(list)
+    for n in range(len(ids)):
+        if degree[n] < min_degree:
+            members[int(labels[n])].append(n)
+
+    target = {n: ids[n] for n in range(len(ids)) if degree[n] >= min_degree}
+    nodes = [
+        {**payload["nodes"][n], "size": int(8 + 2 * np.sqrt(degree[n]))}
+        for n in range(len(ids)) if degree[n] >= min_degree
+    ]
+    for community, group in members.items():
+        if len(group) == 1:
+            # A cluster of one is just the node itself
+            target[group[0]] = ids[group[0]]
+            nodes.append(payload["nodes"][group[0]])
+            continue
+        cluster_id = f"cluster:{community}"
+        for n in group:
+            target[n] = cluster_id
+        sample = ", ".join(ids[n] for n in sorted(group, key=lambda n: -degree[n])[:5])
+        centroid = positions[group].mean(axis=0)
+        nodes.append({
+            "id": cluster_id,
+            "label": f"{len(group)} entities",
+            "title": sample + ("..." if len(group) > 5 else ""),
+            "x": round(float(centroid[0]), 1),
+            "y": round(float(centroid[1]), 1),
+            "size": int(10 + 3 * np.sqrt(len(group))),
+            "shape": "dot",
+            "color": "#9e9e9e",
+            "members": len(group),
+        })
+
+    merged = Counter()
+    for source, target_node in edges:
+        pair = (target[int(source)], target[int(target_node)])
+        if pair[0] != pair[1]:
+            merged[pair] += 1
+    original = {(edge["from"], edge["to"]): edge["label"] for edge in payload["edges"]}
+    collapsed_edges = []
+    for (source, target_node), count in merged.items():
+        label = original.get((source, target_node), "") if count == 1 else f"{count} relations"
+        collapsed_edges.append({"from": source, "to": target_node, "label": label, "value": count})
+    return {"nodes": nodes, "edges": collapsed_edges, "options": STATIC_OPTIONS}
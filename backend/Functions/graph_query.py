@@ -0,0 +1,188 @@
+# Functions/graph_query.py
+import os
+import json
+import threading
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+
+load_dotenv()
+
+GRAPH_INDEX_CACHE_SIZE = int(os.getenv("GRAPH_INDEX_CACHE_SIZE", 32))
+MAX_SUBGRAPH_NODES = int(os.getenv("MAX_SUBGRAPH_NODES", 500))
+
+GRAPH_STORE_FILE = "graph_store.json"
+
+
+class EntityNotFound(KeyError):
+    pass
+
+
+class GraphIndex:
+    """
+    Adjacency lists over the triplets of a persisted SimpleGraphStore.
+    Entities are interned to integer ids by their exact name, as the graph page shows them;
+    lookups by name fall back to a case-insensitive match when there is no exact one.
+    """
+
+    def __init__(self, graph_dict: Dict[str, List[List[str]]]):
+        self.names: List[str] = []
+        self._ids: Dict[str, int] = {}
+        self._folded: Dict[str, List[int]] = {}
+        self.out_edges: List[List[Tuple[int, str]]] = []
+        self.in_edges: List[List[Tuple[int, str]]] = []
+        for subject, relations in graph_dict.items():
+            source = self._intern(subject)
+            for relation, obj in relations:
+                target = self._intern(obj)
+                self.out_edges[source].append((target, relation))
+                self.in_edges[target].append((source, relation))
+
+    def _intern(self, name: str) -> int:
+        if name not in self._ids:
+            self._ids[name] = len(self.names)
+            self._folded.setdefault(name.strip().casefold(), []).append(len(self.names))
+            self.names.append(name)
+            self.out_edges.append([])
+            self.in_edges.append([])
+        return self._ids[name]
+
+    @property
+    def edge_count(self) -> int:
+        return sum(len(edges) for edges in self.out_edges)
+
+    def resolve(self, entity: str) -> int:
+        """Node of the exact name, else of the first entity whose name matches ignoring case"""
+        node = self._ids.get(entity, self._ids.get(entity.strip()))
+        if node is not None:
+            return node
+        matches = self._folded.get(entity.strip().casefold())
+        if not matches:
+            raise EntityNotFound(entity)
+        return matches[0]
+
+    def degree(self, node: int) -> int:
+        return len(self.out_edges[node]) + len(self.in_edges[node])
+
+    def _neighbors(self, node: int):
+        for target, _ in self.out_edges[node]:
+            yield target
+        for source, _ in self.in_edges[node]:
+            yield source
+
+    def subgraph(self, nodes) -> dict:
+        """Node/edge JSON (the graph_view payload shape) of the edges between `nodes`"""
+        selected = set(nodes)
+        return {
+            "nodes": [{"id": self.names[n], "label": self.names[n], "degree": self.degree(n)} for n in nodes],
+            "edges": [
+                {"from": self.names[source], "to": self.names[target], "label": relation}
+                for source in nodes
+                for target, relation in self.out_edges[source]
+                if target in selected
+            ],
+        }
+
+    def neighborhood(self, entity: str, hops: int = 1, limit: int = MAX_SUBGRAPH_NODES) -> dict:
+        """Entities within `hops` edges of entity (either direction), nearest first, at most `limit`"""
+        start = self.resolve(entity)
+        depth = {start: 0}
+        queue = deque([start])
+        truncated = False
+        while queue:
+            node = queue.popleft()
+            if depth[node] == hops:
+                continue
+            for neighbor in self._neighbors(node):
+                if neighbor in depth:
+                    continue
+                if len(depth) >= limit:
+                    truncated = True
+                    queue.clear()
+                    break
+                depth[neighbor] = depth[node] + 1
+                queue.append(neighbor)
+        result = self.subgraph(list(depth))
+        result["truncated"] = truncated
+        return result
+
+    def shortest_path(self, source: str, target: str, max_hops: int = 6) -> Optional[dict]:
+        """Shortest undirected path as a subgraph, or None when the entities are further than max_hops apart"""
+        start, goal = self.resolve(source), self.resolve(target)
+        parents = {start: None}
+        frontier = [start]
+        for _ in range(max_hops):
+            if goal in parents or not frontier:
+                break
+            next_frontier = []
+            for node in frontier:
+                for neighbor in self._neighbors(node):
+                    if neighbor not in parents:
+                        parents[neighbor] = node
+                        next_frontier.append(neighbor)
+            frontier = next_frontier
+        if goal not in parents:
+            return None
+
+        path = [goal]
+        while parents[path[-1]] is not None:
+            path.append(parents[path[-1]])
+        path.reverse()
+
+        steps = set(zip(path, path[1:])) | set(zip(path[1:], path))
+        result = self.subgraph(path)
+        result["edges"] = [
+            edge for edge in result["edges"]
+            if (self._ids[edge["from"]], self._ids[edge["to"]]) in steps
+        ]
+        result["path"] = [self.names[node] for node in path]
+        return result
+
+    def top_entities(self, limit: int = 20) -> List[dict]:
+        ranked = sorted(range(len(self.names)), key=lambda node: -self.degree(node))[:limit]
+        return [
+            {
+                "id": self.names[node],
+                "degree": self.degree(node),
+                "out_degree": len(self.out_edges[node]),
+                "in_degree": len(self.in_edges[node]),
+            }
+            for node in ranked
+        ]
+
+
+def load_graph_index(graph_dir: str) -> GraphIndex:
+    """Build the index straight from graph_store.json, without loading the llama_index stores"""
+    with open(os.path.join(graph_dir, GRAPH_STORE_FILE), "r", encoding="utf-8") as f:
+        return GraphIndex(json.load(f).get("graph_dict", {}))
+
+
+class GraphIndexCache:
+    """Built indexes per graph directory, rebuilt when graph_store.json changes on disk"""
+
+    def __init__(self, max_entries: int = GRAPH_INDEX_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, graph_dir: str) -> GraphIndex:
+        path = os.path.join(graph_dir, GRAPH_STORE_FILE)
+        if not os.path.exists(path):
+            raise FileNotFoundError(path)
+        version = os.stat(path).st_mtime
+        with self._lock:
+            entry = self._entries.get(graph_dir)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(graph_dir)
+                return entry[1]
+
+        index = load_graph_index(graph_dir)
+        with self._lock:
+            self._entries[graph_dir] = (version, index)
+            self._entries.move_to_end(graph_dir)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return index
+
+
+graph_index_cache = GraphIndexCache()
@@ -0,0 +1,64 @@
+# Functions/graph_view.py
+import os
+import json
+import glob
+import hashlib
+from functools import lru_cache
+from typing import Optional, Tuple
+
+TEMPLATE_PATH = os.path.join(os.path.dirname(__file__), "templates", "knowledge_graph.html")
+# The vis-network files served next to the page; pyvis ships them with its templates
+ASSET_TYPES = {
+    "vis-network.min.js": "application/javascript",
+    "vis-network.css": "text/css",
+}
+
+
+def graph_payload(nx_graph) -> dict:
+    """Compact node/edge JSON of a KnowledgeGraphIndex networkx graph"""
+    nodes = [{"id": str(node), "label": str(node)} for node in nx_graph.nodes()]
+    edges = [
+        {"from": str(source), "to": str(target), "label": str(data.get("label") or data.get("title") or "")}
+        for source, target, data in nx_graph.edges(data=True)
+    ]
+    return {"nodes": nodes, "edges": edges}
+
+
+def graph_hash(payload: dict) -> str:
+    """Content hash of a stored graph, kept next to it so reads need not rehash"""
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def page_etag(stored_hash: str, view: str = "full") -> str:
+    """ETag of the rendered page: the graph content and view plus the template it is rendered with"""
+    return f'"{hashlib.sha256((stored_hash + view + _template()).encode("utf-8")).hexdigest()[:32]}"'
+
+
+def data_etag(stored_hash: str, view: str = "full") -> str:
+    return f'"{hashlib.sha256((stored_hash + view).encode("utf-8")).hexdigest()[:32]}"'
+
+
+@lru_cache(maxsize=1)
+def _template() -> str:
+    with open(TEMPLATE_PATH, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def render_graph_page(payload: dict, asset_base: str) -> str:
+    """The shared HTML template with the graph JSON inlined; vis-network is loaded from asset_base"""
+    # Keep "</script>" inside labels from closing the inline script
+    graph_json = json.dumps(payload, separators=(",", ":")).replace("</", "<\\/")
+    return _template().replace("{{asset_base}}", asset_base.rstrip("/")).replace("{{graph_json}}", graph_json)
+
+
+@lru_cache(maxsize=None)
+def read_asset(name: str) -> Optional[Tuple[bytes, str]]:
+    """(content, media type) of a vis-network asset bundled with pyvis, or None"""
+    if name not in ASSET_TYPES:
+        return None
+    import pyvis
+    matches = sorted(glob.glob(os.path.join(os.path.dirname(pyvis.__file__), "**", name), recursive=True))
+    if not matches:
+        return None
+    with open(matches[-1], "rb") as f:
+        return f.read(), ASSET_TYPES[name]
@@ -0,0 +1,103 @@
+# Functions/index_cache.py
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Optional, Tuple
+from dotenv import load_dotenv
+
+load_dotenv()
+
+INDEX_CACHE_MAX_BYTES = int(os.getenv("INDEX_CACHE_MAX_BYTES", 1024 * 1024 * 1024))
+
+
+def persist_dir_footprint(persist_dir: str) -> Tuple[int, float]:
+    """Total size and newest mtime of the persisted store files"""
+    size, version = 0, 0.0
+    for root, _, filenames in os.walk(persist_dir):
+        for filename in filenames:
+            stat = os.stat(os.path.join(root, filename))
+            size += stat.st_size
+            version = max(version, stat.st_mtime)
+    return size, version
+
+
+class CachedIndex:
+    def __init__(self, index: Any, size: int, version: float):
+        self.index = index
+        self.size = size
+        self.version = version
+        self._query_engine = None
+        self._streaming_query_engine = None
+
+    @property
+    def query_engine(self):
+        if self._query_engine is None:
+            self._query_engine = self.index.as_query_engine()
+        return self._query_engine
+
+    @property
+    def streaming_query_engine(self):
+        if self._streaming_query_engine is None:
+            self._streaming_query_engine = self.index.as_query_engine(streaming=True)
+        return self._streaming_query_engine
+
+
+class IndexCache:
+    """
+    Process-wide LRU of loaded RAG indexes keyed by (user_id, conversation_id).
+    The persisted JSON size is used as the memory estimate of each entry; a
+    persist dir rewritten on disk (e.g. by another worker) is detected by its mtime.
+    """
+
+    def __init__(self, max_bytes: int = INDEX_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+
+    def get(self, key: Tuple[str, str], persist_dir: str, loader: Callable[[str], Any]) -> CachedIndex:
+        """Return the cached index for key, loading it with loader(persist_dir) on a miss"""
+        size, version = persist_dir_footprint(persist_dir)
+        entry = self._lookup(key, version)
+        if entry is not None:
+            return entry
+
+        # Serialize loads so two questions on a cold conversation deserialize it once
+        with self._load_lock:
+            entry = self._lookup(key, version)
+            if entry is None:
+                entry = CachedIndex(loader(persist_dir), size, version)
+                self._store(key, entry)
+        return entry
+
+    def _lookup(self, key, version) -> Optional[CachedIndex]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.version != version:
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def _store(self, key, entry: CachedIndex):
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = entry
+            self._total_bytes += entry.size
+            while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._total_bytes -= entry.size
+
+    def invalidate(self, key: Tuple[str, str]):
+        with self._lock:
+            self._remove(key)
+
+
+index_cache = IndexCache()
@@ -0,0 +1,148 @@
+# Functions/ingest.py
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Tuple
+from llama_index.core import Document, KnowledgeGraphIndex, VectorStoreIndex, Settings
+from llama_index.core import StorageContext, load_index_from_storage
+from llama_index.core.graph_stores import SimpleGraphStore
+from llama_index.core.storage.docstore import SimpleDocumentStore
+from llama_index.core.schema import BaseNode, MetadataMode
+from dotenv import load_dotenv
+from Functions.triplets import BatchedTripletExtractor
+
+load_dotenv()
+
+INGEST_EMBED_WORKERS = int(os.getenv("INGEST_EMBED_WORKERS", 4))
+INGEST_EMBED_BATCH = int(os.getenv("INGEST_EMBED_BATCH", 100))
+MAX_TRIPLETS_PER_CHUNK = 2
+
+# progress(counter, amount) is called from worker threads as the build advances
+ProgressCallback = Callable[[str, int], None]
+
+
+def no_progress(counter: str, amount: int = 1):
+    pass
+
+
+def page_document(text: str, file_name: str, page_label: str, digest: str) -> Document:
+    """
+    One PDF page as a llama_index Document. Only the page text is embedded, so a
+    renamed re-upload of the same file hits the embedding cache; the file name and
+    page stay visible to the LLM for citations, and the digest is bookkeeping only.
+    """
+    return Document(
+        text=text,
+        metadata={"file_name": file_name, "page_label": page_label, "digest": digest},
+        excluded_embed_metadata_keys=["file_name", "page_label", "digest"],
+        excluded_llm_metadata_keys=["digest"],
+    )
+
+
+def chunk_documents(documents: List[Document]) -> List[BaseNode]:
+    """Split documents into the nodes shared by the graph and the vector index"""
+    return Settings.node_parser.get_nodes_from_documents(documents)
+
+
+def legacy_graph_nodes(persist_dir: str, graph_dir: str) -> List[BaseNode]:
+    """
+    Nodes already in the vector docstore of a conversation indexed before the graph was
+    persisted next to it. Their graph was never saved, so it has to be rebuilt from them.
+    """
+    if os.path.exists(graph_dir) or not os.path.exists(os.path.join(persist_dir, "docstore.json")):
+        return []
+    return list(SimpleDocumentStore.from_persist_dir(persist_dir).docs.values())
+
+
+def build_graph_index(
+    nodes: List[BaseNode], graph_dir: str, existing: bool, progress: ProgressCallback = no_progress
+) -> KnowledgeGraphIndex:
+    """
+    Extract triplets for nodes in batched, concurrent LLM calls and merge them into the
+    (possibly persisted) graph store, the same way KnowledgeGraphIndex builds it.
+    """
+    if existing and os.path.exists(graph_dir):
+        kg_index = load_index_from_storage(StorageContext.from_defaults(persist_dir=graph_dir))
+        kg_index.max_triplets_per_chunk = MAX_TRIPLETS_PER_CHUNK
+    else:
+        kg_index = KnowledgeGraphIndex(
+            nodes=[],
+            max_triplets_per_chunk=MAX_TRIPLETS_PER_CHUNK,
+            storage_context=StorageContext.from_defaults(graph_store=SimpleGraphStore()),
+        )
+
+    extractor = BatchedTripletExtractor(max_triplets_per_chunk=MAX_TRIPLETS_PER_CHUNK)
+    triplets_per_node = extractor.extract_sync(
+        [node.get_content(metadata_mode=MetadataMode.LLM) for node in nodes], progress
+    )
+
+    kg_index.docstore.add_documents(nodes, allow_update=True)
+    for node, triplets in zip(nodes, triplets_per_node):
+        for triplet in triplets:
+            kg_index.upsert_triplet_and_node(triplet, node)
+    kg_index.storage_context.index_store.add_index_struct(kg_index.index_struct)
+    kg_index.storage_context.persist(graph_dir)
+    return kg_index
+
+
+def build_vector_index(
+    nodes: List[BaseNode], persist_dir: str, existing: bool, progress: ProgressCallback = no_progress
+) -> VectorStoreIndex:
+    """Embed nodes in concurrent batches and merge them into the (possibly persisted) vector index"""
+    if existing:
+        vector_index = load_index_from_storage(StorageContext.from_defaults(persist_dir=persist_dir))
+    else:
+        vector_index = VectorStoreIndex(nodes=[], storage_context=StorageContext.from_defaults())
+
+    # Copies, so the embeddings do not leak into the graph docstore
+    vector_nodes = [node.model_copy() for node in nodes]
+    batches = [
+        vector_nodes[start:start + INGEST_EMBED_BATCH]
+        for start in range(0, len(vector_nodes), INGEST_EMBED_BATCH)
+    ]
+
+    def embed_batch(batch: List[BaseNode]):
+        texts = [node.get_content(metadata_mode=MetadataMode.EMBED) for node in batch]
+        for node, embedding in zip(batch, Settings.embed_model.get_text_embedding_batch(texts)):
+            node.embedding = embedding
+        progress("embeddings", len(batch))
+
+    with ThreadPoolExecutor(max_workers=INGEST_EMBED_WORKERS) as pool:
+        list(pool.map(embed_batch, batches))
+
+    vector_index.insert_nodes(vector_nodes)
+    vector_index.storage_context.persist(persist_dir)
+    return vector_index
+
+
+def _timed(fn, *args) -> Tuple[object, float]:
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, round(time.perf_counter() - start, 3)
+
+
+def run_pipeline(
+    documents: List[Document],
+    persist_dir: str,
+    graph_dir: str,
+    existing: bool,
+    progress: ProgressCallback = no_progress,
+) -> Tuple[KnowledgeGraphIndex, Dict[str, float]]:
+    """
+    Chunk once, then build the knowledge graph and the vector index at the same time.
+    Returns the graph index and per-stage wall times in seconds.
+    """
+    timings = {}
+    nodes, timings["chunk_s"] = _timed(chunk_documents, documents)
+    progress("chunks", len(nodes))
+
+    # Read before the vector build re-persists the docstore with the new nodes
+    graph_nodes = (legacy_graph_nodes(persist_dir, graph_dir) if existing else []) + nodes
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        graph_future = pool.submit(_timed, build_graph_index, graph_nodes, graph_dir, existing, progress)
+        vector_future = pool.submit(_timed, build_vector_index, nodes, persist_dir, existing, progress)
+        kg_index, timings["graph_s"] = graph_future.result()
+        _, timings["vector_s"] = vector_future.result()
+
+    return kg_index, timings
@@ -0,0 +1,187 @@
+# Functions/jobs.py
+import os
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+from bson import ObjectId
+from dotenv import load_dotenv
+from database import ingest_jobs_collection
+
+load_dotenv()
+
+INGEST_JOB_WORKERS = int(os.getenv("INGEST_JOB_WORKERS", 2))
+JOB_PROGRESS_FLUSH_SECONDS = float(os.getenv("JOB_PROGRESS_FLUSH_SECONDS", 1.0))
+
+TERMINAL_STATUSES = ("completed", "failed")
+
+
+class JobConflictError(Exception):
+    """A job of the same kind is already queued or running for the conversation"""
+
+
+def serialize_job(job: dict) -> dict:
+    """Make a job document JSON friendly"""
+    job = dict(job)
+    job["job_id"] = str(job.pop("_id"))
+    for field in ("created_at", "updated_at", "finished_at"):
+        if job.get(field):
+            job[field] = job[field].isoformat()
+    return job
+
+
+class JobProgress:
+    """Counters reported by the ingest pipeline from worker threads"""
+
+    def __init__(self, manager: "JobManager", job_id: str):
+        self._manager = manager
+        self._job_id = job_id
+        self._lock = threading.Lock()
+        self._last_flush = 0.0
+        self.counters = {"chunks": 0, "chunks_processed": 0, "triplets": 0, "embeddings": 0}
+
+    def __call__(self, counter: str, amount: int = 1):
+        with self._lock:
+            self.counters[counter] = self.counters.get(counter, 0) + amount
+            now = time.monotonic()
+            if now - self._last_flush < JOB_PROGRESS_FLUSH_SECONDS:
+                return
+            self._last_flush = now
+            snapshot = dict(self.counters)
+        self._manager.update(self._job_id, {"progress": snapshot})
+
+    def stage(self, stage: str):
+        with self._lock:
+            snapshot = dict(self.counters)
+        self._manager.update(self._job_id, {"stage": stage, "progress": snapshot})
+
+
+class JobManager:
+    """
+    Runs ingestion jobs on a bounded thread pool. Job state is written to Mongo so any
+    worker can report it, and mirrored in memory so the local progress stream is cheap.
+    Only one job of a kind runs per conversation at a time, since they write the same index.
+    """
+
+    def __init__(self, max_workers: int = INGEST_JOB_WORKERS):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest-job")
+        self._jobs: Dict[str, dict] = {}
+        # (kind, conversation_id) -> job_id of the unfinished job holding it
+        self._active: Dict[Tuple[str, str], str] = {}
+        # Guards both dicts: workers update jobs while the loop serializes them
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def submit(
+        self,
+        kind: str,
+        owner: dict,
+        work: Callable[[JobProgress], dict],
+        finalize: Callable[[dict], Awaitable[dict]],
+    ) -> str:
+        """
+        Queue work(progress) on the pool; finalize(result) runs on the event loop afterwards.
+        Raises JobConflictError while another job of this kind runs for owner's conversation.
+        """
+        self._loop = asyncio.get_running_loop()
+        slot = (kind, owner["conversation_id"]) if owner.get("conversation_id") else None
+        if slot is not None:
+            with self._lock:
+                if slot in self._active:
+                    raise JobConflictError(f"A {kind} job is already running for this conversation")
+                # Held from here on, so a second request cannot slip in while the job is inserted
+                self._active[slot] = None
+        now = datetime.utcnow()
+        job = {
+            "kind": kind,
+            **owner,
+            "status": "queued",
+            "stage": None,
+            "progress": {},
+            "result": None,
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+        }
+        try:
+            inserted = await ingest_jobs_collection.insert_one(job)
+        except BaseException:
+            if slot is not None:
+                with self._lock:
+                    self._active.pop(slot, None)
+            raise
+        job_id = str(inserted.inserted_id)
+        job["_id"] = job_id
+        with self._lock:
+            self._jobs[job_id] = job
+            if slot is not None:
+                self._active[slot] = job_id
+        self._pool.submit(self._run, job_id, work, finalize)
+        return job_id
+
+    def _forget(self, job_id: str):
+        with self._lock:
+            self._jobs.pop(job_id, None)
+
+    def _run(self, job_id: str, work, finalize):
+        progress = JobProgress(self, job_id)
+        try:
+            self.update(job_id, {"status": "running"})
+            result = work(progress)
+            progress.stage("finalizing")
+            result = asyncio.run_coroutine_threadsafe(finalize(result), self._loop).result()
+            self.update(job_id, {
+                "status": "completed",
+                "progress": dict(progress.counters),
+                "result": result,
+                "finished_at": datetime.utcnow(),
+            })
+        except Exception as e:
+            self.update(job_id, {
+                "status": "failed",
+                "progress": dict(progress.counters),
+                "error": str(e),
+                "finished_at": datetime.utcnow(),
+            })
+
+    def update(self, job_id: str, fields: dict):
+        """Apply fields to the in-memory job and persist them. Safe to call from worker threads."""
+        fields = {**fields, "updated_at": datetime.utcnow()}
+        with self._lock:
+            job = self._jobs.get(job_id)
+            finished = job is not None and fields.get("status") in TERMINAL_STATUSES
+            if job is not None:
+                job.update(fields)
+            if finished:
+                for slot in [slot for slot, holder in self._active.items() if holder == job_id]:
+                    del self._active[slot]
+        if finished:
+            # Keep finished jobs around briefly for streams that are still attached
+            self._loop.call_soon_threadsafe(self._loop.call_later, 300, self._forget, job_id)
+
+        # Motor has to be called on the loop it belongs to, not on this worker thread
+        async def persist():
+            await ingest_jobs_collection.update_one({"_id": ObjectId(job_id)}, {"$set": fields})
+
+        future = asyncio.run_coroutine_threadsafe(persist(), self._loop)
+        if fields.get("status") in TERMINAL_STATUSES:
+            future.result()
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        """Current state of a job, from memory when it runs in this process, otherwise from Mongo"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return serialize_job(job)
+        if not ObjectId.is_valid(job_id):
+            return None
+        job = await ingest_jobs_collection.find_one({"_id": ObjectId(job_id)})
+        return serialize_job(job) if job else None
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+job_manager = JobManager()
@@ -1,69 +1,161 @@
 import os
-from typing import List
-from llama_index.core import SimpleDirectoryReader, KnowledgeGraphIndex, VectorStoreIndex
-from llama_index.core.graph_stores import SimpleGraphStore
+import json
+import time
+import shutil
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+from llama_index.core import Document, KnowledgeGraphIndex
 from llama_index.llms.gemini import Gemini
 from llama_index.core import Settings
 from llama_index.embeddings.gemini import GeminiEmbedding
 from llama_index.core import StorageContext, load_index_from_storage
-from pyvis.network import Network
-from database import knowledge_graph_html_collection 
-from datetime import datetime
+from Functions.extraction import document_digest, extract_pages
+from Functions.graph_layout import collapse, with_layout
+from Functions.graph_view import graph_payload
+from Functions.index_cache import index_cache
+from Functions.embedding_cache import CachedEmbedding, embedding_store
+from Functions.ingest import no_progress, page_document, run_pipeline
+from Functions.jobs import JobProgress
 
 # Initialize LLM and Embedding Model
 llm = Gemini(temperature=0, model="models/gemini-2.0-flash")
 Settings.llm = llm
-Settings.embed_model = GeminiEmbedding(
-    model_name="models/embedding-001", api_key=os.getenv("GOOGLE_API_KEY"),
+Settings.embed_model = CachedEmbedding(
+    GeminiEmbedding(model_name="models/embedding-001", api_key=os.getenv("GOOGLE_API_KEY")),
+    embedding_store,
 )
 Settings.chunk_size=512
-def process_pdfs(pdf_paths: List[str], user_id: str, conversation_id: str) -> dict:
-    """Process multiple PDFs to create merged knowledge graph and vector index"""
+
+GRAPH_SUBDIR = "graph"
+MANIFEST_FILE = "ingested.json"
+
+def load_documents(pdf_paths: List[str], skip_digests: Set[str] = frozenset()) -> Tuple[List[Document], Dict[str, str]]:
+    """
+    Build one llama_index Document per page from the shared extraction cache.
+    Files whose content digest is in skip_digests are left out; returns the
+    documents and a {digest: file_name} map of the files that were loaded.
+    """
+    documents = []
+    loaded = {}
+    for pdf_path in pdf_paths:
+        with open(pdf_path, "rb") as f:
+            pdf_bytes = f.read()
+        digest = document_digest(pdf_bytes)
+        if digest in skip_digests or digest in loaded:
+            continue
+        file_name = os.path.basename(pdf_path)
+        loaded[digest] = file_name
+        for page_number, page_text in enumerate(extract_pages(pdf_bytes), start=1):
+            if not page_text.strip():
+                continue
+            documents.append(page_document(page_text, file_name, str(page_number), digest))
+    return documents, loaded
+
+def load_manifest(persist_dir: str) -> Dict[str, str]:
+    """{digest: file_name} of every PDF already ingested into a conversation"""
+    manifest_path = os.path.join(persist_dir, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def save_manifest(persist_dir: str, manifest: Dict[str, str]):
+    with open(os.path.join(persist_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+
+def process_pdfs(
+    pdf_paths: List[str], user_id: str, conversation_id: str, append: bool = True, progress: Optional[JobProgress] = None
+) -> dict:
+    """
+    Process multiple PDFs to create merged knowledge graph and vector index.
+    With append=True and an existing index for the conversation, only PDFs that
+    were not ingested before are chunked, embedded and triplet-extracted, and
+    their nodes are merged into the persisted stores.
+    Runs synchronously (inside an ingest job); the caller stores the returned graph JSON.
+    """
     persist_dir = os.path.join("./storage", f"{user_id}_{conversation_id}")
+    graph_dir = os.path.join(persist_dir, GRAPH_SUBDIR)
+    existing = append and os.path.exists(os.path.join(persist_dir, "docstore.json"))
+    if not existing and os.path.exists(persist_dir):
+        shutil.rmtree(persist_dir)
     os.makedirs(persist_dir, exist_ok=True)
 
-    # Load and merge documents
-    documents = SimpleDirectoryReader(input_files=pdf_paths).load_data()
+    started = time.perf_counter()
+    if progress:
+        progress.stage("extracting")
+    manifest = load_manifest(persist_dir) if existing else {}
+    documents, loaded = load_documents(pdf_paths, skip_digests=set(manifest))
+    timings = {"extract_s": round(time.perf_counter() - started, 3)}
+    skipped = len(pdf_paths) - len(loaded)
 
-    # Knowledge Graph for visualization
-    graph_storage = StorageContext.from_defaults(graph_store=SimpleGraphStore())
-    kg_index = KnowledgeGraphIndex.from_documents(
-        documents,
-        max_triplets_per_chunk=2,
-        storage_context=graph_storage,
+    if not documents:
+        message = (
+            f"All {len(pdf_paths)} PDF(s) were already processed for this conversation. You can ask questions about their content."
+            if not loaded else "No extractable text was found in the uploaded PDF(s)."
+        )
+        return {
+            "status": "success",
+            "message": message,
+            "graph": None,
+            "collapsed": None,
+            "new_files": [],
+            "timings": timings,
+        }
+
+    # Chunk once, then build the graph and the vector index concurrently
+    if progress:
+        progress.stage("indexing")
+    kg_index, stage_timings = run_pipeline(
+        documents, persist_dir, graph_dir, existing, progress=progress or no_progress
     )
-    
-    # Generate visualization
-    net = Network(notebook=True, cdn_resources="in_line", directed=True)
-    net.from_nx(kg_index.get_networkx_graph())
-    html_str = net.generate_html()
-
-    # Store the HTML in MongoDB
-    html_document = {
-        "user_id": user_id,
-        "conversation_id": conversation_id,
-        "html_content": html_str,
-        "created_at": datetime.utcnow()
-    }
-    knowledge_graph_html_collection.insert_one(html_document)
-
-    # Vector Index for RAG
-    vector_storage = StorageContext.from_defaults()
-    VectorStoreIndex.from_documents(documents, storage_context=vector_storage)
-    vector_storage.persist(persist_dir)
-    
-    # Instead of just returning html_str, return a structured response
+    timings.update(stage_timings)
+
+    # Compact node/edge JSON laid out once here, so browsers render it without physics;
+    # the page itself is rendered on demand by /knowledge-graph
+    if progress:
+        progress.stage("rendering")
+    render_started = time.perf_counter()
+    graph = with_layout(graph_payload(kg_index.get_networkx_graph()))
+    collapsed = collapse(graph)
+    timings["render_s"] = round(time.perf_counter() - render_started, 3)
+
+    manifest.update(loaded)
+    save_manifest(persist_dir, manifest)
+    index_cache.invalidate((user_id, conversation_id))
+    timings["total_s"] = round(time.perf_counter() - started, 3)
+
+    message = f"Successfully processed {len(loaded)} PDF(s). You can now ask questions about their content."
+    if skipped:
+        message += f" {skipped} PDF(s) were already part of this conversation and were skipped."
+
+    # Return a structured response
     return {
         "status": "success",
-        "message": f"Successfully processed {len(pdf_paths)} PDF(s). You can now ask questions about their content.",
-        "html": html_str  # This will be stored but not displayed
+        "message": message,
+        "graph": graph,  # Stored by the caller, not displayed
+        "collapsed": collapsed,
+        "new_files": list(loaded.values()),
+        "timings": timings,
     }
+
+def load_index(persist_dir: str):
+    """Deserialize the persisted vector index of a conversation"""
+    storage_context = StorageContext.from_defaults(persist_dir=persist_dir)
+    return load_index_from_storage(storage_context)
+
 def process_text(query: str, user_id: str, conversation_id: str) -> str:
     """Query the merged RAG index"""
     persist_dir = os.path.join("./storage", f"{user_id}_{conversation_id}")
     if not os.path.exists(persist_dir):
         return "Error: No processed documents found"
 
-    storage_context = StorageContext.from_defaults(persist_dir=persist_dir)
-    index = load_index_from_storage(storage_context)
-    return str(index.as_query_engine().query(query))
\ No newline at end of file
+    cached = index_cache.get((user_id, conversation_id), persist_dir, load_index)
+    return str(cached.query_engine.query(query))
+
+def stream_text(query: str, user_id: str, conversation_id: str) -> Iterator[str]:
+    """Query the merged RAG index and return a generator of answer tokens"""
+    persist_dir = os.path.join("./storage", f"{user_id}_{conversation_id}")
+    if not os.path.exists(persist_dir):
+        return iter(["Error: No processed documents found"])
+
+    cached = index_cache.get((user_id, conversation_id), persist_dir, load_index)
+    return cached.streaming_query_engine.query(query).response_gen
@@ -0,0 +1,202 @@
+# Functions/llm.py
+import os
+import json
+import time
+import asyncio
+import hashlib
+import threading
+import inspect
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+import google.generativeai as genai
+from dotenv import load_dotenv
+from Functions.disk_cache import DiskLRUCache
+
+load_dotenv()
+genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 8))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", 120))
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+LLM_CACHE_DIR = os.getenv("LLM_CACHE_DIR", "./storage/llm_cache")
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", 7 * 24 * 3600))
+# Sampled generations above this temperature are not worth replaying
+LLM_CACHE_MAX_TEMPERATURE = float(os.getenv("LLM_CACHE_MAX_TEMPERATURE", 0.2))
+
+DEFAULT_MODEL = "gemini-2.0-flash"
+THINKING_MODEL = "gemini-2.0-flash-thinking-exp"
+
+
+T = TypeVar("T")
+
+
+class LLMTimeoutError(Exception):
+    pass
+
+
+def _start_background_loop() -> asyncio.AbstractEventLoop:
+    """Event loop on a daemon thread, for scripts that use the gateway outside the app"""
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="llm-gateway-loop", daemon=True).start()
+    return loop
+
+
+class LLMResponseCache:
+    """
+    Generated text on disk, keyed by a hash of model name, prompt and generation config.
+    Entries expire after ttl seconds; the DiskLRUCache evicts by size.
+    """
+
+    def __init__(self, cache_dir: str = LLM_CACHE_DIR, max_bytes: int = LLM_CACHE_MAX_BYTES,
+                 ttl: float = LLM_CACHE_TTL_SECONDS):
+        self.ttl = ttl
+        self._store = DiskLRUCache(cache_dir, max_bytes)
+        self._counter_lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "expired": 0, "stores": 0}
+
+    @staticmethod
+    def key(model_name: str, prompt: str, generation_config: Optional[dict]) -> str:
+        payload = json.dumps([model_name, prompt, generation_config or {}], sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _count(self, counter: str):
+        with self._counter_lock:
+            self._counters[counter] += 1
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self._store.get(key)
+        if entry is None:
+            self._count("misses")
+            return None
+        if entry["expires_at"] < time.time():
+            self._store.delete(key)
+            self._count("expired")
+            self._count("misses")
+            return None
+        self._count("hits")
+        return entry["text"]
+
+    def put(self, key: str, text: str):
+        self._store.put(key, {"expires_at": time.time() + self.ttl, "text": text})
+        self._count("stores")
+
+    def delete(self, key: str):
+        self._store.delete(key)
+
+    def stats(self) -> dict:
+        with self._counter_lock:
+            counters = dict(self._counters)
+        lookups = counters["hits"] + counters["misses"]
+        counters["hit_rate"] = round(counters["hits"] / lookups, 4) if lookups else 0.0
+        counters["ttl_seconds"] = self.ttl
+        return {**counters, **self._store.stats()}
+
+
+def cacheable(generation_config: Optional[dict]) -> bool:
+    temperature = (generation_config or {}).get("temperature")
+    return temperature is not None and temperature <= LLM_CACHE_MAX_TEMPERATURE
+
+
+async def _apply(parse: Callable[[str], Any], text: str) -> Any:
+    result = parse(text)
+    return await result if inspect.isawaitable(result) else result
+
+
+class LLMGateway:
+    """
+    Single entry point for Gemini generations.
+    Calls are awaited on the event loop, capped by a shared concurrency limit and a
+    per-call timeout, and reuse one GenerativeModel (and its connection) per configuration.
+    Low-temperature generations are answered from the response cache when present;
+    with a parse callback only answers that parse are cached.
+    """
+
+    def __init__(self, max_concurrency: int = LLM_MAX_CONCURRENCY, timeout: float = LLM_TIMEOUT_SECONDS,
+                 cache: Optional[LLMResponseCache] = None):
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.cache = cache
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._models: Dict[str, genai.GenerativeModel] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_guard = threading.Lock()
+
+    def bind_loop(self, loop: asyncio.AbstractEventLoop):
+        """The app's event loop; run_sync schedules worker-thread calls onto it"""
+        self._loop = loop
+
+    def run_sync(self, coroutine: Awaitable[T]) -> T:
+        """
+        Run a coroutine that uses the gateway from a worker thread (e.g. an ingest job)
+        on the bound loop, so the semaphore and the async clients stay on one loop.
+        """
+        with self._loop_guard:
+            if self._loop is None or not self._loop.is_running():
+                self._loop = _start_background_loop()
+            loop = self._loop
+        return asyncio.run_coroutine_threadsafe(coroutine, loop).result()
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    def _get_model(self, model_name: str, generation_config: Optional[dict]) -> genai.GenerativeModel:
+        key = f"{model_name}:{json.dumps(generation_config or {}, sort_keys=True)}"
+        if key not in self._models:
+            self._models[key] = genai.GenerativeModel(
+                model_name=model_name,
+                generation_config=generation_config,
+            )
+        return self._models[key]
+
+    async def generate(
+        self,
+        prompt: str,
+        model_name: str = DEFAULT_MODEL,
+        generation_config: Optional[dict] = None,
+        timeout: Optional[float] = None,
+        use_cache: bool = True,
+        parse: Optional[Callable[[str], Any]] = None,
+    ) -> Any:
+        """
+        Generate a completion for prompt and return its text, or parse(text) when parse is given.
+        parse (a function or coroutine function) raises for answers the caller cannot use: those
+        are not cached, and a cached answer that no longer parses is dropped and generated again.
+        """
+        cache_key = None
+        if use_cache and self.cache is not None and cacheable(generation_config):
+            cache_key = LLMResponseCache.key(model_name, prompt, generation_config)
+            cached = await asyncio.to_thread(self.cache.get, cache_key)
+            if cached is not None:
+                if parse is None:
+                    return cached
+                try:
+                    return await _apply(parse, cached)
+                except Exception:
+                    await asyncio.to_thread(self.cache.delete, cache_key)
+
+        model = self._get_model(model_name, generation_config)
+        async with self._get_semaphore():
+            try:
+                response = await asyncio.wait_for(
+                    model.generate_content_async(prompt),
+                    timeout=timeout or self.timeout,
+                )
+            except asyncio.TimeoutError:
+                raise LLMTimeoutError(f"{model_name} did not answer within {timeout or self.timeout}s")
+        text = response.text
+        result = text if parse is None else await _apply(parse, text)
+        if cache_key is not None:
+            await asyncio.to_thread(self.cache.put, cache_key, text)
+        return result
+
+
+response_cache = LLMResponseCache() if LLM_CACHE_ENABLED else None
+gateway = LLMGateway(cache=response_cache)
+
+
+async def generate(prompt: str, **kwargs) -> Any:
+    """Shortcut for gateway.generate"""
+    return await gateway.generate(prompt, **kwargs)
@@ -0,0 +1,198 @@
+# Functions/prescreen.py
+import re
+from collections import defaultdict
+from typing import Dict, List, Tuple
+import numpy as np
+
+# Nigrini's MAD bands assume large samples; with fewer figures sampling noise alone exceeds them
+BENFORD_MIN_SAMPLES = 300
+# Nigrini's first-digit mean absolute deviation bands
+BENFORD_MAD_MARGINAL = 0.012
+BENFORD_MAD_NONCONFORMING = 0.015
+OUTLIER_MIN_SAMPLES = 5
+Z_SCORE_LIMIT = 3.0
+IQR_FENCE = 3.0
+CROSS_DOC_DELTA = 0.5
+IDENTITY_TOLERANCE = 0.01
+
+BENFORD_EXPECTED = np.log10(1 + 1 / np.arange(1, 10))
+
+
+def _metric_arrays(metrics_by_document: List[List[dict]]):
+    """Flatten metrics into parallel arrays of value, document index, type and entity"""
+    values, documents, types, entities = [], [], [], []
+    for doc_idx, metrics in enumerate(metrics_by_document):
+        for item in metrics:
+            try:
+                value = float(item.get("value") or 0)
+            except (TypeError, ValueError):
+                continue
+            if value == 0 or not np.isfinite(value):
+                continue
+            values.append(value)
+            documents.append(doc_idx)
+            types.append(str(item.get("type") or "other").strip().lower())
+            entities.append(str(item.get("entity") or "").strip())
+    return np.array(values, dtype=float), np.array(documents, dtype=int), np.array(types), entities
+
+
+def _anomaly(kind: str, n: int, description: str, severity: str, documents, excerpts, confidence: float,
+             anomaly_type: str = "statistical") -> dict:
+    documents = sorted({int(doc) for doc in documents})
+    return {
+        "id": f"prescreen-{kind}-{n}",
+        "description": description,
+        "type": anomaly_type,
+        "severity": severity,
+        "affected_documents": documents,
+        "evidence": {"excerpts": excerpts, "document_references": documents},
+        "cross_document": len(documents) > 1,
+        "confidence_score": round(float(confidence), 2),
+        "source": "prescreen",
+    }
+
+
+def benford_check(values: np.ndarray, documents: np.ndarray) -> List[dict]:
+    """First-digit distribution against Benford's law, scored by mean absolute deviation"""
+    magnitudes = np.abs(values[np.abs(values) >= 10])
+    if magnitudes.size < BENFORD_MIN_SAMPLES:
+        return []
+    first_digits = np.clip((magnitudes // 10 ** np.floor(np.log10(magnitudes))).astype(int), 1, 9)
+    observed = np.bincount(first_digits, minlength=10)[1:10] / first_digits.size
+    mad = float(np.mean(np.abs(observed - BENFORD_EXPECTED)))
+    if mad <= BENFORD_MAD_MARGINAL:
+        return []
+    worst = int(np.argmax(np.abs(observed - BENFORD_EXPECTED)))
+    severity = "high" if mad > BENFORD_MAD_NONCONFORMING else "medium"
+    return [_anomaly(
+        "benford", 1,
+        f"Leading digits of {first_digits.size} reported figures deviate from Benford's law "
+        f"(MAD {mad:.4f}); digit {worst + 1} appears {observed[worst]:.1%} of the time vs. "
+        f"{BENFORD_EXPECTED[worst]:.1%} expected.",
+        severity, documents,
+        [f"digit {d + 1}: observed {observed[d]:.3f}, expected {BENFORD_EXPECTED[d]:.3f}" for d in range(9)],
+        min(0.95, 0.5 + mad * 10),
+    )]
+
+
+def outlier_check(values: np.ndarray, documents: np.ndarray, types: np.ndarray, entities: List[str]) -> List[dict]:
+    """Per metric type, flag values outside a z-score or an IQR (far-out) fence"""
+    findings = []
+    for metric_type in np.unique(types):
+        mask = types == metric_type
+        group = values[mask]
+        if group.size < OUTLIER_MIN_SAMPLES:
+            continue
+        std = group.std()
+        z_scores = np.abs(group - group.mean()) / std if std > 0 else np.zeros_like(group)
+        q1, q3 = np.percentile(group, [25, 75])
+        iqr = q3 - q1
+        iqr_out = (group < q1 - IQR_FENCE * iqr) | (group > q3 + IQR_FENCE * iqr) if iqr > 0 else np.zeros_like(group, dtype=bool)
+        z_out = z_scores > Z_SCORE_LIMIT
+
+        indices = np.flatnonzero(mask)
+        for position in np.flatnonzero(z_out | iqr_out):
+            index = indices[position]
+            both = bool(z_out[position] and iqr_out[position])
+            findings.append(_anomaly(
+                "outlier", len(findings) + 1,
+                f"{entities[index] or 'Unnamed item'} ({metric_type}) = {values[index]:,.0f} is an outlier among "
+                f"{group.size} {metric_type} figures (z-score {z_scores[position]:.1f}, "
+                f"IQR range {q1:,.0f} to {q3:,.0f}).",
+                "high" if both else "medium", [documents[index]],
+                [f"{entities[index]}: {values[index]:,.0f}"],
+                0.85 if both else 0.6,
+            ))
+    return findings
+
+
+def _entity_key(entity: str) -> str:
+    return re.sub(r"[^a-z0-9]+", " ", entity.lower()).strip()
+
+
+def cross_document_check(values: np.ndarray, documents: np.ndarray, types: np.ndarray, entities: List[str]) -> List[dict]:
+    """Same entity and metric type reported with materially different values across documents"""
+    groups: Dict[Tuple[str, str], List[int]] = defaultdict(list)
+    for index, entity in enumerate(entities):
+        if entity:
+            groups[(_entity_key(entity), types[index])].append(index)
+
+    findings = []
+    for (_, metric_type), indices in groups.items():
+        indices = np.array(indices)
+        if np.unique(documents[indices]).size < 2:
+            continue
+        group = values[indices]
+        low, high = group.min(), group.max()
+        delta = (high - low) / max(abs(low), abs(high))
+        if delta <= CROSS_DOC_DELTA:
+            continue
+        name = entities[indices[0]]
+        findings.append(_anomaly(
+            "crossdoc", len(findings) + 1,
+            f"{name} ({metric_type}) differs by {delta:.0%} between documents "
+            f"({low:,.0f} vs. {high:,.0f}).",
+            "medium" if delta > 1.0 or np.sign(low) != np.sign(high) else "low",
+            documents[indices],
+            [f"document {documents[i]}: {entities[i]} = {values[i]:,.0f}" for i in indices],
+            min(0.9, 0.4 + delta / 4),
+            anomaly_type="data",
+        ))
+    return findings
+
+
+def _find_total(metrics: List[dict], patterns: List[str]):
+    for pattern in patterns:
+        for item in metrics:
+            if re.search(pattern, str(item.get("entity", "")).lower()):
+                try:
+                    value = float(item.get("value") or 0)
+                except (TypeError, ValueError):
+                    continue
+                if value and np.isfinite(value):
+                    return value
+    return None
+
+
+def accounting_identity_check(metrics_by_document: List[List[dict]]) -> List[dict]:
+    """Per document, total assets should equal total liabilities plus equity"""
+    findings = []
+    for doc_idx, metrics in enumerate(metrics_by_document):
+        assets = _find_total(metrics, [r"^total assets"])
+        if assets is None:
+            continue
+        combined = _find_total(metrics, [r"total liabilities (and|&) (stockholders'?|shareholders'?)? ?equity"])
+        if combined is None:
+            liabilities = _find_total(metrics, [r"^total liabilities$", r"^total liabilities\b(?!.*equity)"])
+            equity = _find_total(metrics, [r"^total (stockholders'?|shareholders'?) equity", r"^total equity"])
+            if liabilities is None or equity is None:
+                continue
+            combined = liabilities + equity
+        gap = abs(assets - combined) / abs(assets)
+        if gap <= IDENTITY_TOLERANCE:
+            continue
+        findings.append(_anomaly(
+            "identity", len(findings) + 1,
+            f"Balance sheet does not balance: total assets {assets:,.0f} vs. liabilities plus equity "
+            f"{combined:,.0f} ({gap:.1%} gap).",
+            "critical" if gap > 0.05 else "high", [doc_idx],
+            [f"total assets: {assets:,.0f}", f"liabilities + equity: {combined:,.0f}"],
+            0.9, anomaly_type="logic",
+        ))
+    return findings
+
+
+def prescreen(metrics_by_document: List[List[dict]]) -> List[dict]:
+    """
+    Arithmetic anomaly checks over extracted financial_metrics, one list per document.
+    Returns anomalies in the same schema as detect.
+    """
+    values, documents, types, entities = _metric_arrays(metrics_by_document)
+    if values.size == 0:
+        return []
+    return (
+        accounting_identity_check(metrics_by_document)
+        + benford_check(values, documents)
+        + outlier_check(values, documents, types, entities)
+        + cross_document_check(values, documents, types, entities)
+    )
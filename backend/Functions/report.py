@@ -5,7 +5,7 @@ from docx.enum.text import WD_ALIGN_PARAGRAPH, WD_LINE_SPACING
 from docx.enum.style import WD_STYLE_TYPE
 from docx.oxml.ns import qn
 from docx.shared import Pt, Inches, Cm
-import google.generativeai as genai
+from Functions.llm import gateway, THINKING_MODEL
 import base64
 from io import BytesIO
 from PIL import Image
@@ -19,7 +19,7 @@ from typing import List, Dict
 
 class ReportGenerator:
     def __init__(self):
-        self.model = genai.GenerativeModel('gemini-2.0-flash-thinking-exp')
+        self.model_name = THINKING_MODEL
 
     def format_text(self, text: str) -> str:
         """Format markdown-style text to plain text"""
@@ -77,7 +77,7 @@ class ReportGenerator:
         list_style.paragraph_format.left_indent = Inches(0.25)
         list_style.paragraph_format.first_line_indent = Inches(-0.25)
 
-    def generate_summary(self, analysis_data: Dict, anomaly_data: Dict) -> str:
+    async def generate_summary(self, analysis_data: Dict, anomaly_data: Dict) -> str:
         """Generate executive summary"""
         prompt = f"""
         Create a professional financial analysis report with these sections:
@@ -103,8 +103,11 @@ class ReportGenerator:
         Highlight important points using ** for emphasis (e.g., **Critical Risk**).
         """
 
-        response = self.model.generate_content(prompt)
-        return response.text
+        return await gateway.generate(
+            prompt,
+            model_name=self.model_name,
+            generation_config={"temperature": 0.1},
+        )
 
     def add_image_with_caption(self, doc: Document, image_base64: str, caption: str):
         """Add image with caption"""
@@ -132,7 +135,8 @@ class ReportGenerator:
             analysis_data: Dict,
             anomaly_data: Dict,
             file_names: List[str],
-            conversation_id: str
+            conversation_id: str,
+            summary: str
     ) -> str:
         doc = Document()
         self.setup_document_styles(doc)
@@ -165,7 +169,6 @@ class ReportGenerator:
 
         # 1. Executive Summary
         doc.add_heading('1. Executive Summary', level=1)
-        summary = self.generate_summary(analysis_data, anomaly_data)
         for line in summary.split('\n'):
             if line.strip():
                 self.add_formatted_paragraph(doc, line)
@@ -240,7 +243,7 @@ class ReportGenerator:
                 self.add_image_with_caption(
                     doc,
                     image_data['base64'],
-                    f"Figure {idx}: {image_data['filename'].replace('.jpg', '')}"
+                    f"Figure {idx}: {os.path.splitext(image_data['filename'])[0]}"
                 )
                 doc.add_paragraph()
 
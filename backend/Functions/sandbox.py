@@ -0,0 +1,488 @@
+# Functions/sandbox.py
+import os
+import re
+import queue
+import ctypes
+import signal
+import struct
+import asyncio
+import platform
+import threading
+import traceback
+import multiprocessing
+from io import BytesIO
+from typing import Any, Iterable, List, Optional, Tuple
+from dotenv import load_dotenv
+
+load_dotenv()
+
+SANDBOX_WORKERS = int(os.getenv("SANDBOX_WORKERS", 2))
+SANDBOX_MAX_JOBS_PER_WORKER = int(os.getenv("SANDBOX_MAX_JOBS_PER_WORKER", 20))
+SANDBOX_TIMEOUT_SECONDS = float(os.getenv("SANDBOX_TIMEOUT_SECONDS", 30))
+SANDBOX_START_TIMEOUT_SECONDS = float(os.getenv("SANDBOX_START_TIMEOUT_SECONDS", 60))
+SANDBOX_CPU_SECONDS = int(os.getenv("SANDBOX_CPU_SECONDS", 20))
+SANDBOX_MEMORY_MB = int(os.getenv("SANDBOX_MEMORY_MB", 1024))
+SANDBOX_TMPFS_MB = int(os.getenv("SANDBOX_TMPFS_MB", 64))
+# Unprivileged ids generated code runs as when the app runs as root (default: nobody)
+SANDBOX_UID = int(os.getenv("SANDBOX_UID", 65534))
+SANDBOX_GID = int(os.getenv("SANDBOX_GID", 65534))
+# Extra directories to hide from generated code, besides the app's own and its working directory
+SANDBOX_HIDDEN_PATHS = [path for path in os.getenv("SANDBOX_HIDDEN_PATHS", "").split(",") if path]
+
+# Environment variables a worker keeps; API keys and database URIs are dropped
+_ENV_ALLOWLIST = ("PATH", "LANG", "LC_ALL")
+# The only writable directory, on a tmpfs private to the worker
+WORKDIR = "/tmp/sandbox"
+
+CLONE_NEWNS = 0x00020000
+CLONE_NEWCGROUP = 0x02000000
+CLONE_NEWUTS = 0x04000000
+CLONE_NEWIPC = 0x08000000
+CLONE_NEWUSER = 0x10000000
+CLONE_NEWPID = 0x20000000
+CLONE_NEWNET = 0x40000000
+
+MS_RDONLY = 0x1
+MS_NOSUID = 0x2
+MS_NODEV = 0x4
+MS_NOEXEC = 0x8
+MS_REMOUNT = 0x20
+MS_NOATIME = 0x400
+MS_NODIRATIME = 0x800
+MS_BIND = 0x1000
+MS_REC = 0x4000
+MS_PRIVATE = 0x40000
+MS_RELATIME = 0x200000
+MS_STRICTATIME = 0x1000000
+# Per-mount options from mountinfo that a read-only remount has to keep (the kernel locks them)
+_MOUNT_OPTIONS = {
+    "nosuid": MS_NOSUID, "nodev": MS_NODEV, "noexec": MS_NOEXEC, "noatime": MS_NOATIME,
+    "nodiratime": MS_NODIRATIME, "relatime": MS_RELATIME, "strictatime": MS_STRICTATIME,
+}
+
+PR_SET_PDEATHSIG = 1
+PR_SET_SECCOMP = 22
+PR_SET_NO_NEW_PRIVS = 38
+SECCOMP_MODE_FILTER = 2
+SECCOMP_RET_KILL_PROCESS = 0x80000000
+SECCOMP_RET_ERRNO = 0x00050000
+SECCOMP_RET_ALLOW = 0x7FFF0000
+BPF_LD_W_ABS = 0x20
+BPF_JEQ_K = 0x15
+BPF_JGE_K = 0x35
+BPF_JSET_K = 0x45
+BPF_RET_K = 0x06
+
+# Syscalls refused to generated code: namespaces, mounts, tracing other processes, kernel keyring,
+# module and kexec loading. Numbers per architecture: (audit arch, {name: number}).
+_SECCOMP_ARCHES = {
+    "x86_64": (0xC000003E, {
+        "ptrace": 101, "mount": 165, "umount2": 166, "pivot_root": 155, "chroot": 161, "unshare": 272,
+        "setns": 308, "keyctl": 250, "add_key": 248, "request_key": 249, "bpf": 321, "perf_event_open": 298,
+        "kexec_load": 246, "kexec_file_load": 320, "init_module": 175, "finit_module": 313,
+        "delete_module": 176, "process_vm_readv": 310, "process_vm_writev": 311, "reboot": 169,
+        "swapon": 167, "swapoff": 168, "acct": 163, "userfaultfd": 323, "open_by_handle_at": 304,
+        "name_to_handle_at": 303, "personality": 135, "clone": 56, "clone3": 435,
+    }),
+    "aarch64": (0xC00000B7, {
+        "ptrace": 117, "mount": 40, "umount2": 39, "pivot_root": 41, "chroot": 51, "unshare": 97,
+        "setns": 268, "keyctl": 219, "add_key": 217, "request_key": 218, "bpf": 280, "perf_event_open": 241,
+        "kexec_load": 104, "kexec_file_load": 294, "init_module": 105, "finit_module": 273,
+        "delete_module": 106, "process_vm_readv": 270, "process_vm_writev": 271, "reboot": 142,
+        "swapon": 224, "swapoff": 225, "acct": 89, "userfaultfd": 282, "open_by_handle_at": 265,
+        "name_to_handle_at": 264, "personality": 92, "clone": 220, "clone3": 435,
+    }),
+}
+# The new mount API (fsopen, move_mount, ...) shares its numbers across architectures
+_MOUNT_API_SYSCALLS = (428, 429, 430, 431, 432, 433, 442)
+_NAMESPACE_FLAGS = CLONE_NEWNS | CLONE_NEWCGROUP | CLONE_NEWUTS | CLONE_NEWIPC | CLONE_NEWUSER | CLONE_NEWPID | CLONE_NEWNET
+
+
+class SandboxError(Exception):
+    pass
+
+
+_libc = ctypes.CDLL(None, use_errno=True)
+
+
+def _check(result: int, action: str):
+    if result != 0:
+        error = ctypes.get_errno()
+        raise OSError(error, f"{action}: {os.strerror(error)}")
+
+
+def _mount(source: Optional[str], target: str, fstype: Optional[str], flags: int, data: Optional[str] = None):
+    encode = lambda value: value.encode() if value is not None else None
+    _check(
+        _libc.mount(encode(source), encode(target), encode(fstype), ctypes.c_ulong(flags), encode(data)),
+        f"mount {target}",
+    )
+
+
+def _write(path: str, text: str):
+    with open(path, "w") as f:
+        f.write(text)
+
+
+def _enter_namespaces():
+    """
+    New mount, network, PID and IPC namespaces; a new user namespace as well when the app
+    does not run as root, mapping only its own ids. Fails instead of running unisolated.
+    """
+    uid, gid = os.getuid(), os.getgid()
+    flags = CLONE_NEWNS | CLONE_NEWNET | CLONE_NEWPID | CLONE_NEWIPC | CLONE_NEWUTS
+    if uid != 0:
+        flags |= CLONE_NEWUSER
+    _check(_libc.unshare(ctypes.c_int(flags)), "unshare")
+    if uid != 0:
+        _write("/proc/self/setgroups", "deny")
+        _write("/proc/self/uid_map", f"{uid} {uid} 1")
+        _write("/proc/self/gid_map", f"{gid} {gid} 1")
+
+
+def _mount_points() -> List[Tuple[str, int]]:
+    """(mount point, per-mount flags to keep) of every mount, parents first"""
+    mounts = []
+    with open("/proc/self/mountinfo") as f:
+        for line in f:
+            fields = line.split()
+            point = re.sub(r"\\([0-7]{3})", lambda match: chr(int(match.group(1), 8)), fields[4])
+            flags = 0
+            for option in fields[5].split(","):
+                flags |= _MOUNT_OPTIONS.get(option, 0)
+            mounts.append((point, flags))
+    return mounts
+
+
+def _isolate_filesystem(hidden_paths: Iterable[str]):
+    """
+    Everything read-only, a fresh /proc for the new PID namespace, the app's directories
+    covered by empty read-only tmpfs mounts, and a private writable tmpfs on /tmp.
+    """
+    _mount(None, "/", None, MS_REC | MS_PRIVATE)
+    for point, flags in _mount_points():
+        try:
+            _mount(None, point, None, MS_REMOUNT | MS_BIND | MS_RDONLY | flags)
+        except FileNotFoundError:
+            # Shadowed by a mount on top of it, which is remounted in turn
+            continue
+
+    # Only processes of the sandbox are listed; the host's /proc is hidden if that is refused
+    try:
+        _mount("proc", "/proc", "proc", MS_NOSUID | MS_NODEV | MS_NOEXEC)
+    except OSError:
+        _mount("tmpfs", "/proc", "tmpfs", MS_RDONLY | MS_NOSUID | MS_NODEV | MS_NOEXEC, "size=4k")
+    for path in hidden_paths:
+        if os.path.isdir(path):
+            _mount("tmpfs", path, "tmpfs", MS_RDONLY | MS_NOSUID | MS_NODEV | MS_NOEXEC, "size=4k")
+    _mount("tmpfs", "/tmp", "tmpfs", MS_NOSUID | MS_NODEV | MS_NOEXEC, f"size={SANDBOX_TMPFS_MB}m,mode=1777")
+    os.mkdir(WORKDIR, 0o700)
+
+
+def _limit_resources():
+    import resource
+    memory = SANDBOX_MEMORY_MB * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+
+
+def _limit_cpu_for_next_job():
+    """RLIMIT_CPU counts the whole process life, so move the soft limit past the time already used"""
+    import resource
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    used = int(usage.ru_utime + usage.ru_stime) + 1
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    resource.setrlimit(resource.RLIMIT_CPU, (used + SANDBOX_CPU_SECONDS, hard))
+
+
+class _CapHeader(ctypes.Structure):
+    _fields_ = [("version", ctypes.c_uint32), ("pid", ctypes.c_int)]
+
+
+class _CapData(ctypes.Structure):
+    _fields_ = [("effective", ctypes.c_uint32), ("permitted", ctypes.c_uint32), ("inheritable", ctypes.c_uint32)]
+
+
+def _drop_privileges():
+    """
+    As root: switch to SANDBOX_UID/SANDBOX_GID. Otherwise the worker keeps the app's own
+    (unprivileged) ids and gives up the capabilities it holds in its user namespace.
+    """
+    if os.getuid() == 0:
+        os.chown(WORKDIR, SANDBOX_UID, SANDBOX_GID)
+        os.setgroups([])
+        os.setgid(SANDBOX_GID)
+        os.setuid(SANDBOX_UID)
+        if os.getuid() == 0 or os.geteuid() == 0:
+            raise OSError("Sandbox worker is still root")
+    else:
+        header = _CapHeader(0x20080522, 0)  # _LINUX_CAPABILITY_VERSION_3
+        _check(_libc.capset(ctypes.byref(header), (_CapData * 2)()), "capset")
+    _check(_libc.prctl(PR_SET_NO_NEW_PRIVS, ctypes.c_ulong(1), ctypes.c_ulong(0), ctypes.c_ulong(0),
+                       ctypes.c_ulong(0)), "prctl(PR_SET_NO_NEW_PRIVS)")
+
+
+def _seccomp_program() -> bytes:
+    """Classic BPF: refuse the _SECCOMP_ARCHES syscalls and namespace flags on clone, allow the rest"""
+    machine = platform.machine()
+    if machine not in _SECCOMP_ARCHES:
+        raise OSError(f"No seccomp filter for {machine}")
+    audit_arch, numbers = _SECCOMP_ARCHES[machine]
+    statement = lambda code, k, jump_true=0, jump_false=0: struct.pack("HBBI", code, jump_true, jump_false, k)
+    deny = statement(BPF_RET_K, SECCOMP_RET_ERRNO | 1)  # EPERM
+
+    program = [
+        statement(BPF_LD_W_ABS, 4),  # seccomp_data.arch
+        statement(BPF_JEQ_K, audit_arch, 1, 0),
+        statement(BPF_RET_K, SECCOMP_RET_KILL_PROCESS),
+        statement(BPF_LD_W_ABS, 0),  # seccomp_data.nr
+    ]
+    if machine == "x86_64":
+        # x32 ABI syscalls
+        program += [statement(BPF_JGE_K, 0x40000000, 0, 1), deny]
+    refused = [number for name, number in numbers.items() if name not in ("clone", "clone3")]
+    for number in (*refused, *_MOUNT_API_SYSCALLS):
+        program += [statement(BPF_JEQ_K, number, 0, 1), deny]
+    # clone3 passes its flags in memory the filter cannot read; ENOSYS makes libc fall back to clone
+    program += [statement(BPF_JEQ_K, numbers["clone3"], 0, 1), statement(BPF_RET_K, SECCOMP_RET_ERRNO | 38)]
+    program += [
+        statement(BPF_JEQ_K, numbers["clone"], 0, 3),
+        statement(BPF_LD_W_ABS, 16),  # low half of seccomp_data.args[0], the clone flags
+        statement(BPF_JSET_K, _NAMESPACE_FLAGS, 0, 1),
+        deny,
+        statement(BPF_RET_K, SECCOMP_RET_ALLOW),
+    ]
+    return b"".join(program)
+
+
+class _SockFprog(ctypes.Structure):
+    _fields_ = [("len", ctypes.c_ushort), ("filter", ctypes.c_void_p)]
+
+
+def _install_seccomp():
+    program = _seccomp_program()
+    buffer = ctypes.create_string_buffer(program, len(program))
+    fprog = _SockFprog(len(program) // 8, ctypes.addressof(buffer))
+    _check(_libc.prctl(PR_SET_SECCOMP, ctypes.c_ulong(SECCOMP_MODE_FILTER), ctypes.byref(fprog),
+                       ctypes.c_ulong(0), ctypes.c_ulong(0)), "prctl(PR_SET_SECCOMP)")
+
+
+def _worker_main(conn, hidden_paths: List[str]):
+    """
+    Set up the isolation, report ("ready", None) or ("error", traceback), then loop:
+    receive (code, data), run it, send back the images it saved.
+    The spawned process only enters the namespaces; its forked child is PID 1 of the new
+    PID namespace and runs the code, and dies with it.
+    """
+    try:
+        for key in list(os.environ):
+            if key not in _ENV_ALLOWLIST:
+                del os.environ[key]
+        os.environ.update(HOME=WORKDIR, TMPDIR=WORKDIR, MPLCONFIGDIR=WORKDIR)
+        _enter_namespaces()
+    except BaseException:
+        conn.send(("error", traceback.format_exc()))
+        return
+
+    child = os.fork()
+    if child:
+        conn.close()
+        _, status = os.waitpid(child, 0)
+        os._exit(os.waitstatus_to_exitcode(status) & 0xFF)
+
+    try:
+        _isolate_filesystem(hidden_paths)
+        os.chdir(WORKDIR)
+
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+        from matplotlib.figure import Figure
+
+        _limit_resources()
+        _drop_privileges()
+        # Set after the uid change, which clears it
+        _check(_libc.prctl(PR_SET_PDEATHSIG, ctypes.c_ulong(signal.SIGKILL), ctypes.c_ulong(0),
+                           ctypes.c_ulong(0), ctypes.c_ulong(0)), "prctl(PR_SET_PDEATHSIG)")
+        _install_seccomp()
+    except BaseException:
+        conn.send(("error", traceback.format_exc()))
+        os._exit(1)
+
+    captured: List[Tuple[str, bytes]] = []
+    saved_figures = set()
+
+    def capture_savefig(fig, fname, *args, **kwargs):
+        # Images go to memory instead of the filesystem
+        filename = os.path.basename(str(fname)) or f"figure_{len(captured) + 1}.png"
+        kwargs.pop("format", None)
+        extension = os.path.splitext(filename)[1].lstrip(".").lower() or "png"
+        buffer = BytesIO()
+        original_savefig(fig, buffer, *args, format="jpeg" if extension == "jpg" else extension, **kwargs)
+        captured.append((filename, buffer.getvalue()))
+        saved_figures.add(id(fig))
+
+    original_savefig = Figure.savefig
+    Figure.savefig = capture_savefig
+    conn.send(("ready", None))
+
+    while True:
+        try:
+            code, data = conn.recv()
+        except EOFError:
+            os._exit(0)
+        captured.clear()
+        saved_figures.clear()
+        _limit_cpu_for_next_job()
+        try:
+            namespace = {"__name__": "__sandbox__", "data": data, "plt": plt}
+            exec(compile(code, "<generated>", "exec"), namespace)
+            # Figures the code left open without saving them
+            for number in plt.get_fignums():
+                figure = plt.figure(number)
+                if figure.axes and id(figure) not in saved_figures:
+                    figure.savefig(f"figure_{number}.png")
+            conn.send(("ok", list(captured)))
+        except BaseException:
+            conn.send(("error", traceback.format_exc()))
+        finally:
+            plt.close("all")
+
+
+def _hidden_paths() -> List[str]:
+    """The backend directory, the working directory (storage, .env) and SANDBOX_HIDDEN_PATHS"""
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    paths = {os.path.realpath(path) for path in (backend_dir, os.getcwd(), *SANDBOX_HIDDEN_PATHS)}
+    # Covering / or a parent of /tmp would hide the sandbox's own files
+    return sorted(path for path in paths if not "/tmp/".startswith(path.rstrip("/") + "/"))
+
+
+class SandboxWorker:
+    """A worker process that is isolated and has matplotlib imported; raises SandboxError if setup fails"""
+
+    def __init__(self, context):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn, _hidden_paths()), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.jobs = 0
+        try:
+            if not self.conn.poll(SANDBOX_START_TIMEOUT_SECONDS):
+                raise SandboxError(f"Sandbox worker did not start within {SANDBOX_START_TIMEOUT_SECONDS:.0f}s")
+            status, payload = self.conn.recv()
+            if status != "ready":
+                raise SandboxError(f"Sandbox isolation failed:\n{payload}")
+        except EOFError:
+            self.stop()
+            raise SandboxError("Sandbox worker exited during setup")
+        except BaseException:
+            self.stop()
+            raise
+
+    def stop(self):
+        # The code runs in a child of this process, which is killed along with it
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(timeout=5)
+        self.conn.close()
+
+
+class SandboxPool:
+    """
+    Long-lived worker processes with matplotlib already imported that run generated
+    plotting code under memory, CPU and wall-clock limits, isolated by the kernel:
+    - its own mount, network (no interfaces up), PID, IPC and UTS namespaces;
+    - a read-only filesystem with the app's directories hidden, writable only in a private tmpfs;
+    - an unprivileged uid (SANDBOX_UID when the app runs as root), no capabilities, no_new_privs;
+    - a seccomp filter against namespace, mount, ptrace and kernel-loading syscalls.
+    Workers that cannot set all of this up fail with SandboxError instead of running code.
+    A worker is replaced after a crash, a timeout, or SANDBOX_MAX_JOBS_PER_WORKER jobs.
+    """
+
+    def __init__(self, size: int = SANDBOX_WORKERS, max_jobs: int = SANDBOX_MAX_JOBS_PER_WORKER):
+        self.size = size
+        self.max_jobs = max_jobs
+        self._context = multiprocessing.get_context("spawn")
+        self._idle: "queue.Queue[SandboxWorker]" = queue.Queue()
+        self._vacant = 0  # workers that could not be replaced, started again on demand
+        self._started = False
+        self._guard = threading.Lock()
+
+    def start(self):
+        with self._guard:
+            if self._started:
+                return
+            workers = []
+            try:
+                for _ in range(self.size):
+                    workers.append(SandboxWorker(self._context))
+            except BaseException:
+                for worker in workers:
+                    worker.stop()
+                raise
+            for worker in workers:
+                self._idle.put(worker)
+            self._vacant = 0
+            self._started = True
+
+    def shutdown(self):
+        with self._guard:
+            while not self._idle.empty():
+                self._idle.get_nowait().stop()
+            self._started = False
+
+    def _checkout(self) -> SandboxWorker:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._guard:
+            vacant = self._vacant > 0
+            if vacant:
+                self._vacant -= 1
+        if not vacant:
+            return self._idle.get()
+        try:
+            return SandboxWorker(self._context)
+        except BaseException:
+            with self._guard:
+                self._vacant += 1
+            raise
+
+    def _replace(self, worker: SandboxWorker):
+        worker.stop()
+        try:
+            self._idle.put(SandboxWorker(self._context))
+        except SandboxError as e:
+            print(f"Sandbox worker could not be replaced: {str(e)}")
+            with self._guard:
+                self._vacant += 1
+
+    def run(self, code: str, data: Any, timeout: Optional[float] = None) -> List[Tuple[str, bytes]]:
+        """Execute code with `data` in scope and return [(filename, image bytes)]"""
+        self.start()
+        worker = self._checkout()
+        healthy = False
+        try:
+            worker.conn.send((code, data))
+            if not worker.conn.poll(timeout or SANDBOX_TIMEOUT_SECONDS):
+                raise SandboxError(f"Code execution timed out ({timeout or SANDBOX_TIMEOUT_SECONDS:.0f}s)")
+            try:
+                status, payload = worker.conn.recv()
+            except EOFError:
+                raise SandboxError("Code execution exceeded its CPU or memory limit")
+            healthy = True
+            if status != "ok":
+                raise SandboxError(f"Code execution failed:\n{payload}")
+            return payload
+        finally:
+            worker.jobs += 1
+            if healthy and worker.jobs < self.max_jobs:
+                self._idle.put(worker)
+            else:
+                self._replace(worker)
+
+    async def run_async(self, code: str, data: Any, timeout: Optional[float] = None) -> List[Tuple[str, bytes]]:
+        return await asyncio.to_thread(self.run, code, data, timeout)
+
+
+sandbox_pool = SandboxPool()
@@ -0,0 +1,113 @@
+# Functions/stats.py
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+from dotenv import load_dotenv
+from pymongo.errors import DuplicateKeyError
+from database import conversations_collection, messages_collection, stats_collection
+
+load_dotenv()
+
+STATS_CACHE_TTL_SECONDS = float(os.getenv("STATS_CACHE_TTL_SECONDS", 10))
+RECENT_DAYS = 7
+
+TOTALS_ID = "totals"
+
+_cached: Optional[dict] = None
+_cached_until = 0.0
+
+
+def _day_id(moment: datetime) -> str:
+    return f"day:{moment.strftime('%Y-%m-%d')}"
+
+
+async def record(conversations: int = 0, messages: int = 0, pdfs: int = 0, at: Optional[datetime] = None):
+    """Atomically add to the dashboard counters; new conversations also count in their day bucket"""
+    increments = {
+        name: amount
+        for name, amount in (("conversations", conversations), ("messages", messages), ("pdfs", pdfs))
+        if amount
+    }
+    if not increments:
+        return
+    await stats_collection.update_one({"_id": TOTALS_ID}, {"$inc": increments}, upsert=True)
+    if conversations:
+        await stats_collection.update_one(
+            {"_id": _day_id(at or datetime.utcnow())},
+            {"$inc": {"conversations": conversations}},
+            upsert=True
+        )
+
+
+async def ensure_baseline():
+    """
+    Seed the counters from the stored history, once, under a baseline_applied flag.
+    The recount already includes whatever record() counted before it ran, so each
+    counter is raised to the recount with $max rather than added to it.
+    """
+    if await stats_collection.find_one({"_id": TOTALS_ID, "baseline_applied": True}, {"_id": 1}):
+        return
+
+    async def unwound(collection, field: str) -> int:
+        result = await collection.aggregate([
+            {"$unwind": f"${field}"},
+            {"$group": {"_id": None, "count": {"$sum": 1}}}
+        ]).to_list(length=1)
+        return result[0]["count"] if result else 0
+
+    totals = {
+        "conversations": await conversations_collection.count_documents({}),
+        "pdfs": await unwound(conversations_collection, "pdf_files"),
+        # Messages still embedded in conversations that were not migrated yet
+        "messages": await messages_collection.count_documents({})
+                    + await unwound(conversations_collection, "messages"),
+    }
+    try:
+        await stats_collection.update_one(
+            {"_id": TOTALS_ID, "baseline_applied": {"$ne": True}},
+            {"$max": totals, "$set": {"baseline_applied": True}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # The totals document exists with the flag set: another worker applied the baseline
+        return
+
+    since = datetime.utcnow() - timedelta(days=RECENT_DAYS)
+    async for day in conversations_collection.aggregate([
+        {"$match": {"created_at": {"$gte": since}}},
+        {"$group": {"_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$created_at"}}, "count": {"$sum": 1}}}
+    ]):
+        await stats_collection.update_one(
+            {"_id": f"day:{day['_id']}"},
+            {"$max": {"conversations": day["count"]}},
+            upsert=True
+        )
+
+
+async def get_dashboard_stats() -> dict:
+    """Dashboard numbers from the counter documents, cached for STATS_CACHE_TTL_SECONDS"""
+    global _cached, _cached_until
+    if _cached is not None and time.monotonic() < _cached_until:
+        return _cached
+
+    today = datetime.utcnow()
+    day_ids = [_day_id(today - timedelta(days=offset)) for offset in range(RECENT_DAYS)]
+    totals, recent = {}, 0
+    async for document in stats_collection.find({"_id": {"$in": [TOTALS_ID, *day_ids]}}):
+        if document["_id"] == TOTALS_ID:
+            totals = document
+        else:
+            recent += document.get("conversations", 0)
+
+    total_conversations = totals.get("conversations", 0)
+    total_messages = totals.get("messages", 0)
+    _cached = {
+        "total_conversations": total_conversations,
+        "total_pdfs": totals.get("pdfs", 0),
+        "recent_conversations": recent,
+        "total_messages": total_messages,
+        "avg_messages_per_conversation": round(total_messages / total_conversations, 2) if total_conversations > 0 else 0
+    }
+    _cached_until = time.monotonic() + STATS_CACHE_TTL_SECONDS
+    return _cached
@@ -0,0 +1,270 @@
+# Functions/table_parser.py
+import re
+import asyncio
+from typing import Dict, List, Optional, Tuple
+import fitz
+from Functions.extraction import document_digest, get_pool, pdf_text_cache
+
+# Bump when the parsing rules change so cached results from older rules are not reused
+PARSER_VERSION = 3
+MIN_LINE_ITEMS = 5
+ROW_TOLERANCE = 3.0  # points between word baselines that still count as one row
+COLUMN_TOLERANCE = 40.0  # points between a number and the period column it belongs to
+TITLE_ROWS = 4  # the statement title has to be among the first rows of the page
+MAX_LABEL_WORDS = 16  # longer "labels" are sentences of running text
+MIN_ALIGNED_SHARE = 0.8  # share of the rows holding numbers whose amounts sit in the period columns
+
+NUMBER_RE = re.compile(r"^\(?-?\$?\(?\d{1,3}(,\d{3})*(\.\d+)?\)?$|^\(?-?\$?\(?\d+(\.\d+)?\)?$")
+YEAR_RE = re.compile(r"^(FY)?(19|20)\d{2}$")
+DAY_RE = re.compile(r"^\d{1,2},?$")
+DATE_WORDS = {
+    "january", "february", "march", "april", "may", "june", "july", "august", "september",
+    "october", "november", "december", "year", "years", "ended", "ending", "as", "of", "at",
+    "fiscal", "three", "six", "nine", "twelve", "months", "period", "and",
+}
+DASHES = {"-", "—", "–"}
+# A label row that ends in one of these (or a comma) wraps onto the next row
+CONNECTOR_WORDS = {"and", "or", "of", "for", "to", "in", "on", "by", "from", "with", "the", "less", "net", "including"}
+
+STATEMENT_KEYWORDS = {
+    "balance_sheet": ("balance sheet", "statement of financial position", "statements of financial position"),
+    "income_statement": (
+        "income statement", "statement of operations", "statements of operations",
+        "statement of income", "statements of income", "profit and loss", "statement of earnings",
+    ),
+    "cash_flow": ("statement of cash flows", "statements of cash flows", "cash flow statement"),
+}
+
+SCALES = (
+    (re.compile(r"in\s+billions"), 1e9),
+    (re.compile(r"in\s+millions|\$\s*m\b|\(millions\)"), 1e6),
+    (re.compile(r"in\s+thousands|\$\s*000s?|\(thousands\)|'000"), 1e3),
+)
+
+
+def detect_statement(page_text: str) -> Optional[str]:
+    lowered = page_text.lower()
+    for statement, keywords in STATEMENT_KEYWORDS.items():
+        if any(keyword in lowered for keyword in keywords):
+            return statement
+    return None
+
+
+def detect_scale(page_text: str) -> float:
+    """Multiplier from headers such as "(in millions, except per share data)" """
+    lowered = page_text.lower()
+    for pattern, multiplier in SCALES:
+        if pattern.search(lowered):
+            return multiplier
+    return 1.0
+
+
+def parse_amount(token: str) -> Optional[float]:
+    """"1,234" -> 1234, "(1,234)" -> -1234, "$ 5.2" -> 5.2; anything else -> None"""
+    token = token.strip()
+    if not NUMBER_RE.match(token):
+        return None
+    negative = token.startswith("(") or token.startswith("-") or token.endswith(")")
+    cleaned = token.strip("()$-").replace("$", "").replace(",", "")
+    try:
+        value = float(cleaned)
+    except ValueError:
+        return None
+    return -value if negative else value
+
+
+def group_rows(words: List[tuple]) -> List[List[tuple]]:
+    """Cluster words into visual rows by their vertical centre, left to right"""
+    rows = []
+    for word in sorted(words, key=lambda w: ((w[1] + w[3]) / 2, w[0])):
+        centre = (word[1] + word[3]) / 2
+        if rows and abs(rows[-1][0] - centre) <= ROW_TOLERANCE:
+            rows[-1][1].append(word)
+        else:
+            rows.append([centre, [word]])
+    return [sorted(row, key=lambda w: w[0]) for _, row in rows]
+
+
+def is_date_row(row: List[tuple]) -> bool:
+    """Column headers such as "Year Ended December 31" or "December 31, 2023  2022" """
+    return all(
+        YEAR_RE.match(w[4]) or DAY_RE.match(w[4]) or w[4].strip(",.").lower() in DATE_WORDS
+        for w in row
+    )
+
+
+def _period_columns(rows: List[List[tuple]]) -> List[Tuple[str, float]]:
+    """(label, x centre) of the period columns, from the first date header row that carries years"""
+    for row in rows:
+        if not is_date_row(row):
+            continue
+        years = [(w[4], (w[0] + w[2]) / 2) for w in row if YEAR_RE.match(w[4])]
+        if years:
+            return years
+    return []
+
+
+def _title_statement(rows: List[List[tuple]]) -> Optional[str]:
+    """
+    Statement named in the page heading. Mentions further down (notes, the index of
+    financial statements) do not count, nor do heading rows that end in a page number.
+    """
+    for row in rows[:TITLE_ROWS]:
+        if any(parse_amount(w[4]) is not None for w in row):
+            continue
+        statement = detect_statement(" ".join(w[4] for w in row))
+        if statement:
+            return statement
+    return None
+
+
+def _is_heading(label: str) -> bool:
+    """Section headings such as "CURRENT ASSETS:" or "Operating expenses:" never wrap into line items"""
+    return label.endswith(":") or label.isupper()
+
+
+def _continues(pending: List[str], row_words: List[str]) -> bool:
+    """
+    Whether a row carries on the label of the amount-free row above it: a row with
+    amounts but no label of its own, or one that starts in lower case or after a
+    label that stops mid-phrase ("..., less allowance for" / "credit losses of ...").
+    """
+    label = " ".join(pending)
+    if _is_heading(label):
+        return False
+    if not row_words:
+        return True
+    return row_words[0][:1].islower() or label.endswith(",") or pending[-1].lower() in CONNECTOR_WORDS
+
+
+def classify(statement: str, section: str, label: str) -> str:
+    lowered = label.lower()
+    if statement == "balance_sheet":
+        if "equity" in lowered or section == "equity":
+            return "equity"
+        if "liabilit" in lowered or section == "liability":
+            return "liability"
+        return "asset"
+    if statement == "cash_flow":
+        return "cash_flow"
+    if re.search(r"revenue|sales|turnover", lowered):
+        return "revenue"
+    if re.search(r"cost|expense|depreciation|amortization|interest expense", lowered):
+        return "expense"
+    if re.search(r"tax", lowered):
+        return "tax"
+    if re.search(r"income|profit|earnings|loss", lowered):
+        return "profit"
+    return "other"
+
+
+def parse_statement_page(page: fitz.Page) -> Optional[List[dict]]:
+    """
+    financial_metrics for a page holding a standard statement, or None when the page
+    is not one: no statement title at the top, no year header over the amount columns,
+    too few line items, or too many rows with numbers outside those columns (prose).
+    """
+    rows = group_rows(page.get_text("words"))
+    statement = _title_statement(rows)
+    if statement is None:
+        return None
+    columns = _period_columns(rows)
+    if not columns:
+        return None
+
+    scale = detect_scale(page.get_text())
+    metrics = []
+    section = ""
+    numeric_rows = aligned_rows = 0
+    # Words of the previous row when it was all label, in case the label wraps onto this row
+    pending: List[str] = []
+    for row in rows:
+        if is_date_row(row):
+            pending = []
+            continue
+        label_words, amounts, stray = [], {}, False
+        for word in row:
+            text = word[4]
+            value = None if YEAR_RE.match(text) else parse_amount(text)
+            if value is None and text not in DASHES and text != "$":
+                if amounts:
+                    # Words after the amounts: a sentence that happens to contain numbers
+                    stray = True
+                else:
+                    label_words.append(text)
+                continue
+            if value is None:
+                continue
+            x = (word[0] + word[2]) / 2
+            period, column_x = min(columns, key=lambda column: abs(column[1] - x))
+            if abs(column_x - x) <= COLUMN_TOLERANCE:
+                amounts[period] = value
+            elif not amounts:
+                # "allowance of $94,085": an amount quoted in the label, outside the columns
+                label_words.append(text)
+
+        has_numbers = bool(amounts) or any(parse_amount(w[4]) is not None for w in row)
+        if has_numbers:
+            numeric_rows += 1
+        row_label_words = label_words
+        if pending and _continues(pending, label_words):
+            label_words = pending + label_words
+        pending = [] if amounts else label_words
+        label = " ".join(label_words).strip(" :.")
+        if not label:
+            continue
+        if not amounts:
+            # Heading rows such as "Liabilities and stockholders' equity" switch the section
+            lowered = label.lower()
+            if "equity" in lowered and "liabilit" not in lowered:
+                section = "equity"
+            elif "liabilit" in lowered:
+                section = "liability"
+            elif "asset" in lowered:
+                section = "asset"
+            continue
+        if stray or len(row_label_words) > MAX_LABEL_WORDS:
+            continue
+        aligned_rows += 1
+
+        metric_type = classify(statement, section, label)
+        if label.lower().startswith("total liabilities and") or label.lower().startswith("total liabilities &"):
+            metric_type = "liability"
+        for period, value in amounts.items():
+            metrics.append({
+                "entity": f"{label} ({period})" if len(columns) > 1 else label,
+                "value": int(round(value * scale)),
+                "type": metric_type,
+            })
+
+    if not numeric_rows or aligned_rows / numeric_rows < MIN_ALIGNED_SHARE:
+        return None
+    line_items = {metric["entity"].rsplit(" (", 1)[0] for metric in metrics}
+    return metrics if len(line_items) >= MIN_LINE_ITEMS else None
+
+
+def extract_statement_metrics(pdf_bytes: bytes) -> Dict[str, list]:
+    """
+    Run the table parser over every page. Returns {"financial_metrics": [...],
+    "unparsed_pages": [page indexes the LLM still has to read]}.
+    """
+    metrics, unparsed = [], []
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        for number, page in enumerate(doc):
+            page_metrics = parse_statement_page(page)
+            if page_metrics is None:
+                unparsed.append(number)
+            else:
+                metrics.extend(page_metrics)
+    return {"financial_metrics": metrics, "unparsed_pages": unparsed}
+
+
+async def extract_statement_metrics_async(pdf_bytes: bytes) -> Dict[str, list]:
+    """Parse on the extraction process pool, cached next to the page text by document digest"""
+    loop = asyncio.get_running_loop()
+    key = f"{document_digest(pdf_bytes)}-tables-v{PARSER_VERSION}"
+    result = await loop.run_in_executor(None, pdf_text_cache.get, key)
+    if result is None:
+        result = await loop.run_in_executor(get_pool(), extract_statement_metrics, pdf_bytes)
+        await loop.run_in_executor(None, pdf_text_cache.put, key, result)
+    return result
@@ -0,0 +1,152 @@
+# Functions/triplets.py
+import os
+import json
+import time
+import random
+import asyncio
+from typing import Callable, List, Optional, Tuple
+from dotenv import load_dotenv
+from google.api_core.exceptions import ResourceExhausted
+from Functions.llm import gateway, DEFAULT_MODEL, LLMTimeoutError
+
+load_dotenv()
+
+TRIPLET_BATCH_CHUNKS = int(os.getenv("TRIPLET_BATCH_CHUNKS", 8))
+TRIPLET_MAX_CONCURRENCY = int(os.getenv("TRIPLET_MAX_CONCURRENCY", 8))
+TRIPLET_REQUESTS_PER_MINUTE = float(os.getenv("TRIPLET_REQUESTS_PER_MINUTE", 120))
+TRIPLET_RATE_LIMIT_RETRIES = int(os.getenv("TRIPLET_RATE_LIMIT_RETRIES", 5))
+TRIPLET_BACKOFF_SECONDS = float(os.getenv("TRIPLET_BACKOFF_SECONDS", 2.0))
+MAX_KNOWLEDGE_SEQUENCE = 128  # same cap KnowledgeGraphIndex applies to each triplet element
+
+Triplet = Tuple[str, str, str]
+
+TRIPLET_PROMPT = """Extract knowledge triplets from each numbered text chunk below.
+A triplet is (subject, predicate, object). Give at most {max_triplets} triplets per chunk, avoid stopwords,
+and only use facts stated in that chunk.
+Return only JSON of the form:
+{{"chunks": [{{"chunk": 1, "triplets": [["subject", "predicate", "object"]]}}]}}
+Include every chunk number, with an empty list when a chunk has no facts.
+
+{chunks}
+"""
+
+
+class RateLimiter:
+    """Spaces request starts evenly so at most requests_per_minute begin in any minute"""
+
+    def __init__(self, requests_per_minute: float):
+        self.interval = 60.0 / requests_per_minute if requests_per_minute > 0 else 0.0
+        self._next_slot = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            now = time.monotonic()
+            wait = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+def _clean(triplet) -> Optional[Triplet]:
+    """Normalize like KnowledgeGraphIndex's own parser: unquoted, capitalized, bounded length"""
+    if not isinstance(triplet, (list, tuple)) or len(triplet) != 3:
+        return None
+    subject, predicate, obj = (str(element).strip().strip('"').capitalize() for element in triplet)
+    if not subject or not predicate or not obj:
+        return None
+    if max(len(subject), len(predicate), len(obj)) > MAX_KNOWLEDGE_SEQUENCE:
+        return None
+    return subject, predicate, obj
+
+
+def parse_batch_response(response_text: str, chunk_count: int, max_triplets: int) -> List[List[Triplet]]:
+    """Triplets per chunk, in chunk order; raises ValueError when the response is not usable"""
+    cleaned = response_text.strip()
+    if cleaned.startswith("```"):
+        cleaned = cleaned.strip("`").removeprefix("json").strip()
+    data = json.loads(cleaned)
+    if not isinstance(data, dict) or not isinstance(data.get("chunks"), list):
+        raise ValueError('Expected a JSON object with a "chunks" list')
+    results = [[] for _ in range(chunk_count)]
+    for entry in data["chunks"]:
+        if not isinstance(entry, dict) or not isinstance(entry.get("triplets", []), list):
+            raise ValueError('Expected every "chunks" entry to be an object with a "triplets" list')
+        number = entry.get("chunk")
+        if not isinstance(number, int) or not 1 <= number <= chunk_count:
+            continue
+        triplets = [t for t in (_clean(item) for item in entry.get("triplets", [])) if t]
+        results[number - 1] = triplets[:max_triplets]
+    return results
+
+
+class BatchedTripletExtractor:
+    """
+    Triplet extraction for many chunks with few LLM calls: TRIPLET_BATCH_CHUNKS chunks
+    share one JSON-output prompt, and batches run concurrently under a request rate limit.
+    A batch whose response cannot be parsed, or that times out, is split in half and retried;
+    a rate-limited (429) call is retried with exponential backoff.
+    """
+
+    def __init__(self, max_triplets_per_chunk: int, batch_size: int = TRIPLET_BATCH_CHUNKS,
+                 max_concurrency: int = TRIPLET_MAX_CONCURRENCY,
+                 requests_per_minute: float = TRIPLET_REQUESTS_PER_MINUTE):
+        self.max_triplets = max_triplets_per_chunk
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.requests_per_minute = requests_per_minute
+
+    async def _generate(
+        self, prompt: str, limiter: RateLimiter, parse: Callable[[str], List[List[Triplet]]]
+    ) -> List[List[Triplet]]:
+        for attempt in range(TRIPLET_RATE_LIMIT_RETRIES + 1):
+            await limiter.acquire()
+            try:
+                return await gateway.generate(
+                    prompt,
+                    model_name=DEFAULT_MODEL,
+                    generation_config={"temperature": 0, "response_mime_type": "application/json"},
+                    parse=parse,
+                )
+            except ResourceExhausted:
+                if attempt == TRIPLET_RATE_LIMIT_RETRIES:
+                    raise
+                # Jittered, so the concurrent batches that were throttled together do not retry together
+                await asyncio.sleep(TRIPLET_BACKOFF_SECONDS * 2 ** attempt * random.uniform(0.5, 1.5))
+
+    async def _extract_batch(self, texts: List[str], limiter: RateLimiter) -> List[List[Triplet]]:
+        chunks = "\n\n".join(f"Chunk {n}:\n{text}" for n, text in enumerate(texts, start=1))
+        try:
+            # Only responses of the expected shape are cached
+            return await self._generate(
+                TRIPLET_PROMPT.format(max_triplets=self.max_triplets, chunks=chunks),
+                limiter,
+                lambda response_text: parse_batch_response(response_text, len(texts), self.max_triplets),
+            )
+        except (ValueError, LLMTimeoutError) as e:
+            if len(texts) == 1:
+                print(f"Triplet extraction failed for a chunk: {str(e)}")
+                return [[]]
+            middle = len(texts) // 2
+            return (await self._extract_batch(texts[:middle], limiter)
+                    + await self._extract_batch(texts[middle:], limiter))
+
+    async def extract(self, texts: List[str], progress: Callable[[str, int], None]) -> List[List[Triplet]]:
+        """Triplets for each text, in order"""
+        limiter = RateLimiter(self.requests_per_minute)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def run(batch: List[str]) -> List[List[Triplet]]:
+            async with semaphore:
+                triplets = await self._extract_batch(batch, limiter)
+            progress("chunks_processed", len(batch))
+            progress("triplets", sum(len(t) for t in triplets))
+            return triplets
+
+        batches = [texts[start:start + self.batch_size] for start in range(0, len(texts), self.batch_size)]
+        results = await asyncio.gather(*(run(batch) for batch in batches))
+        return [triplets for batch in results for triplets in batch]
+
+    def extract_sync(self, texts: List[str], progress: Callable[[str, int], None]) -> List[List[Triplet]]:
+        """extract() for ingest worker threads, scheduled on the gateway's event loop"""
+        return gateway.run_sync(self.extract(texts, progress))
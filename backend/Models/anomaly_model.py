@@ -0,0 +1,6 @@
+from pydantic import BaseModel
+from typing import List
+
+# One financial_metrics list (as returned by /structured_json extraction) per document
+class PrescreenRequest(BaseModel):
+    metrics_by_document: List[List[dict]]
@@ -1,7 +1,11 @@
 from fastapi import APIRouter, UploadFile, Form, File
 from typing import List
-import PyPDF2
-from Functions.anomaly import detect
+import asyncio
+from Functions.analysis import extract_metrics_by_document
+from Functions.anomaly import detect, summarize_anomalies
+from Functions.extraction import extract_text_async
+from Functions.prescreen import prescreen
+from Models.anomaly_model import PrescreenRequest
 
 router = APIRouter()
 
@@ -11,12 +15,23 @@ async def process_pdfs_for_anomaly(
     user_id: str = Form(...),
     conversation_id: str = Form(...)
 ):
-    extracted_texts = []  # List to store extracted text
-
-    for file in files:
-        pdf_reader = PyPDF2.PdfReader(file.file)  # Open the PDF file
-        text = "\n".join([page.extract_text() for page in pdf_reader.pages if page.extract_text()])  # Extract text from each page
-        extracted_texts.append(text)  # Append extracted text to list
-    res=detect(extracted_texts)
+    contents = [await file.read() for file in files]
+    # Arithmetic checks run on the statement tables, parsed locally alongside the text.
+    # Pages without tables are left to the narrative LLM pass rather than a second
+    # LLM extraction; documents without any parsed table get the full LLM checks.
+    extracted_texts, metrics_by_document = await asyncio.gather(
+        asyncio.gather(*(extract_text_async(content) for content in contents)),
+        extract_metrics_by_document(contents, llm_fallback=False),
+    )
+    res=await detect(list(extracted_texts), metrics_by_document=metrics_by_document)
 
     return {"user_id": user_id, "conversation_id": conversation_id, "anamoly":res }
+
+@router.post("/prescreen")
+async def prescreen_metrics(request: PrescreenRequest):
+    """Numeric pre-screen only, over financial_metrics that were already extracted"""
+    anomalies = prescreen(request.metrics_by_document)
+    return {
+        "analysis_summary": summarize_anomalies(anomalies),
+        "anomalies": anomalies
+    }
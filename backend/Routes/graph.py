@@ -1,13 +1,27 @@
 # graph.py
-from datetime import datetime, timedelta
-from fastapi import APIRouter, Depends, File, UploadFile, Form, HTTPException
+from datetime import datetime
+import asyncio
+import gzip
+import json
+from fastapi import APIRouter, Depends, File, UploadFile, Form, HTTPException, Query, Request
 from security import get_current_user
-from fastapi.responses import JSONResponse
-from typing import Optional, List
+from fastapi.concurrency import run_in_threadpool, iterate_in_threadpool
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from typing import Literal, Optional, List
 import tempfile
 import os
 from database import conversations_collection
-from Functions.knowledge_graph import process_pdfs, process_text
+from Functions.conversations import (
+    CHAT_PAGE_SIZE, CHATS_PAGE_SIZE, InvalidCursor, add_messages, conversation_title,
+    get_conversation_page, get_message_page, migrate_embedded_messages, refresh_title
+)
+from Functions.graph_layout import collapse, with_layout
+from Functions.graph_query import EntityNotFound, graph_index_cache, MAX_SUBGRAPH_NODES
+from Functions.graph_view import data_etag, graph_hash, page_etag, read_asset, render_graph_page
+from Functions.knowledge_graph import GRAPH_SUBDIR, process_pdfs, process_text, stream_text
+from Functions.jobs import job_manager, JobConflictError, TERMINAL_STATUSES, JOB_PROGRESS_FLUSH_SECONDS
+from Functions.stats import get_dashboard_stats as read_dashboard_stats, record
+from pymongo import ReturnDocument
 from bson import ObjectId
 from security import get_current_user
 from typing import Annotated 
@@ -17,70 +31,91 @@ from database import knowledge_graph_html_collection
 router = APIRouter()
 
 async def create_conversation(user_id: str, initial_message: dict):
+    created_at = datetime.utcnow()
     conversation = {
         "user_id": user_id,
-        "created_at": datetime.utcnow(),
+        "created_at": created_at,
         "updated_at": datetime.utcnow(),
         "pdf_files": [],
-        "messages": [initial_message]
+        "title": conversation_title([])
     }
     result = await conversations_collection.insert_one(conversation)
-    return str(result.inserted_id)
+    conversation_id = str(result.inserted_id)
+    await record(conversations=1, at=created_at)
+    # Messages live in their own collection, keyed by conversation and timestamp
+    await add_messages(conversation_id, [initial_message])
+    return conversation_id
 
 async def update_conversation(conversation_id: str, message: dict, pdf_files: List[str] = None):
-    update_data = {
-        "$set": {"updated_at": datetime.utcnow()},
-        "$push": {"messages": message}
-    }
-    
+    await add_messages(conversation_id, [message])
+
+    update_data = {"$set": {"updated_at": datetime.utcnow()}}
     if pdf_files:
-        update_data["$push"]["pdf_files"] = {"$each": pdf_files}
+        update_data["$push"] = {"pdf_files": {"$each": pdf_files}}
     
     await conversations_collection.update_one(
         {"_id": ObjectId(conversation_id)},
         update_data
     )
+    if pdf_files:
+        await record(pdfs=len(pdf_files))
+        await refresh_title(conversation_id)
 
-# Updated /process-pdfs endpoint
-@router.post("/process-pdfs")
-async def process_pdfs_endpoint(
-    files: List[UploadFile] = File(...),
-    user_id: str = Form(...),
-    conversation_id: Optional[str] = Form(None)
-):
-    try:
-        pdf_filenames = [file.filename for file in files]
-        
-        # Create conversation first if doesn't exist
-        if not conversation_id:
-            conversation_id = await create_conversation(
-                user_id=user_id,
-                initial_message={
-                    "content": "PDF processing started",
-                    "role": "system",
-                    "timestamp": datetime.utcnow()
-                }
-            )
-
-        # Now process PDFs with valid conversation_id
+def run_pdf_ingestion(uploads: List[tuple], user_id: str, conversation_id: str, append: bool):
+    """Blocking part of an ingest job: write the uploads to disk and build the indexes"""
+    def work(progress):
         with tempfile.TemporaryDirectory() as temp_dir:
             pdf_paths = []
-            for file in files:
-                file_path = os.path.join(temp_dir, file.filename)
+            for filename, content in uploads:
+                file_path = os.path.join(temp_dir, filename)
                 with open(file_path, "wb") as f:
-                    f.write(await file.read())
+                    f.write(content)
                 pdf_paths.append(file_path)
-            
-            result = process_pdfs(pdf_paths, user_id, conversation_id)  # Now has valid ID
+            return process_pdfs(pdf_paths, user_id, conversation_id, append=append, progress=progress)
+    return work
+
+def finalize_pdf_ingestion(user_id: str, conversation_id: str, append: bool):
+    """Async part of an ingest job: persist the graph JSON and update the conversation"""
+    async def finalize(result: dict) -> dict:
+        if result["graph"] is not None:
+            # Replace the previous graph for this conversation
+            await knowledge_graph_html_collection.replace_one(
+                {"conversation_id": conversation_id},
+                {
+                    "user_id": user_id,
+                    "conversation_id": conversation_id,
+                    "graph": result["graph"],
+                    "collapsed": result["collapsed"],
+                    "graph_hash": graph_hash(result["graph"]),
+                    "created_at": datetime.utcnow()
+                },
+                upsert=True
+            )
 
         # Update conversation with PDF files and final message
-        await conversations_collection.update_one(
-            {"_id": ObjectId(conversation_id)},
-            {"$set": {
-                "pdf_files": pdf_filenames,
+        if append:
+            pdf_files_update = {
+                "$addToSet": {"pdf_files": {"$each": result["new_files"]}},
+                "$set": {"updated_at": datetime.utcnow()}
+            }
+        else:
+            pdf_files_update = {"$set": {
+                "pdf_files": result["new_files"],
                 "updated_at": datetime.utcnow()
             }}
+        before = await conversations_collection.find_one_and_update(
+            {"_id": ObjectId(conversation_id)},
+            pdf_files_update,
+            projection={"pdf_files": 1},
+            return_document=ReturnDocument.BEFORE
         )
+        previous = (before or {}).get("pdf_files", [])
+        if append:
+            added = len(set(result["new_files"]) - set(previous))
+        else:
+            added = len(result["new_files"]) - len(previous)
+        await record(pdfs=added)
+        await refresh_title(conversation_id)
         await update_conversation(
             conversation_id=conversation_id,
             message={
@@ -90,15 +125,86 @@ async def process_pdfs_endpoint(
             }
         )
 
-        return JSONResponse(content={
-            "status": "success",
+        # The graph is served by /knowledge-graph, keep the job document small
+        return {
             "message": result["message"],
-            "conversation_id": conversation_id,
-            "html": result["html"]
+            "new_files": result["new_files"],
+            "timings": result["timings"]
+        }
+    return finalize
+
+# Updated /process-pdfs endpoint: queues an ingest job and returns right away
+@router.post("/process-pdfs")
+async def process_pdfs_endpoint(
+    files: List[UploadFile] = File(...),
+    user_id: str = Form(...),
+    conversation_id: Optional[str] = Form(None),
+    append: bool = Form(True)
+):
+    try:
+        uploads = [(file.filename, await file.read()) for file in files]
+
+        # Create conversation first if doesn't exist
+        if not conversation_id:
+            conversation_id = await create_conversation(
+                user_id=user_id,
+                initial_message={
+                    "content": "PDF processing started",
+                    "role": "system",
+                    "timestamp": datetime.utcnow()
+                }
+            )
+
+        job_id = await job_manager.submit(
+            kind="process_pdfs",
+            owner={"user_id": user_id, "conversation_id": conversation_id},
+            work=run_pdf_ingestion(uploads, user_id, conversation_id, append),
+            finalize=finalize_pdf_ingestion(user_id, conversation_id, append)
+        )
+
+        return JSONResponse(status_code=202, content={
+            "status": "queued",
+            "job_id": job_id,
+            "conversation_id": conversation_id
         })
 
+    except JobConflictError as e:
+        raise HTTPException(409, str(e))
     except Exception as e:
         raise HTTPException(500, f"Processing failed: {str(e)}")
+
+@router.get("/process-pdfs/jobs/{job_id}")
+async def get_ingest_job(job_id: str):
+    job = await job_manager.get(job_id)
+    if not job:
+        raise HTTPException(404, "Job not found")
+    return JSONResponse(content=job)
+
+@router.get("/process-pdfs/jobs/{job_id}/events")
+async def stream_ingest_job(job_id: str):
+    """Server-sent events with the job state, sent whenever it changes, until the job finishes"""
+    job = await job_manager.get(job_id)
+    if not job:
+        raise HTTPException(404, "Job not found")
+
+    async def events():
+        last_sent = None
+        current = job
+        while True:
+            payload = json.dumps(current)
+            if payload != last_sent:
+                yield f"data: {payload}\n\n"
+                last_sent = payload
+            if current["status"] in TERMINAL_STATUSES:
+                break
+            await asyncio.sleep(JOB_PROGRESS_FLUSH_SECONDS)
+            current = await job_manager.get(job_id) or current
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
     
 @router.post("/query")
 async def query_endpoint(
@@ -144,118 +250,282 @@ async def query_endpoint(
     except Exception as e:
         raise HTTPException(500, f"Query failed: {str(e)}")
     
+@router.post("/query/stream")
+async def query_stream_endpoint(
+    query: str = Form(..., min_length=1),
+    user_id: str = Form(...),
+    conversation_id: Optional[str] = Form(None)
+):
+    """Same as /query, but the answer is sent as server-sent events while it is generated"""
+    user_message = {
+        "content": query,
+        "role": "user",
+        "timestamp": datetime.utcnow()
+    }
+
+    async def events():
+        nonlocal conversation_id
+        tokens = []
+        try:
+            token_gen = await run_in_threadpool(stream_text, query, user_id, conversation_id)
+            async for token in iterate_in_threadpool(token_gen):
+                tokens.append(token)
+                yield f"data: {json.dumps({'token': token})}\n\n"
+        except Exception as e:
+            yield f"data: {json.dumps({'error': f'Query failed: {str(e)}'})}\n\n"
+            return
+
+        # Persist the assembled answer once the stream is complete
+        bot_message = {
+            "content": "".join(tokens),
+            "role": "assistant",
+            "timestamp": datetime.utcnow()
+        }
+        if not conversation_id:
+            conversation_id = await create_conversation(
+                user_id=user_id,
+                initial_message=user_message
+            )
+            await update_conversation(conversation_id, bot_message)
+        else:
+            await update_conversation(conversation_id, user_message)
+            await update_conversation(conversation_id, bot_message)
+
+        yield f"data: {json.dumps({'done': True, 'conversation_id': conversation_id})}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+    
     # Add to graph.py
 @router.get("/chats")
-async def get_user_chats(user_id: Annotated[str, Depends(get_current_user)]):
-    print(user_id)
+async def get_user_chats(
+    user_id: Annotated[str, Depends(get_current_user)],
+    limit: int = Query(CHATS_PAGE_SIZE, ge=1),
+    before: Optional[str] = Query(None, description="next_cursor of the previous page")
+):
     try:
+        page, next_cursor = await get_conversation_page(user_id, limit=limit, before=before)
         conversations = []
-        async for conv in conversations_collection.find({"user_id": user_id}):
-            # Create title from PDF filenames
-            title = "New Chat"
-            if conv.get("pdf_files"):
-                title = ", ".join([os.path.splitext(f)[0] for f in conv["pdf_files"]][:3])
-                if len(conv["pdf_files"]) > 3:
-                    title += "..."
-
+        for conv in page:
             conversations.append({
                 "id": str(conv["_id"]),
-                "title": title,
+                "title": conv.get("title") or conversation_title(conv.get("pdf_files", [])),
                 "date": conv["created_at"].strftime("%d %b %Y"),
                 "created_at": conv["created_at"].strftime("%d %b %Y %H:%M:%S")  # Add time here
             })
         
-        return JSONResponse(content={"data": conversations})
+        return JSONResponse(content={"data": conversations, "next_cursor": next_cursor})
     
+    except InvalidCursor as e:
+        raise HTTPException(400, str(e))
     except Exception as e:
         raise HTTPException(500, f"Failed to fetch chats: {str(e)}")
     
 @router.get("/chat/{conversation_id}")
-async def get_chat_details(conversation_id: str):
+async def get_chat_details(
+    conversation_id: str,
+    limit: int = Query(CHAT_PAGE_SIZE, ge=1),
+    before: Optional[str] = Query(None, description="next_cursor of the previous page")
+):
+    """Conversation details with the newest `limit` messages (oldest first); page back with `before`"""
     try:
-        conv = await conversations_collection.find_one({"_id": ObjectId(conversation_id)})
+        if not ObjectId.is_valid(conversation_id):
+            raise HTTPException(404, "Conversation not found")
+        await migrate_embedded_messages(conversation_id)
+        conv = await conversations_collection.find_one({"_id": ObjectId(conversation_id)}, {"messages": 0})
         if not conv:
             raise HTTPException(404, "Conversation not found")
 
-        # Create title from PDF filenames
-        title = "New Chat"
-        if conv.get("pdf_files"):
-            title = ", ".join([os.path.splitext(f)[0] for f in conv["pdf_files"]][:3])
-            if len(conv["pdf_files"]) > 3:
-                title += "..."
+        title = conv.get("title") or conversation_title(conv.get("pdf_files", []))
+
+        messages, next_cursor = await get_message_page(conversation_id, limit=limit, before=before)
 
         # Convert datetime objects to ISO strings
         processed_messages = []
-        for msg in conv.get("messages", []):
-            message = msg.copy()
+        for msg in messages:
+            message = {key: value for key, value in msg.items() if key != "_id"}
+            message["id"] = str(msg["_id"])
             if "timestamp" in message:
                 message["timestamp"] = message["timestamp"].isoformat()
             processed_messages.append(message)
 
         return JSONResponse(content={
             "messages": processed_messages,
+            "next_cursor": next_cursor,
+            "has_more": next_cursor is not None,
             "pdf_files": conv.get("pdf_files", []),
             "title": title,  # Include the title here
             "created_at": conv.get("created_at").isoformat() if conv.get("created_at") else None,
             "updated_at": conv.get("updated_at").isoformat() if conv.get("updated_at") else None
         })
     
+    except HTTPException:
+        raise
+    except InvalidCursor as e:
+        raise HTTPException(400, str(e))
     except Exception as e:
         raise HTTPException(500, f"Failed to fetch chat: {str(e)}")
 
+GRAPH_CACHE_CONTROL = "private, no-cache"  # always revalidate, usually answered with 304
+
+def _not_modified(request: Request, etag: str) -> bool:
+    return etag in [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]
+
+def _graph_response(request: Request, content: str, media_type: str, headers: dict) -> Response:
+    """Gzip the body when the client accepts it (not app-wide, which would buffer the SSE streams)"""
+    body = content.encode("utf-8")
+    headers = {**headers, "Vary": "Accept-Encoding"}
+    if "gzip" in request.headers.get("accept-encoding", "") and len(body) > 1024:
+        body = gzip.compress(body, compresslevel=6)
+        headers["Content-Encoding"] = "gzip"
+    return Response(content=body, media_type=media_type, headers=headers)
+
+async def _load_graph_document(conversation_id: str) -> dict:
+    document = await knowledge_graph_html_collection.find_one({"conversation_id": conversation_id})
+    if not document:
+        raise HTTPException(status_code=404, detail="Knowledge graph not found")
+    return document
+
+async def _graph_view(document: dict, view: str) -> dict:
+    """
+    The stored full or collapsed payload. Graphs stored before layouts existed are
+    laid out on their first request and written back, so that happens only once.
+    """
+    graph = document["graph"]
+    laid_out = not graph["nodes"] or "x" in graph["nodes"][0]
+    if laid_out and document.get("collapsed") is not None:
+        return graph if view == "full" else document["collapsed"]
+
+    if not laid_out:
+        graph = await run_in_threadpool(with_layout, graph)
+    collapsed = await run_in_threadpool(collapse, graph)
+    await knowledge_graph_html_collection.update_one(
+        {"_id": document["_id"]},
+        {"$set": {"graph": graph, "collapsed": collapsed, "graph_hash": graph_hash(graph)}}
+    )
+    return graph if view == "full" else collapsed
+
+@router.get("/knowledge-graph/assets/{name}")
+async def get_knowledge_graph_asset(name: str, request: Request):
+    """vis-network files referenced by every rendered graph page, cached by the browser for good"""
+    asset = await run_in_threadpool(read_asset, name)
+    if asset is None:
+        raise HTTPException(status_code=404, detail="Asset not found")
+    content, media_type = asset
+    return _graph_response(request, content.decode("utf-8"), media_type,
+                           {"Cache-Control": "public, max-age=31536000, immutable"})
+
+@router.get("/knowledge-graph/{conversation_id}/data")
+async def get_knowledge_graph_data(
+    conversation_id: str,
+    request: Request,
+    view: Literal["full", "collapsed"] = "full"
+):
+    """The stored node/edge JSON of a conversation's graph, with precomputed coordinates"""
+    document = await _load_graph_document(conversation_id)
+    if "graph" not in document:
+        raise HTTPException(status_code=404, detail="Knowledge graph was stored as HTML only; re-process the PDFs")
+    etag = data_etag(document.get("graph_hash") or graph_hash(document["graph"]), view)
+    headers = {"ETag": etag, "Cache-Control": GRAPH_CACHE_CONTROL}
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    payload = await _graph_view(document, view)
+    return _graph_response(request, json.dumps(payload, separators=(",", ":")), "application/json", headers)
+
+async def _graph_index(conversation_id: str):
+    """Adjacency index of the conversation's persisted graph store, built once per version"""
+    if not ObjectId.is_valid(conversation_id):
+        raise HTTPException(404, "Conversation not found")
+    conv = await conversations_collection.find_one({"_id": ObjectId(conversation_id)}, {"user_id": 1})
+    if not conv:
+        raise HTTPException(404, "Conversation not found")
+    graph_dir = os.path.join("./storage", f"{conv['user_id']}_{conversation_id}", GRAPH_SUBDIR)
+    try:
+        return await run_in_threadpool(graph_index_cache.get, graph_dir)
+    except FileNotFoundError:
+        raise HTTPException(404, "Knowledge graph not found")
+
+@router.get("/knowledge-graph/{conversation_id}/neighborhood")
+async def get_graph_neighborhood(
+    conversation_id: str,
+    entity: str = Query(..., min_length=1),
+    hops: int = Query(1, ge=1, le=4),
+    limit: int = Query(200, ge=1, le=MAX_SUBGRAPH_NODES)
+):
+    """Entities within `hops` edges of `entity` and the edges between them"""
+    index = await _graph_index(conversation_id)
+    try:
+        return JSONResponse(content=index.neighborhood(entity, hops=hops, limit=limit))
+    except EntityNotFound:
+        raise HTTPException(404, f"Entity not found: {entity}")
+
+@router.get("/knowledge-graph/{conversation_id}/path")
+async def get_graph_path(
+    conversation_id: str,
+    source: str = Query(..., min_length=1),
+    target: str = Query(..., min_length=1),
+    max_hops: int = Query(6, ge=1, le=12)
+):
+    """Shortest chain of relations between two entities, ignoring edge direction"""
+    index = await _graph_index(conversation_id)
+    try:
+        result = index.shortest_path(source, target, max_hops=max_hops)
+    except EntityNotFound as e:
+        raise HTTPException(404, f"Entity not found: {e.args[0]}")
+    if result is None:
+        raise HTTPException(404, f"No path within {max_hops} hops")
+    return JSONResponse(content=result)
+
+@router.get("/knowledge-graph/{conversation_id}/top-entities")
+async def get_graph_top_entities(conversation_id: str, limit: int = Query(20, ge=1, le=MAX_SUBGRAPH_NODES)):
+    """The most connected entities, a starting point for neighborhood queries"""
+    index = await _graph_index(conversation_id)
+    return JSONResponse(content={
+        "node_count": len(index.names),
+        "edge_count": index.edge_count,
+        "entities": index.top_entities(limit)
+    })
+
 @router.get("/knowledge-graph/{conversation_id}", response_class=HTMLResponse)
-async def get_knowledge_graph_html(conversation_id: str):
-    print(conversation_id)
+async def get_knowledge_graph_html(
+    conversation_id: str,
+    request: Request,
+    view: Literal["full", "collapsed"] = "full"
+):
+    """
+    The graph page, rendered from the shared template and the stored graph JSON.
+    view=collapsed merges low-degree entities into community clusters for large graphs.
+    """
     try:
-        # Fetch the HTML content from MongoDB
-        html_document = await knowledge_graph_html_collection.find_one(
-            {"conversation_id": conversation_id}
-        )
-        if not html_document:
-            raise HTTPException(status_code=404, detail="Knowledge graph HTML not found")
+        document = await _load_graph_document(conversation_id)
+        if "graph" in document:
+            etag = page_etag(document.get("graph_hash") or graph_hash(document["graph"]), view)
+        else:
+            # Rendered by an older version, stored as a full HTML page
+            etag = data_etag(graph_hash({"html": document["html_content"]}))
+        headers = {"ETag": etag, "Cache-Control": GRAPH_CACHE_CONTROL}
+        if _not_modified(request, etag):
+            return Response(status_code=304, headers=headers)
 
-        # Return the HTML content
-        return HTMLResponse(content=html_document["html_content"])
+        if "graph" not in document:
+            return _graph_response(request, document["html_content"], "text/html", headers)
+        asset_base = str(request.url_for("get_knowledge_graph_asset", name="_")).rsplit("/", 1)[0]
+        payload = await _graph_view(document, view)
+        return _graph_response(request, render_graph_page(payload, asset_base), "text/html", headers)
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch knowledge graph HTML: {str(e)}")
 
 @router.get("/dashboard-stats")
 async def get_dashboard_stats():
     try:
-        # Total conversations
-        total_conversations = await conversations_collection.count_documents({})
-        
-        # Total PDF files processed
-        total_pdfs = await conversations_collection.aggregate([
-            {"$unwind": "$pdf_files"},
-            {"$group": {"_id": None, "count": {"$sum": 1}}}
-        ]).to_list(length=1)
-        total_pdfs = total_pdfs[0]["count"] if total_pdfs else 0
-        
-        # Conversations in the last 7 days
-        last_7_days = datetime.utcnow() - timedelta(days=7)
-        recent_conversations = await conversations_collection.count_documents({
-            "created_at": {"$gte": last_7_days}
-        })
-        
-        # Total number of messages across all conversations
-        total_messages = await conversations_collection.aggregate([
-            {"$unwind": "$messages"},
-            {"$group": {"_id": None, "count": {"$sum": 1}}}
-        ]).to_list(length=1)
-        total_messages = total_messages[0]["count"] if total_messages else 0
-        
-        # Average number of messages per conversation
-        avg_messages_per_conversation = total_messages / total_conversations if total_conversations > 0 else 0
-        
-        return JSONResponse(content={
-            "total_conversations": total_conversations,
-            "total_pdfs": total_pdfs,
-            "recent_conversations": recent_conversations,
-            "total_messages": total_messages,
-            "avg_messages_per_conversation": round(avg_messages_per_conversation, 2)
-        })
+        # Counters maintained on every write, see Functions/stats.py
+        return JSONResponse(content=await read_dashboard_stats())
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch dashboard stats: {str(e)}")
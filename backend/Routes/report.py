@@ -1,68 +1,45 @@
 # Routes/report.py
 from fastapi import APIRouter, UploadFile, Form, File, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import FileResponse
 from typing import List
-import tempfile
-import os
-import aiohttp
+import asyncio
+from Functions.analysis import extract_metrics_by_document, merge_metrics, render_analysis
+from Functions.anomaly import detect
+from Functions.extraction import extract_text_async
 from Functions.report import ReportGenerator
 from bson import ObjectId
 
 router = APIRouter()
 
 
-async def fetch_structured_json(files: List[UploadFile], user_id: str, conversation_id: str):
-    """Fetch structured JSON with visualizations"""
-    async with aiohttp.ClientSession() as session:
-        form_data = aiohttp.FormData()
-        for file in files:
-            await file.seek(0)
-            content = await file.read()
-            form_data.add_field('files', content, filename=file.filename)
-        form_data.add_field('user_id', user_id)
-        form_data.add_field('conversation_id', conversation_id)
+async def run_report_pipeline(files: List[UploadFile]):
+    """
+    Read every upload once, extract the text and each document's metrics concurrently,
+    then render the charts and run the anomaly detection concurrently, in-process.
+    """
+    contents = []
+    for file in files:
+        await file.seek(0)
+        contents.append(await file.read())
+    texts, metrics_by_document = await asyncio.gather(
+        asyncio.gather(*(extract_text_async(content) for content in contents)),
+        extract_metrics_by_document(contents),
+    )
+    structured_data = {"financial_metrics": merge_metrics(metrics_by_document)}
 
-        try:
-            async with session.post(
-                    'http://localhost:8000/api/analysis/structured_json/',
-                    data=form_data
-            ) as response:
-                if response.status == 200:
-                    return await response.json()
-                else:
-                    error_text = await response.text()
-                    print(f"Structured JSON API error: {error_text}")
-                    return None
-        except Exception as e:
-            print(f"Error fetching structured JSON: {str(e)}")
-            return None
-
-
-async def fetch_anomaly_data(files: List[UploadFile], user_id: str, conversation_id: str):
-    """Fetch anomaly detection results"""
-    async with aiohttp.ClientSession() as session:
-        form_data = aiohttp.FormData()
-        for file in files:
-            await file.seek(0)
-            content = await file.read()
-            form_data.add_field('files', content, filename=file.filename)
-        form_data.add_field('user_id', user_id)
-        form_data.add_field('conversation_id', conversation_id)
-
-        try:
-            async with session.post(
-                    'http://localhost:8000/api/anomaly/anomaly-processing',
-                    data=form_data
-            ) as response:
-                if response.status == 200:
-                    return await response.json()
-                else:
-                    error_text = await response.text()
-                    print(f"Anomaly API error: {error_text}")
-                    return None
-        except Exception as e:
-            print(f"Error fetching anomaly data: {str(e)}")
-            return None
+    analysis_result, anomaly_result = await asyncio.gather(
+        render_analysis(structured_data),
+        detect(list(texts), metrics_by_document=metrics_by_document),
+        return_exceptions=True
+    )
+    if isinstance(analysis_result, Exception):
+        print(f"Structured JSON error: {str(analysis_result)}")
+        analysis_result = None
+    if isinstance(anomaly_result, Exception):
+        print(f"Anomaly detection error: {str(anomaly_result)}")
+        anomaly_result = None
+    return analysis_result, anomaly_result
 
 
 @router.post("/generate-report")
@@ -82,26 +59,25 @@ async def generate_report(
             if not ObjectId.is_valid(conversation_id):
                 raise HTTPException(400, "Invalid conversation ID format")
 
-        # Get structured JSON with visualizations
-        print("Fetching structured JSON data...")
-        analysis_data = await fetch_structured_json(files, user_id, conversation_id)
+        # Get structured JSON with visualizations and anomaly detection results
+        print("Running analysis and anomaly detection...")
+        analysis_data, anomaly_data = await run_report_pipeline(files)
         if not analysis_data:
             raise HTTPException(500, "Failed to fetch structured JSON data")
-
-        # Get anomaly detection results
-        print("Fetching anomaly data...")
-        anomaly_data = await fetch_anomaly_data(files, user_id, conversation_id)
         if not anomaly_data:
             raise HTTPException(500, "Failed to fetch anomaly data")
 
         print("Generating report...")
         # Generate report
         report_generator = ReportGenerator()
-        report_path = report_generator.create_word_report(
+        summary = await report_generator.generate_summary(analysis_data, anomaly_data)
+        report_path = await run_in_threadpool(
+            report_generator.create_word_report,
             analysis_data=analysis_data,
             anomaly_data=anomaly_data,
             file_names=[f.filename for f in files],
-            conversation_id=conversation_id
+            conversation_id=conversation_id,
+            summary=summary
         )
 
         return FileResponse(
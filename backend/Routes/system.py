@@ -0,0 +1,13 @@
+# Routes/system.py
+from fastapi import APIRouter
+from Functions.llm import response_cache
+
+router = APIRouter()
+
+
+@router.get("/llm-cache")
+async def llm_cache_stats():
+    """Hit/miss counters and disk usage of the LLM response cache"""
+    if response_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **response_cache.stats()}
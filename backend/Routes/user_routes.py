@@ -1,7 +1,7 @@
 from fastapi import APIRouter, HTTPException
 from Models.user_model import UserSignup, UserLogin, Token
 from Functions.auth import get_password_hash, verify_password, create_access_token
-from database import db
+from database import users_collection
 
 router = APIRouter()
 
@@ -9,7 +9,7 @@ router = APIRouter()
 @router.post("/register", response_model=Token)
 async def register_user(user: UserSignup):
     # Check if a user with this email already exists
-    existing_user = await db.users.find_one({"email": user.email})
+    existing_user = await users_collection.find_one({"email": user.email})
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     
@@ -19,7 +19,7 @@ async def register_user(user: UserSignup):
     user_data["hashed_password"] = hashed_password
     user_data["user_type"] = "client"  # Mark the user as a client.
     
-    result = await db.users.insert_one(user_data)
+    result = await users_collection.insert_one(user_data)
     user_id = str(result.inserted_id)
     
     # Create and return a JWT token.
@@ -47,7 +47,7 @@ async def register_user(user: UserSignup):
 @router.post("/login", response_model=Token)
 async def login_user(user: UserLogin):
     # Look for the user in the database.
-    found_user = await db.users.find_one({"email": user.email})
+    found_user = await users_collection.find_one({"email": user.email})
     if not found_user:
         raise HTTPException(status_code=400, detail="Invalid credentials")
     
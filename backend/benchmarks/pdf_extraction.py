@@ -0,0 +1,70 @@
+# benchmarks/pdf_extraction.py
+"""
+Pages per second of the old serial PyPDF2 loop vs. the sharded process-pool extractor.
+
+Run from the backend folder:
+    python -m benchmarks.pdf_extraction [path/to/file.pdf] [--repeat N]
+"""
+import argparse
+import asyncio
+import time
+from io import BytesIO
+from PyPDF2 import PdfReader
+from Functions import extraction
+
+
+def pypdf2_loop(pdf_bytes: bytes) -> int:
+    """The loop previously used by /anomaly-processing (extract_text called twice per page)"""
+    reader = PdfReader(BytesIO(pdf_bytes))
+    "\n".join([page.extract_text() for page in reader.pages if page.extract_text()])
+    return len(reader.pages)
+
+
+def pool_extractor(pdf_bytes: bytes) -> int:
+    """The process-pool extractor, bypassing the text cache"""
+    return len(extraction._parse_pages(pdf_bytes))
+
+
+async def _stream(pdf_bytes: bytes) -> int:
+    count = 0
+    extraction.pdf_text_cache._drop(extraction.document_digest(pdf_bytes))
+    async for _ in extraction.stream_pages(pdf_bytes):
+        count += 1
+    return count
+
+
+def pool_stream(pdf_bytes: bytes) -> int:
+    """The async streaming API as the routes use it, with a cold cache"""
+    return asyncio.run(_stream(pdf_bytes))
+
+
+def measure(name, fn, pdf_bytes, repeat):
+    best = None
+    pages = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        pages = fn(pdf_bytes)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{name:<28} {pages:>5} pages  {best:8.3f}s  {pages / best:10.1f} pages/s")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("pdf", nargs="?", default="NASDAQ_PEGY_2023.pdf")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with open(args.pdf, "rb") as f:
+        pdf_bytes = f.read()
+
+    print(f"workers={extraction.PDF_EXTRACT_WORKERS} pages_per_shard={extraction.PDF_PAGES_PER_SHARD}")
+    measure("PyPDF2 serial loop", pypdf2_loop, pdf_bytes, args.repeat)
+    pool_extractor(pdf_bytes)  # keep worker start-up out of the timings
+    measure("process pool (sync)", pool_extractor, pdf_bytes, args.repeat)
+    measure("process pool (stream)", pool_stream, pdf_bytes, args.repeat)
+    extraction.shutdown_pool()
+
+
+if __name__ == "__main__":
+    main()
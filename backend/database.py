@@ -1,6 +1,8 @@
 # database.py
 import os
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -8,8 +10,60 @@ load_dotenv()
 MONGO_URI = os.getenv("MONGO_URI")
 DB_NAME = "nops"
 
-client = AsyncIOMotorClient(MONGO_URI)
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", 100))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", 0))
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", 60000))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", 10000))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", 30000))
+
+# The one client of the process. Motor connects lazily, so importing this module
+# opens no sockets; connect() and close() are called from the app lifespan.
+client = AsyncIOMotorClient(
+    MONGO_URI,
+    maxPoolSize=MONGO_MAX_POOL_SIZE,
+    minPoolSize=MONGO_MIN_POOL_SIZE,
+    maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+    serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+    socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+)
 db = client[DB_NAME]
 
+users_collection = db["users"]
 conversations_collection = db["conversations"]
+messages_collection = db["messages"]
 knowledge_graph_html_collection = db["knowledge_graph_html"]
+ingest_jobs_collection = db["ingest_jobs"]
+stats_collection = db["stats"]
+
+# (collection, keys, options) created at startup; create_index is a no-op when the index exists
+INDEXES = [
+    (users_collection, [("email", ASCENDING)], {"unique": True, "name": "email_unique"}),
+    (conversations_collection, [("user_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+     {"name": "user_conversations"}),
+    (messages_collection, [("conversation_id", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)],
+     {"name": "conversation_timeline"}),
+    (messages_collection, [("conversation_id", ASCENDING), ("legacy_index", ASCENDING)],
+     {"name": "legacy_messages", "unique": True, "partialFilterExpression": {"legacy_index": {"$exists": True}}}),
+    (knowledge_graph_html_collection, [("conversation_id", ASCENDING)], {"name": "conversation"}),
+]
+
+
+async def ensure_indexes():
+    for collection, keys, options in INDEXES:
+        try:
+            await collection.create_index(keys, **options)
+        except OperationFailure as e:
+            # e.g. duplicate emails left over from before the unique index; the app still works without it
+            print(f"Could not create index {options['name']} on {collection.name}: {str(e)}")
+
+
+async def connect():
+    """Verify the connection and bootstrap the indexes; called once at startup"""
+    await client.admin.command("ping")
+    await ensure_indexes()
+
+
+def close():
+    client.close()
@@ -1,18 +1,42 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
-from motor.motor_asyncio import AsyncIOMotorClient
-import os
 
-from Routes import user_routes, graph, anomaly, analysis, report
+import database
+from Routes import user_routes, graph, anomaly, analysis, report, system
+from Functions import charts, extraction
+from Functions.jobs import job_manager
+from Functions.llm import gateway
+from Functions.stats import ensure_baseline
+from Functions.sandbox import SandboxError, sandbox_pool
 
 load_dotenv()
 
-# Initialize MongoDB
-mongo_client = AsyncIOMotorClient(os.getenv("MONGO_URI"))
-db = mongo_client.chatbot_db
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Single Mongo client for the app: check it, create the indexes, seed the counters
+    await database.connect()
+    await ensure_baseline()
+    # Ingest jobs run LLM calls from worker threads on this loop
+    gateway.bind_loop(asyncio.get_running_loop())
+    # Pre-warm the matplotlib chart workers and the generated-code sandbox
+    await asyncio.to_thread(charts.start_pool)
+    try:
+        await asyncio.to_thread(sandbox_pool.start)
+    except SandboxError as e:
+        # Everything else still works; chart_mode="llm" requests fail until the sandbox can start
+        print(f"Sandbox unavailable: {str(e)}")
+    yield
+    # Stop the ingest job threads and the extraction / chart / sandbox worker processes
+    job_manager.shutdown()
+    extraction.shutdown_pool()
+    charts.shutdown_pool()
+    sandbox_pool.shutdown()
+    database.close()
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Allow requests only from your Next.js frontend running on localhost:3000
 origins = [
@@ -33,6 +57,7 @@ app.include_router(graph.router, prefix="/api/users")
 app.include_router(anomaly.router, prefix="/api/anomaly")
 app.include_router(analysis.router, prefix="/api/analysis")
 app.include_router(report.router, prefix="/api/report", tags=["Report"])
+app.include_router(system.router, prefix="/api/system", tags=["System"])
 
 if __name__ == "__main__":
     import uvicorn
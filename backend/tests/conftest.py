@@ -0,0 +1,150 @@
+import os
+import sys
+import asyncio
+from types import SimpleNamespace
+import pytest
+from bson import ObjectId
+
+# Tests import the backend the way main.py does, from the backend directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _matches(document: dict, query: dict) -> bool:
+    """Equality, $lt and $or: the query operators the backend's paging uses"""
+    for key, condition in query.items():
+        if key == "$or":
+            if not any(_matches(document, branch) for branch in condition):
+                return False
+        elif isinstance(condition, dict):
+            if not (key in document and document[key] < condition["$lt"]):
+                return False
+        elif document.get(key) != condition:
+            return False
+    return True
+
+
+class FakeCursor:
+    def __init__(self, documents: list):
+        self.documents = documents
+
+    def sort(self, keys):
+        for field, direction in reversed(keys):
+            self.documents.sort(key=lambda document: document[field], reverse=direction < 0)
+        return self
+
+    def limit(self, count):
+        self.documents = self.documents[:count]
+        return self
+
+    async def to_list(self, length=None):
+        return self.documents[:length]
+
+
+class FakeCollection:
+    """
+    In-memory stand-in for the few Motor collection methods the jobs and paging code use.
+    Like Motor, each call returns a future bound to the running event loop, so calling
+    it from a worker thread fails the same way the real driver does.
+    """
+
+    def __init__(self):
+        self.documents = {}
+        self.updates = []
+
+    def _resolved(self, value):
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(value)
+        return future
+
+    def insert_one(self, document):
+        document_id = ObjectId()
+        self.documents[document_id] = {**document, "_id": document_id}
+        return self._resolved(SimpleNamespace(inserted_id=document_id))
+
+    def update_one(self, query, update, upsert=False):
+        self.updates.append(update.get("$set", {}))
+        document = self.documents.get(query["_id"])
+        if document is not None:
+            document.update(update.get("$set", {}))
+        return self._resolved(SimpleNamespace(matched_count=int(document is not None)))
+
+    def find_one(self, query):
+        return self._resolved(self.documents.get(query["_id"]))
+
+    def find(self, query, projection=None):
+        hidden = {key for key, value in (projection or {}).items() if value == 0}
+        return FakeCursor([
+            {key: value for key, value in document.items() if key not in hidden}
+            for document in self.documents.values() if _matches(document, query)
+        ])
+
+
+class FakeModel:
+    """GenerativeModel stand-in that answers each prompt with answer(prompt), raising what it raises"""
+
+    def __init__(self, answer):
+        self.answer = answer
+        self.prompts = []
+
+    async def generate_content_async(self, prompt):
+        self.prompts.append(prompt)
+        return SimpleNamespace(text=self.answer(prompt))
+
+
+@pytest.fixture
+def fake_model(monkeypatch):
+    """
+    fake_model(answer) routes every gateway generation to a FakeModel and returns it.
+    The gateway's real generate() runs, without the on-disk response cache.
+    """
+    from Functions import llm
+
+    def install(answer):
+        model = FakeModel(answer)
+        monkeypatch.setattr(llm.gateway, "_get_model", lambda model_name, generation_config: model)
+        monkeypatch.setattr(llm.gateway, "cache", None)
+        return model
+
+    return install
+
+
+@pytest.fixture
+def jobs_collection(monkeypatch):
+    from Functions import jobs
+    collection = FakeCollection()
+    monkeypatch.setattr(jobs, "ingest_jobs_collection", collection)
+    return collection
+
+
+@pytest.fixture
+def run_job(jobs_collection):
+    """
+    run_job(work, finalize=None, before=None) submits one job to a fresh JobManager on a new
+    event loop and returns (job_id, job) once its terminal status reached the collection.
+    before() runs on that loop first, e.g. to bind the LLM gateway to it like main.py does.
+    """
+    from Functions import jobs
+
+    async def keep(result):
+        return result
+
+    def run(work, finalize=None, before=None, timeout: float = 5.0):
+        manager = jobs.JobManager(max_workers=1)
+
+        async def scenario():
+            if before is not None:
+                before()
+            job_id = await manager.submit("test", {"user_id": "user"}, work, finalize or keep)
+            # The in-memory job turns terminal before the write reaches the collection
+            deadline = asyncio.get_running_loop().time() + timeout
+            while jobs_collection.documents[ObjectId(job_id)]["status"] not in jobs.TERMINAL_STATUSES:
+                assert asyncio.get_running_loop().time() < deadline, "job did not finish"
+                await asyncio.sleep(0.01)
+            return job_id, await manager.get(job_id)
+
+        try:
+            return asyncio.run(scenario())
+        finally:
+            manager.shutdown()
+
+    return run
@@ -0,0 +1,44 @@
+from Functions.analysis import merge_metrics
+
+
+def _metric(entity, value, metric_type="liabilities"):
+    return {"entity": entity, "value": value, "type": metric_type}
+
+
+def test_same_metric_from_several_sections_is_merged():
+    merged = merge_metrics([[_metric("Total Debt", 500)], [_metric("total debt", 500)]])
+    assert merged == [_metric("Total Debt", 500)]
+
+
+def test_same_label_rows_in_one_section_stay_apart():
+    section = [_metric("Lease liabilities", 120), _metric("Lease liabilities", 880)]
+    merged = merge_metrics([section, section])
+    assert [item["value"] for item in merged] == [120, 880]
+
+
+def test_repeated_row_within_a_section_is_counted_once():
+    merged = merge_metrics([[_metric("Cash", 40), _metric("Cash", 40)]])
+    assert merged == [_metric("Cash", 40)]
+
+
+def test_majority_value_wins_and_ties_go_to_the_earliest_section():
+    merged = merge_metrics([[_metric("Revenue", 10)], [_metric("Revenue", 12)], [_metric("Revenue", 12)]])
+    assert merged[0]["value"] == 12
+
+    merged = merge_metrics([[_metric("Revenue", 10)], [_metric("Revenue", 12)]])
+    assert merged[0]["value"] == 10
+
+
+def test_unparsed_zero_only_survives_alone():
+    assert merge_metrics([[_metric("Goodwill", 0)], [_metric("Goodwill", 75)]])[0]["value"] == 75
+    assert merge_metrics([[_metric("Goodwill", 0)]])[0]["value"] == 0
+
+
+def test_partial_metrics_are_tolerated():
+    merged = merge_metrics([[{"entity": "Inventory", "value": 5}, {"value": 3}, {}]])
+    assert merged == [{"entity": "Inventory", "value": 5, "type": ""}]
+
+
+def test_different_types_are_different_metrics():
+    merged = merge_metrics([[_metric("Interest", 7, "expenses"), _metric("Interest", 9, "revenue")]])
+    assert len(merged) == 2
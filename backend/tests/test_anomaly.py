@@ -0,0 +1,28 @@
+import json
+from Functions import anomaly
+
+
+def test_unparseable_document_refs_are_skipped():
+    normalized = anomaly._normalize(
+        {"affected_documents": ["DOCUMENT 1", "n/a"], "evidence": {"document_references": ["doc 2", None]}},
+        "doc0-part1-1", [0], False,
+    )
+    assert normalized["affected_documents"] == [1]
+    assert normalized["evidence"]["document_references"] == [2]
+
+
+def test_refs_fall_back_to_the_analyzed_document():
+    normalized = anomaly._normalize({"affected_documents": ["unknown"], "evidence": "none"}, "cross-1", [0, 1], True)
+    assert normalized["affected_documents"] == [0, 1]
+    assert normalized["evidence"] == {"excerpts": [], "document_references": [0, 1]}
+
+
+def test_digest_is_cut_at_whole_findings(monkeypatch):
+    monkeypatch.setattr(anomaly, "ANOMALY_DIGEST_CHARS", 200)
+    figures = [{"label": f"Revenue {n}", "value": "1,234", "period": "FY2023"} for n in range(10)]
+    fitted = anomaly._fit_digest({"document": 0, "summaries": ["Revenue grew."], "figures": figures})
+
+    assert len(json.dumps(fitted)) <= 200
+    assert fitted["summaries"] == ["Revenue grew."]
+    assert 0 < len(fitted["figures"]) < len(figures)
+    assert fitted["figures"] == figures[:len(fitted["figures"])]
@@ -0,0 +1,64 @@
+import asyncio
+from datetime import datetime, timedelta
+import pytest
+from bson import ObjectId
+from conftest import FakeCollection
+from Functions import conversations
+
+START = datetime(2024, 5, 1, 12, 0)
+
+
+@pytest.fixture
+def messages(monkeypatch):
+    collection = FakeCollection()
+    monkeypatch.setattr(conversations, "messages_collection", collection)
+    # Pairs of messages share a timestamp, so paging has to break ties on _id
+    for n in range(7):
+        document_id = ObjectId()
+        collection.documents[document_id] = {
+            "_id": document_id, "conversation_id": "conv", "legacy_index": n,
+            "role": "user", "content": f"message {n}", "timestamp": START + timedelta(seconds=n // 2),
+        }
+    collection.documents[ObjectId()] = {"_id": ObjectId(), "conversation_id": "other", "content": "x",
+                                        "timestamp": START}
+    return collection
+
+
+def _all_pages(limit):
+    pages, before = [], None
+    while True:
+        page, before = asyncio.run(conversations.get_message_page("conv", limit=limit, before=before))
+        pages.append([message["content"] for message in page])
+        if before is None:
+            return pages
+
+
+def test_cursor_round_trips():
+    document = {"_id": ObjectId(), "timestamp": START}
+    assert conversations.decode_cursor(conversations.encode_cursor(document)) == (START, document["_id"])
+
+
+@pytest.mark.parametrize("cursor", ["not-a-cursor", "", "bm90fGE="])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(conversations.InvalidCursor):
+        conversations.decode_cursor(cursor)
+
+
+def test_pages_walk_back_through_every_message_once(messages):
+    pages = _all_pages(limit=3)
+    assert pages == [
+        ["message 4", "message 5", "message 6"],
+        ["message 1", "message 2", "message 3"],
+        ["message 0"],
+    ]
+
+
+def test_page_omits_internal_fields(messages):
+    page, _ = asyncio.run(conversations.get_message_page("conv", limit=2))
+    assert all("conversation_id" not in message and "legacy_index" not in message for message in page)
+
+
+def test_exact_page_has_no_next_cursor(messages):
+    page, next_cursor = asyncio.run(conversations.get_message_page("conv", limit=7))
+    assert len(page) == 7
+    assert next_cursor is None
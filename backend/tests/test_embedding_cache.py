@@ -0,0 +1,47 @@
+import pytest
+
+pytest.importorskip("llama_index.core")
+
+from llama_index.core.embeddings import MockEmbedding
+from llama_index.core.schema import MetadataMode
+from Functions.embedding_cache import CachedEmbedding, EmbeddingStore
+from Functions.ingest import chunk_documents, page_document
+
+PAGE_TEXT = "Revenue grew 12% to $4.1 million while operating expenses were flat. " * 20
+
+
+class CountingEmbedding(MockEmbedding):
+    """MockEmbedding that records every text sent to the model"""
+
+    def __init__(self):
+        super().__init__(embed_dim=8)
+        object.__setattr__(self, "seen", [])
+
+    def _get_text_embeddings(self, texts):
+        self.seen.extend(texts)
+        return super()._get_text_embeddings(texts)
+
+
+def test_renamed_upload_hits_the_embedding_cache(tmp_path):
+    inner = CountingEmbedding()
+    model = CachedEmbedding(inner, EmbeddingStore(str(tmp_path / "embeddings.sqlite3")))
+
+    first = chunk_documents([page_document(PAGE_TEXT, "report.pdf", "1", "abc")])
+    renamed = chunk_documents([page_document(PAGE_TEXT, "report (1).pdf", "1", "abc")])
+
+    first_texts = [node.get_content(metadata_mode=MetadataMode.EMBED) for node in first]
+    renamed_texts = [node.get_content(metadata_mode=MetadataMode.EMBED) for node in renamed]
+    assert first_texts == renamed_texts
+
+    vectors = model.get_text_embedding_batch(first_texts)
+    sent = len(inner.seen)
+    assert model.get_text_embedding_batch(renamed_texts) == vectors
+    assert len(inner.seen) == sent
+
+
+def test_file_name_stays_in_llm_text_but_digest_does_not():
+    node = chunk_documents([page_document(PAGE_TEXT, "report.pdf", "3", "abc")])[0]
+    llm_text = node.get_content(metadata_mode=MetadataMode.LLM)
+    assert "report.pdf" in llm_text
+    assert "abc" not in llm_text
+    assert "report.pdf" not in node.get_content(metadata_mode=MetadataMode.EMBED)
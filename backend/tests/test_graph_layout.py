@@ -0,0 +1,87 @@
+import numpy as np
+from Functions import graph_layout
+from Functions.graph_layout import LAYOUT_SCALE, collapse, communities, force_layout, with_layout
+
+# Two triangles joined by a single bridge edge (2-3)
+TRIANGLES = np.array([(0, 1), (1, 2), (2, 0), (3, 4), (4, 5), (5, 3), (2, 3)])
+
+
+def _payload(edges, names=None):
+    count = int(np.max(edges)) + 1
+    names = names or [f"n{n}" for n in range(count)]
+    return {
+        "nodes": [{"id": name, "label": name} for name in names],
+        "edges": [{"from": names[a], "to": names[b], "label": f"r{a}{b}"} for a, b in edges],
+    }
+
+
+def test_layout_is_deterministic_and_scaled():
+    positions = force_layout(6, TRIANGLES)
+    assert positions.shape == (6, 2)
+    assert np.isfinite(positions).all()
+    assert np.isclose(np.abs(positions).max(), LAYOUT_SCALE)
+    assert np.array_equal(positions, force_layout(6, TRIANGLES))
+
+
+def test_layout_pulls_connected_nodes_together():
+    positions = force_layout(6, TRIANGLES)
+    within = np.linalg.norm(positions[0] - positions[1])
+    across = np.linalg.norm(positions[0] - positions[5])
+    assert within < across
+
+
+def test_layout_of_trivial_graphs():
+    assert force_layout(0, np.zeros((0, 2), dtype=np.int64)).shape == (0, 2)
+    assert force_layout(1, np.zeros((0, 2), dtype=np.int64)).tolist() == [[0.0, 0.0]]
+
+
+def test_grid_approximation_handles_large_graphs(monkeypatch):
+    monkeypatch.setattr(graph_layout, "LAYOUT_EXACT_NODES", 50)
+    edges = np.array([(n, n + 1) for n in range(199)])
+    positions = force_layout(200, edges, iterations=graph_layout.LAYOUT_MIN_ITERATIONS)
+    assert positions.shape == (200, 2)
+    assert np.isfinite(positions).all()
+    # Repulsion still spreads the nodes out instead of collapsing them onto a point
+    assert len(np.unique(positions.round(0), axis=0)) > 150
+
+
+def test_label_propagation_finds_both_triangles():
+    labels = communities(6, TRIANGLES)
+    assert labels[0] == labels[1] == labels[2]
+    assert labels[3] == labels[4] == labels[5]
+    assert labels[0] != labels[3]
+
+
+def test_isolated_nodes_keep_their_own_label():
+    labels = communities(4, np.array([(0, 1)]))
+    assert labels[0] == labels[1]
+    assert labels[2] == 2 and labels[3] == 3
+
+
+def test_with_layout_places_every_node():
+    laid_out = with_layout(_payload(TRIANGLES))
+    assert all("x" in node and "y" in node for node in laid_out["nodes"])
+    assert laid_out["options"]["physics"] is False
+
+
+def test_collapse_keeps_hubs_and_clusters_the_rest():
+    # A hub with four leaves, plus an unrelated pair of nodes
+    edges = np.array([(0, 1), (0, 2), (0, 3), (0, 4), (5, 6)])
+    payload = with_layout(_payload(edges))
+    collapsed = collapse(payload, min_degree=4)
+
+    ids = {node["id"] for node in collapsed["nodes"]}
+    assert "n0" in ids
+    clusters = [node for node in collapsed["nodes"] if node["id"].startswith("cluster:")]
+    assert sorted(node["members"] for node in clusters) == [2, 4]
+
+    leaves = next(node for node in clusters if node["members"] == 4)
+    hub_edges = [edge for edge in collapsed["edges"] if edge["from"] == "n0"]
+    assert hub_edges == [{"from": "n0", "to": leaves["id"], "label": "4 relations", "value": 4}]
+
+
+def test_collapse_leaves_single_members_as_themselves():
+    edges = np.array([(0, 1), (0, 2), (0, 3), (0, 4), (4, 5)])
+    collapsed = collapse(with_layout(_payload(edges)), min_degree=4)
+    assert not any(node["id"].startswith("cluster:") and node["members"] == 1 for node in collapsed["nodes"])
+    assert collapse({"nodes": [], "edges": []})["nodes"] == []
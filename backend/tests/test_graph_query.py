@@ -0,0 +1,72 @@
+import json
+import os
+import pytest
+from Functions.graph_query import GRAPH_STORE_FILE, EntityNotFound, GraphIndex, GraphIndexCache
+
+GRAPH = {
+    "Acme Corp": [["acquired", "Widget Inc"], ["reported", "Revenue"]],
+    "Widget Inc": [["supplies", "Gadget LLC"]],
+    "Gadget LLC": [["owes", "Bank"]],
+    "CEO": [["leads", "Acme Corp"]],
+}
+
+
+@pytest.fixture
+def index():
+    return GraphIndex(GRAPH)
+
+
+def test_edges_and_degrees(index):
+    assert index.edge_count == 5
+    top = index.top_entities(1)[0]
+    assert top == {"id": "Acme Corp", "degree": 3, "out_degree": 2, "in_degree": 1}
+
+
+def test_resolve_falls_back_to_case_insensitive_match(index):
+    assert index.names[index.resolve(" acme corp ")] == "Acme Corp"
+    with pytest.raises(EntityNotFound):
+        index.resolve("Nobody")
+
+
+def test_neighborhood_follows_edges_both_ways(index):
+    one_hop = index.neighborhood("Acme Corp", hops=1)
+    assert {node["id"] for node in one_hop["nodes"]} == {"Acme Corp", "Widget Inc", "Revenue", "CEO"}
+    assert not one_hop["truncated"]
+
+    two_hops = index.neighborhood("Acme Corp", hops=2)
+    assert "Gadget LLC" in {node["id"] for node in two_hops["nodes"]}
+    assert "Bank" not in {node["id"] for node in two_hops["nodes"]}
+
+
+def test_neighborhood_is_truncated_at_limit(index):
+    result = index.neighborhood("Acme Corp", hops=3, limit=2)
+    assert len(result["nodes"]) == 2
+    assert result["truncated"]
+    assert all(edge["from"] in {n["id"] for n in result["nodes"]} for edge in result["edges"])
+
+
+def test_shortest_path_keeps_only_path_edges(index):
+    result = index.shortest_path("CEO", "Bank")
+    assert result["path"] == ["CEO", "Acme Corp", "Widget Inc", "Gadget LLC", "Bank"]
+    assert [edge["label"] for edge in result["edges"]] == ["leads", "acquired", "supplies", "owes"]
+
+
+def test_shortest_path_respects_max_hops(index):
+    assert index.shortest_path("CEO", "Bank", max_hops=3) is None
+    assert index.shortest_path("Bank", "Bank")["path"] == ["Bank"]
+
+
+def test_cache_rebuilds_when_the_store_changes(tmp_path):
+    path = tmp_path / GRAPH_STORE_FILE
+    path.write_text(json.dumps({"graph_dict": GRAPH}))
+    cache = GraphIndexCache()
+    first = cache.get(str(tmp_path))
+    assert cache.get(str(tmp_path)) is first
+
+    path.write_text(json.dumps({"graph_dict": {"A": [["to", "B"]]}}))
+    stat = os.stat(path)
+    os.utime(path, (stat.st_atime, stat.st_mtime + 10))
+    assert cache.get(str(tmp_path)).names == ["A", "B"]
+
+    with pytest.raises(FileNotFoundError):
+        cache.get(str(tmp_path / "missing"))
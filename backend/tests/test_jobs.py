@@ -0,0 +1,67 @@
+import asyncio
+import threading
+import pytest
+from bson import ObjectId
+
+
+def test_submitted_job_completes(jobs_collection, run_job):
+    def work(progress):
+        progress("chunks", 3)
+        progress.stage("indexing")
+        return {"value": 1}
+
+    async def finalize(result):
+        return {**result, "finalized": True}
+
+    job_id, job = run_job(work, finalize)
+
+    assert job["status"] == "completed"
+    assert job["result"] == {"value": 1, "finalized": True}
+    assert job["progress"]["chunks"] == 3
+    stored = jobs_collection.documents[ObjectId(job_id)]
+    assert stored["status"] == "completed"
+    assert stored["result"] == {"value": 1, "finalized": True}
+
+
+def test_failing_job_is_marked_failed(jobs_collection, run_job):
+    def work(progress):
+        raise RuntimeError("extraction failed")
+
+    job_id, job = run_job(work)
+
+    assert job["status"] == "failed"
+    assert job["error"] == "extraction failed"
+    assert jobs_collection.documents[ObjectId(job_id)]["status"] == "failed"
+
+
+def test_second_job_for_a_conversation_is_rejected_until_the_first_finishes(jobs_collection):
+    from Functions import jobs
+
+    release = threading.Event()
+    owner = {"user_id": "user", "conversation_id": "conversation"}
+
+    def blocked(progress):
+        release.wait(5)
+        return {}
+
+    async def keep(result):
+        return result
+
+    async def scenario():
+        manager = jobs.JobManager(max_workers=2)
+        try:
+            first = await manager.submit("process_pdfs", owner, blocked, keep)
+            with pytest.raises(jobs.JobConflictError):
+                await manager.submit("process_pdfs", owner, blocked, keep)
+            # Other conversations are not held up
+            await manager.submit("process_pdfs", {**owner, "conversation_id": "other"}, lambda progress: {}, keep)
+
+            release.set()
+            while (await manager.get(first))["status"] not in jobs.TERMINAL_STATUSES:
+                await asyncio.sleep(0.01)
+            assert await manager.submit("process_pdfs", owner, lambda progress: {}, keep)
+        finally:
+            release.set()
+            manager.shutdown()
+
+    asyncio.run(scenario())
@@ -0,0 +1,56 @@
+import json
+import asyncio
+import pytest
+from Functions import analysis, llm
+from Functions.llm import LLMGateway, LLMResponseCache
+
+METRICS = json.dumps({"financial_metrics": [{"entity": "Revenue", "value": "1,200", "type": "revenue"}]})
+
+
+@pytest.fixture
+def cached_gateway(monkeypatch, fake_model, tmp_path):
+    """A gateway with its own on-disk cache, used by the analysis module"""
+    def install(answer):
+        model = fake_model(answer)
+        gateway = LLMGateway(cache=LLMResponseCache(str(tmp_path / "llm_cache")))
+        monkeypatch.setattr(gateway, "_get_model", lambda model_name, generation_config: model)
+        monkeypatch.setattr(analysis, "gateway", gateway)
+        return gateway, model
+    return install
+
+
+def test_parse_failure_is_not_served_from_the_cache(cached_gateway):
+    answers = iter(["Sorry, here is the data: {", METRICS])
+    gateway, model = cached_gateway(lambda prompt: next(answers))
+
+    assert asyncio.run(analysis.extract_section_metrics("Revenue was $1,200.")) == []
+    second = asyncio.run(analysis.extract_section_metrics("Revenue was $1,200."))
+    third = asyncio.run(analysis.extract_section_metrics("Revenue was $1,200."))
+
+    assert second == third == [{"entity": "Revenue", "value": 1200, "type": "revenue"}]
+    # The bad answer was asked again, the good one came from the cache
+    assert len(model.prompts) == 2
+    assert gateway.cache.stats()["stores"] == 1
+
+
+def test_cached_answer_that_no_longer_parses_is_replaced(cached_gateway):
+    gateway, model = cached_gateway(lambda prompt: METRICS)
+    config = {"temperature": 0}
+    key = LLMResponseCache.key(llm.DEFAULT_MODEL, "prompt", config)
+    gateway.cache.put(key, "not json")
+
+    result = asyncio.run(gateway.generate("prompt", generation_config=config, parse=json.loads))
+
+    assert result == json.loads(METRICS)
+    assert len(model.prompts) == 1
+    assert gateway.cache.get(key) == METRICS
+
+
+def test_sampled_generations_are_not_cached(cached_gateway):
+    gateway, model = cached_gateway(lambda prompt: "text")
+
+    for _ in range(2):
+        assert asyncio.run(gateway.generate("prompt", generation_config={"temperature": 0.9})) == "text"
+
+    assert len(model.prompts) == 2
+    assert gateway.cache.stats()["stores"] == 0
@@ -0,0 +1,63 @@
+import numpy as np
+from Functions import prescreen
+
+
+def _metrics(values, metric_type="revenue"):
+    return [{"entity": f"Line {n}", "value": value, "type": metric_type} for n, value in enumerate(values)]
+
+
+def test_benford_conforming_figures_pass():
+    values = 10 ** np.random.default_rng(7).uniform(1, 6, 2000)
+    assert prescreen.benford_check(values, np.zeros(values.size, dtype=int)) == []
+
+
+def test_benford_flags_skewed_leading_digits():
+    values = np.random.default_rng(7).uniform(500, 999, 400)
+    findings = prescreen.benford_check(values, np.zeros(values.size, dtype=int))
+    assert len(findings) == 1
+    assert findings[0]["severity"] == "high"
+    assert findings[0]["affected_documents"] == [0]
+
+
+def test_benford_needs_enough_figures():
+    values = np.random.default_rng(7).uniform(500, 999, prescreen.BENFORD_MIN_SAMPLES - 1)
+    assert prescreen.benford_check(values, np.zeros(values.size, dtype=int)) == []
+
+
+def test_outlier_is_flagged_by_z_score_and_iqr():
+    values = [100 + n for n in range(20)] + [10_000]
+    findings = prescreen.prescreen([_metrics(values)])
+    outliers = [item for item in findings if item["id"].startswith("prescreen-outlier")]
+    assert len(outliers) == 1
+    assert "Line 20" in outliers[0]["description"]
+    assert outliers[0]["severity"] == "high"
+
+
+def test_outliers_are_judged_within_their_metric_type():
+    metrics = _metrics([100 + n for n in range(10)], "revenue") + _metrics([1_000_000 + n for n in range(10)], "assets")
+    assert not [item for item in prescreen.prescreen([metrics]) if item["id"].startswith("prescreen-outlier")]
+
+
+def test_balanced_sheet_passes_identity_check():
+    metrics = [
+        {"entity": "Total assets", "value": 1000},
+        {"entity": "Total liabilities", "value": 600},
+        {"entity": "Total stockholders' equity", "value": 400},
+    ]
+    assert prescreen.accounting_identity_check([metrics]) == []
+
+
+def test_unbalanced_sheet_is_flagged():
+    metrics = [
+        {"entity": "Total assets", "value": 1000},
+        {"entity": "Total liabilities and stockholders' equity", "value": 900},
+    ]
+    findings = prescreen.accounting_identity_check([[], metrics])
+    assert len(findings) == 1
+    assert findings[0]["severity"] == "critical"
+    assert findings[0]["affected_documents"] == [1]
+    assert findings[0]["type"] == "logic"
+
+
+def test_identity_check_skips_documents_without_totals():
+    assert prescreen.accounting_identity_check([[{"entity": "Total assets", "value": 1000}]]) == []
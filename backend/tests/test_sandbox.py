@@ -0,0 +1,53 @@
+import os
+import pytest
+
+pytest.importorskip("matplotlib")
+
+from Functions.sandbox import SandboxError, SandboxPool
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope="module")
+def pool():
+    pool = SandboxPool(size=1)
+    try:
+        pool.start()
+    except SandboxError as e:
+        pytest.skip(f"namespaces are not available here: {e}")
+    yield pool
+    pool.shutdown()
+
+
+def _fails(pool, code: str) -> str:
+    with pytest.raises(SandboxError) as error:
+        pool.run(code, None)
+    return str(error.value)
+
+
+def test_plots_are_returned(pool):
+    images = pool.run("plt.bar(['a', 'b'], data); plt.savefig('revenue.jpg')", [1, 2])
+    assert [filename for filename, _ in images] == ["revenue.jpg"]
+    assert images[0][1][:2] == b"\xff\xd8"
+
+
+def test_code_cannot_reach_the_host_through_module_attributes(pool):
+    # Blocklists of names were bypassed like this; the kernel has to refuse it instead
+    assert "Read-only file system" in _fails(pool, "import matplotlib; matplotlib.os.mkdir('/opt/escaped')")
+    # Hidden behind an empty mount: listed as [] or not listable at all
+    listing = _fails(pool, f"import matplotlib; raise SystemExit(str(matplotlib.os.listdir({BACKEND_DIR!r})))")
+    assert "main.py" not in listing.strip().splitlines()[-1]
+
+
+def test_code_runs_unprivileged_without_network(pool):
+    uid = _fails(pool, "import os; raise SystemExit(str(os.getuid()))")
+    assert not uid.rstrip().endswith(" 0")
+    assert "unreachable" in _fails(pool, "import socket; socket.socket().connect(('1.1.1.1', 80))")
+    unshare = "import ctypes; libc = ctypes.CDLL(None, use_errno=True); libc.unshare(0x10000000); raise SystemExit(ctypes.get_errno())"
+    assert _fails(pool, unshare).rstrip().endswith("SystemExit: 1")  # EPERM from the seccomp filter
+
+
+def test_only_the_working_directory_is_writable(pool):
+    images = pool.run("open('notes.txt', 'w').write('x'); plt.plot(data); plt.savefig('a.png')", [1, 2])
+    assert [filename for filename, _ in images] == ["a.png"]
+    assert "Read-only file system" in _fails(pool, "open('/etc/sandbox-escape', 'w')")
@@ -0,0 +1,75 @@
+import fitz
+import pytest
+from Functions.table_parser import extract_statement_metrics, parse_amount, parse_statement_page
+
+COLUMNS = (420, 506)  # left edge of the 2023 and 2022 amounts, under their year headers
+
+
+def _page(lines, title="CONSOLIDATED BALANCE SHEETS"):
+    """One-page PDF laid out like a statement: (indent, label, amounts) per row"""
+    doc = fitz.open()
+    page = doc.new_page(width=612, height=792)
+    page.insert_text((226, 60), title, fontsize=9)
+    page.insert_text((424, 90), "2023", fontsize=9)
+    page.insert_text((510, 90), "2022", fontsize=9)
+    y = 110
+    for indent, label, amounts in lines:
+        if label:
+            page.insert_text((indent, y), label, fontsize=9)
+        for x, amount in zip(COLUMNS, amounts):
+            page.insert_text((x, y), amount, fontsize=9)
+        y += 14
+    return doc
+
+
+def _values(metrics):
+    return {metric["entity"]: metric["value"] for metric in metrics}
+
+
+BALANCE_SHEET = [
+    (24, "CURRENT ASSETS:", ()),
+    (28, "Cash and cash equivalents", ("3,575,283", "2,187,540")),
+    (28, "Trade accounts receivable, less allowance for", ()),
+    (36, "credit losses of $94,085 and $108,636, respectively", ("5,010,818", "5,564,532")),
+    (28, "Inventories, net", ("3,578,668", "6,054,493")),
+    (28, "Deemed dividend on extinguishment of preferred stock", ()),
+    (0, "", ("-", "(13,239,892)")),
+    (28, "Prepaid expenses", ("1,313,082", "2,152,058")),
+    (24, "TOTAL CURRENT ASSETS", ("15,778,648", "25,961,524")),
+]
+
+
+def test_wrapped_labels_are_joined_before_the_amounts():
+    with _page(BALANCE_SHEET) as doc:
+        values = _values(parse_statement_page(doc[0]))
+
+    label = "Trade accounts receivable, less allowance for credit losses of $94,085 and $108,636, respectively"
+    assert values[f"{label} (2023)"] == 5010818
+    assert values[f"{label} (2022)"] == 5564532
+    # Amounts on a row of their own belong to the label above them
+    assert values["Deemed dividend on extinguishment of preferred stock (2022)"] == -13239892
+    # Headings are not glued to the first item under them
+    assert values["Cash and cash equivalents (2023)"] == 3575283
+    assert not any(entity.startswith("credit losses") or "108,636 (" in entity for entity in values)
+
+
+def test_rows_are_typed_and_every_period_is_read():
+    with _page(BALANCE_SHEET) as doc:
+        metrics = parse_statement_page(doc[0])
+
+    assert {metric["type"] for metric in metrics} == {"asset"}
+    assert _values(metrics)["TOTAL CURRENT ASSETS (2022)"] == 25961524
+
+
+def test_pages_without_a_statement_title_are_left_unparsed():
+    with _page(BALANCE_SHEET, title="REPORT OF INDEPENDENT REGISTERED PUBLIC ACCOUNTING FIRM") as doc:
+        assert parse_statement_page(doc[0]) is None
+        result = extract_statement_metrics(doc.tobytes())
+    assert result == {"financial_metrics": [], "unparsed_pages": [0]}
+
+
+@pytest.mark.parametrize("token, value", [
+    ("1,234", 1234), ("(1,234)", -1234), ("$5.2", 5.2), ("-17", -17), ("respectively", None), ("2023,", None),
+])
+def test_parse_amount(token, value):
+    assert parse_amount(token) == value
@@ -0,0 +1,73 @@
+import re
+import json
+import asyncio
+import pytest
+from google.api_core.exceptions import ResourceExhausted
+from Functions import jobs, llm, triplets
+from Functions.triplets import BatchedTripletExtractor, parse_batch_response
+
+
+def _answer(prompt: str) -> str:
+    """One triplet per chunk of a batch prompt"""
+    numbers = [int(n) for n in re.findall(r"^Chunk (\d+):$", prompt, flags=re.MULTILINE)]
+    return json.dumps({"chunks": [
+        {"chunk": n, "triplets": [[f"entity {n}", "relates to", "thing"]]} for n in numbers
+    ]})
+
+
+def test_parse_batch_response_orders_triplets_by_chunk():
+    response = '```json\n{"chunks": [{"chunk": 2, "triplets": [["a", "b", "c"]]}, {"chunk": 1, "triplets": []}]}\n```'
+    assert parse_batch_response(response, 2, 2) == [[], [("A", "B", "C")]]
+
+
+@pytest.mark.parametrize("response", [
+    "[]",
+    '{"triplets": []}',
+    '{"chunks": {"chunk": 1}}',
+    '{"chunks": ["chunk 1"]}',
+    '{"chunks": [{"chunk": 1, "triplets": "a, b, c"}]}',
+    "not json",
+])
+def test_parse_batch_response_rejects_unexpected_shapes(response):
+    with pytest.raises(ValueError):
+        parse_batch_response(response, 1, 2)
+
+
+def test_rate_limited_batches_are_retried(monkeypatch, fake_model):
+    calls = []
+
+    def answer(prompt):
+        calls.append(prompt)
+        if len(calls) == 1:
+            raise ResourceExhausted("quota")
+        return _answer(prompt)
+
+    fake_model(answer)
+    monkeypatch.setattr(triplets, "TRIPLET_BACKOFF_SECONDS", 0)
+    extractor = BatchedTripletExtractor(max_triplets_per_chunk=2, batch_size=4, requests_per_minute=0)
+
+    result = asyncio.run(extractor.extract(["first", "second"], lambda counter, amount: None))
+
+    assert len(calls) == 2
+    assert result == [[("Entity 1", "Relates to", "Thing")], [("Entity 2", "Relates to", "Thing")]]
+
+
+def test_extraction_progress_reaches_the_job(monkeypatch, fake_model, jobs_collection, run_job):
+    fake_model(_answer)
+    monkeypatch.setattr(llm.gateway, "_loop", None)
+    monkeypatch.setattr(jobs, "JOB_PROGRESS_FLUSH_SECONDS", 0)
+    texts = [f"chunk text {n}" for n in range(5)]
+
+    def work(progress):
+        # As in build_graph_index: called from the job thread, runs on the bound loop
+        extractor = BatchedTripletExtractor(max_triplets_per_chunk=2, batch_size=2, requests_per_minute=0)
+        return {"triplets": sum(len(t) for t in extractor.extract_sync(texts, progress))}
+
+    _, job = run_job(work, before=lambda: llm.gateway.bind_loop(asyncio.get_running_loop()))
+
+    assert job["status"] == "completed", job["error"]
+    assert job["result"] == {"triplets": 5}
+    assert job["progress"]["chunks_processed"] == 5
+    assert job["progress"]["triplets"] == 5
+    flushed = [update["progress"] for update in jobs_collection.updates if "progress" in update and "status" not in update]
+    assert any(progress["chunks_processed"] for progress in flushed)
@@ -1,15 +1,36 @@
 import { NextResponse } from "next/server";
 
+const BACKEND_ORIGIN = "http://localhost:8000";
+
 export async function GET(
   request: Request,
   { params }: { params: { id: string } }
 ) {
   try {
-    // Fetch HTML content from your backend
+    // Fetch the rendered graph page from the backend, revalidating with the browser's ETag
+    const ifNoneMatch = request.headers.get("if-none-match");
+    const view = new URL(request.url).searchParams.get("view") === "collapsed" ? "collapsed" : "full";
     const res = await fetch(
-      `http://localhost:8000/api/users/knowledge-graph/${params.id}`
+      `${BACKEND_ORIGIN}/api/users/knowledge-graph/${params.id}?view=${view}`,
+      {
+        cache: "no-store",
+        headers: ifNoneMatch ? { "If-None-Match": ifNoneMatch } : {},
+      }
     );
 
+    const headers: Record<string, string> = {
+      "Content-Type": "text/html",
+      // The page loads vis-network from the backend and runs inline scripts in the iframe
+      "Content-Security-Policy": `default-src 'self' 'unsafe-inline' 'unsafe-eval' ${BACKEND_ORIGIN}`,
+      "Cache-Control": res.headers.get("cache-control") ?? "no-cache",
+    };
+    const etag = res.headers.get("etag");
+    if (etag) headers["ETag"] = etag;
+
+    if (res.status === 304) {
+      return new NextResponse(null, { status: 304, headers });
+    }
+
     // Handle fetch errors
     if (!res.ok) {
       throw new Error("Failed to fetch knowledge graph HTML");
@@ -19,14 +40,9 @@ export async function GET(
     const html = await res.text();
 
     // Return the HTML with appropriate headers
-    return new NextResponse(html, {
-      headers: {
-        "Content-Type": "text/html",
-        "Content-Security-Policy": "default-src 'self' 'unsafe-inline' 'unsafe-eval'", // Allow scripts in the iframe
-      },
-    });
+    return new NextResponse(html, { headers });
   } catch (error) {
     console.error("Error fetching knowledge graph:", error);
     return new NextResponse("Internal Server Error", { status: 500 });
   }
-}
\ No newline at end of file
+}
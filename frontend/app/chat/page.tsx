@@ -12,6 +12,24 @@ function getCookie(name: string): string | null {
   return match ? match[2] : null;
 }
 
+// Poll an ingest job until the backend reports it completed or failed.
+async function waitForIngestJob(jobId: string, token: string | null): Promise<any> {
+  while (true) {
+    const response = await fetch(`http://localhost:8000/api/users/process-pdfs/jobs/${jobId}`, {
+      headers: {
+        Authorization: `Bearer ${token}`,
+      },
+    });
+    if (!response.ok) {
+      throw new Error("Failed to fetch ingest job status");
+    }
+    const job = await response.json();
+    if (job.status === "completed") return job;
+    if (job.status === "failed") throw new Error(job.error || "PDF processing failed");
+    await new Promise((resolve) => setTimeout(resolve, 2000));
+  }
+}
+
 const ChatbotPage = () => {
   const [isSidebarOpen, setIsSidebarOpen] = useState(true);
   const [messages, setMessages] = useState<
@@ -31,6 +49,7 @@ const ChatbotPage = () => {
   const [attachedFileNames, setAttachedFileNames] = useState<string[]>([]);
   const [isPdfUploaded, setIsPdfUploaded] = useState<boolean>(false);
   const [anomalyData, setAnomalyData] = useState<any>(null); // New state for anomaly data
+  const [olderCursor, setOlderCursor] = useState<string | null>(null); // Cursor of the next older message page
 
   // Speech function using the browser API.
   const speak = (text: string) => {
@@ -245,11 +264,19 @@ const ChatbotPage = () => {
   const startNewChat = () => {
     setMessages([{ role: "system", text: "Please upload a PDF to start the conversation. After uploading click on go to dashboard to get more insights." }]);
     setConversationId(null);
+    setOlderCursor(null);
     setRefreshChatHistory((prev) => !prev);
     setIsPdfUploaded(false);
     setAnomalyData(null); // Reset anomaly data on new chat
   };
 
+  const toChatMessages = (messages: any[]) =>
+    messages.map((msg: any) => ({
+      role: msg.role === "assistant" ? "bot" : msg.role, // Keep system role as-is
+      text: msg.content,
+      timestamp: msg.timestamp,
+    }));
+
   // Update the loadConversation function in ChatbotPage
   const loadConversation = async (convId: string) => {
     try {
@@ -264,13 +291,8 @@ const ChatbotPage = () => {
 
       const data = await response.json();
       if (data && data.messages) {
-        setMessages(
-          data.messages.map((msg: any) => ({
-            role: msg.role === "assistant" ? "bot" : msg.role, // Keep system role as-is
-            text: msg.content,
-            timestamp: msg.timestamp,
-          }))
-        );
+        setMessages(toChatMessages(data.messages));
+        setOlderCursor(data.next_cursor ?? null);
         setConversationId(convId);
 
         // Load any associated PDF files
@@ -284,6 +306,24 @@ const ChatbotPage = () => {
     }
   };
 
+  // Prepend the next older page of the current conversation
+  const loadOlderMessages = async () => {
+    if (!conversationId || !olderCursor) return;
+    try {
+      const token = localStorage.getItem("token");
+      const response = await fetch(
+        `http://localhost:8000/api/users/chat/${conversationId}?before=${encodeURIComponent(olderCursor)}`,
+        { headers: { Authorization: `Bearer ${token}` } }
+      );
+      if (!response.ok) throw new Error("Failed to load older messages");
+      const data = await response.json();
+      setMessages((prev) => [...toChatMessages(data.messages), ...prev]);
+      setOlderCursor(data.next_cursor ?? null);
+    } catch (error) {
+      console.error("Error loading older messages:", error);
+    }
+  };
+
   // Callback for selecting a chat from the sidebar.
   const handleSelectChat = async (convId: string) => {
     console.log("Selected conversation:", convId);
@@ -345,6 +385,9 @@ const ChatbotPage = () => {
       }
 
       const processData = await processResponse.json();
+      const job = await waitForIngestJob(processData.job_id, token);
+      processData.status = job.status;
+      processData.message = job.result?.message;
 
       if (!conversationId && processData.conversation_id) {
         setConversationId(processData.conversation_id);
@@ -500,6 +543,13 @@ const ChatbotPage = () => {
           )}
         </header>
         <div className="flex-1 overflow-y-auto p-4 space-y-4">
+          {olderCursor && (
+            <div className="flex justify-center">
+              <button onClick={loadOlderMessages} className="text-sm text-white/60 hover:text-white">
+                Load earlier messages
+              </button>
+            </div>
+          )}
           {messages.map((msg, index) => (
             <div key={index} className="space-y-2">
               <div className={`flex ${msg.role === "user" ? "justify-end" : "justify-start"}`}>
@@ -25,6 +25,7 @@ export default function Page({ params }: { params: { id: string } }) {
   const [iframeKey, setIframeKey] = useState(Date.now()); // Key to force iframe re-render
   const [iframeLoaded, setIframeLoaded] = useState(false); // Loading state
   const [iframeError, setIframeError] = useState(false); // Error state
+  const [collapsedView, setCollapsedView] = useState(false); // Community clusters instead of every entity
   const [images, setImages] = useState<ImageData[]>([]); // State to store images
   const [conversationDetails, setConversationDetails] = useState<ConversationDetails | null>(null); // State to store conversation details
 
@@ -107,7 +108,19 @@ export default function Page({ params }: { params: { id: string } }) {
             {/* Iframe Container */}
             <div className="w-full sm:w-[45%] h-[650px] bg-gray-800 rounded-lg border border-gray-700 p-6">
               {/* Heading */}
-              <h2 className="text-xl font-semibold mb-4">Knowledge Graph</h2>
+              <div className="flex items-center justify-between mb-4">
+                <h2 className="text-xl font-semibold">Knowledge Graph</h2>
+                <button
+                  onClick={() => {
+                    setCollapsedView((prev) => !prev);
+                    setIframeLoaded(false);
+                    setIframeError(false);
+                  }}
+                  className="text-sm text-gray-400 hover:text-white"
+                >
+                  {collapsedView ? "Show all entities" : "Show clusters"}
+                </button>
+              </div>
               <div className="relative w-full h-full">
                 {!iframeLoaded && !iframeError && (
                   <div className="absolute inset-0 flex items-center justify-center">
@@ -120,8 +133,8 @@ export default function Page({ params }: { params: { id: string } }) {
                   </div>
                 )}
                 <iframe
-                  key={iframeKey}
-                  src={`/api/kg/${id}?t=${iframeKey}`}
+                  key={`${iframeKey}-${collapsedView}`}
+                  src={`/api/kg/${id}${collapsedView ? "?view=collapsed" : ""}`}
                   className="w-full h-[90%] rounded-lg"
                   onLoad={() => {
                     console.log("Iframe loaded successfully");
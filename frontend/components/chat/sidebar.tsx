@@ -18,6 +18,7 @@ interface SidebarProps {
 
 const Sidebar: React.FC<SidebarProps> = ({ userId, isOpen, onClose, onSelectChat, onNewChat, refreshChatHistory }) => {
   const [chatHistory, setChatHistory] = useState<ChatHistoryItem[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null); // Cursor of the next (older) page of chats
   interface AuthObject {
     address: string;
   email: string;
@@ -41,34 +42,31 @@ const Sidebar: React.FC<SidebarProps> = ({ userId, isOpen, onClose, onSelectChat
       }
     }, []);
 
+    // The API returns chats newest first, one page at a time
+    const fetchChats = async (before: string | null = null) => {
+      try {
+        const accessToken = localStorage.getItem("token");
+        const query = before ? `?before=${encodeURIComponent(before)}` : "";
+        const response = await fetch(`http://localhost:8000/api/users/chats${query}`, {
+          headers: {
+            Authorization: `Bearer ${accessToken || ""}`,
+          },
+          credentials: "include",
+        });
+
+        if (!response.ok) throw new Error("Failed to fetch chats");
+
+        const data = await response.json();
+        setChatHistory((prev) => (before ? [...prev, ...(data.data || [])] : data.data || []));
+        setNextCursor(data.next_cursor ?? null);
+      } catch (err) {
+        console.error("Error fetching chat history:", err);
+      }
+    };
+
     useEffect(() => {
       console.log("userId", userId);
       if (userId) {
-        const fetchChats = async () => {
-          try {
-            const accessToken = localStorage.getItem("token");
-            const response = await fetch(`http://localhost:8000/api/users/chats`, {
-              headers: {
-                Authorization: `Bearer ${accessToken || ""}`,
-              },
-              credentials: "include",
-            });
-    
-            if (!response.ok) throw new Error("Failed to fetch chats");
-    
-            const data = await response.json();
-            const sortedChats = (data.data || []).sort((a: { created_at: string | number | Date; }, b: { created_at: string | number | Date; }) => {
-              // Convert date strings to Date objects for comparison
-              const dateA = new Date(a.created_at).getTime(); // Convert to timestamp
-              const dateB = new Date(b.created_at).getTime(); // Convert to timestamp
-              return dateB - dateA; // Sort in descending order (latest first)
-            });
-            setChatHistory(sortedChats);
-          } catch (err) {
-            console.error("Error fetching chat history:", err);
-          }
-        };
-    
         fetchChats();
       }
     }, [userId, refreshChatHistory]);
@@ -125,6 +123,11 @@ const Sidebar: React.FC<SidebarProps> = ({ userId, isOpen, onClose, onSelectChat
           ) : (
             <p className="text-sm text-gray-400">No chats found</p>
           )}
+          {nextCursor && (
+            <button onClick={() => fetchChats(nextCursor)} className="w-full text-center p-2 text-xs text-gray-400 hover:text-white">
+              Show more
+            </button>
+          )}
         </div>
       </div>
 